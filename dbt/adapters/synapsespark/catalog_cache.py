@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from dbt.events import AdapterLogger
+
+logger = AdapterLogger("SynapseSpark")
+
+CATALOG_CACHE_FILE_NAME = "catalog_cache.json"
+CATALOG_CACHE_VERSION = 2
+
+
+def change_token(information: str) -> str:
+    """
+    A token that changes when the `show table extended` information of a
+    relation changes, except for its last access time.
+
+    The pyspark statement of the catalog computes the same token on the
+    driver, see `LIST_RELATIONS_CODE`.
+    """
+    lines = [line for line in information.splitlines() if not line.startswith("Last Access:")]
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+class CatalogCache():
+    """
+    The catalog columns of the relations of the previous `dbt docs generate`,
+    stored next to catalog.json.
+
+    Every entry has the change token of the relation information it was built
+    from, and the relation itself. The driver compares the tokens to the
+    information of the relations, and only sends the information of relations
+    that changed; the others are created from their entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.relations: Dict[str, Dict[str, Any]] = self._read()
+        self._seen: set = set()
+
+    def tokens(self) -> Dict[str, str]:
+        return {key: entry['token'] for key, entry in self.relations.items()}
+
+    def get(self, key: str, token: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """The columns of a relation, if its token (when given) did not change."""
+        entry = self.relations.get(key)
+        if entry is None or (token is not None and entry['token'] != token):
+            return None
+        self._seen.add(key)
+        return entry['columns']
+
+    def get_relation(self, key: str) -> Optional[Dict[str, Any]]:
+        """The type, format flags and information of a relation."""
+        entry = self.relations.get(key)
+        if entry is None:
+            return None
+        self._seen.add(key)
+        return entry['relation']
+
+    def put(
+        self, key: str, token: str, columns: Iterable[Dict[str, Any]], relation: Dict[str, Any]
+    ) -> None:
+        self.relations[key] = {'token': token, 'columns': list(columns), 'relation': relation}
+        self._seen.add(key)
+
+    def save(self) -> None:
+        """Write the relations that were part of this catalog."""
+        relations = {key: self.relations[key] for key in self._seen}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as cache_file:
+                # dumps uses the C encoder, dump streams through the python one
+                cache_file.write(json.dumps(
+                    {'version': CATALOG_CACHE_VERSION, 'relations': relations}))
+            os.replace(temp_path, self.path)
+        except OSError as exc:
+            logger.debug(f'Could not write catalog cache {self.path}: {exc}')
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cached, dict) or cached.get('version') != CATALOG_CACHE_VERSION:
+            return {}
+        return cached.get('relations', {})
@@ -1,20 +1,61 @@
+import atexit
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Optional
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Tuple
+import agate
 import dbt.exceptions # noqa
 from dbt.adapters.base import Credentials
 
 from dbt.events import AdapterLogger
 
-from dbt.contracts.connection import AdapterResponse
+from dbt.clients.agate_helper import empty_table
+from dbt.contracts.connection import AdapterResponse, Connection, LazyHandle
 from dbt.adapters.sql import SQLConnectionManager
 
-from dbt.adapters.synapsespark.synapse_spark import LivyCursor, LivySessionFactory, LivySessionWrapper
+from dbt.adapters.synapsespark.synapse_spark import LivyCursor, LivySessionPool, SynapseStatement
+from dbt.adapters.synapsespark.result_set import LivyResultSet
+from dbt.adapters.synapsespark.statement_engine import PollPolicy
+from dbt.adapters.synapsespark.tracing import CURRENT_NODE
 
+import threading
 import time
 
 logger = AdapterLogger("SynapseSpark")
 
+# The result column with the number of affected rows of a Delta merge,
+# update, delete or insert.
+ROWS_AFFECTED_COLUMN = "num_affected_rows"
+
+# What happens to the Livy sessions at the end of an invocation: `release`
+# cancels what still runs on them and keeps them for the next invocation,
+# `delete` also deletes them when the process exits.
+SESSION_CLEANUP_MODES = ("release", "delete")
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _isoformat_ms(timestamp: Optional[int]) -> Optional[str]:
+    """Livy timestamps are in milliseconds, 0 when not set."""
+    return _isoformat(timestamp / 1000) if timestamp else None
+
+
+@dataclass
+class SynapseSparkAdapterResponse(AdapterResponse):
+    statement_id: Optional[int] = None
+    session_id: Optional[int] = None
+    submitted_at: Optional[str] = None
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    # The statistics of the built relation, when the model analyzed it.
+    table_rows: Optional[int] = None
+    table_bytes: Optional[int] = None
+
 @dataclass
 class SynapseSparkCredentials(Credentials):
     workspace: str
@@ -22,8 +63,48 @@ class SynapseSparkCredentials(Credentials):
     authentication: str
     user: str
     spark_pool: str
-    cluster_configuration: Dict[str, str | int]
-    poll_interval: int
+    # driver_cores, driver_memory, executor_cores, executor_memory,
+    # num_executors, and optionally the spark `conf` of the sessions.
+    cluster_configuration: Dict[str, Any]
+    # The longest wait between two polls of a statement or session. Polling
+    # starts at poll_initial_interval and grows by poll_backoff per poll.
+    poll_interval: float
+    # Every dbt thread gets a Livy session of its own, up to max_sessions.
+    min_sessions: int = 1
+    max_sessions: int = 1
+    poll_initial_interval: float = 0.05
+    poll_backoff: float = 2
+    # Where session ids are remembered between invocations, defaults to
+    # ~/.cache/dbt-synapse-spark/sessions.json.
+    session_registry_path: Optional[str] = None
+    # Start the Livy sessions in the background as soon as the adapter is
+    # created, so the cold start overlaps with parsing and compiling.
+    warm_up: bool = False
+    # Fetch the rows of every statement that returns rows in chunks of at
+    # most stream_chunk_rows rows (and about stream_chunk_bytes bytes).
+    stream_results: bool = False
+    stream_chunk_rows: int = 100000
+    stream_chunk_bytes: Optional[int] = None
+    # Keep the catalog columns of unchanged relations between two
+    # `dbt docs generate` runs, in target/catalog_cache.json.
+    catalog_cache: bool = False
+    # The most bytes (by table statistics) of relations cached with the
+    # spark_cache model config, unlimited by default.
+    spark_cache_budget_bytes: Optional[int] = None
+    # Write the timings of Livy statements, result decoding and metadata
+    # parsing per node to this file (may contain {invocation_id}), as a
+    # Chrome trace or as json lines (trace_format: jsonl).
+    trace_path: Optional[str] = None
+    trace_format: str = "chrome"
+    # Cancel statements that run longer than this many seconds, the
+    # statement_timeout model config overrides it per model.
+    statement_timeout: Optional[float] = None
+    # One of SESSION_CLEANUP_MODES.
+    session_cleanup: str = "release"
+    # Named cluster configurations, which a model selects with the
+    # cluster_profile config. Keys that a profile leaves out are taken from
+    # cluster_configuration, and max_sessions limits its sessions.
+    cluster_profiles: Optional[Dict[str, Dict[str, Any]]] = None
     
     @classmethod
     def __pre_deserialize__(cls, data):
@@ -42,6 +123,11 @@ class SynapseSparkCredentials(Credentials):
                 f" schema."
             )
         self.database = None
+        if self.session_cleanup not in SESSION_CLEANUP_MODES:
+            raise dbt.exceptions.RuntimeException(
+                f"Invalid session_cleanup {self.session_cleanup!r}, expected one of "
+                f"{', '.join(SESSION_CLEANUP_MODES)}"
+            )
 
     @property
     def type(self):
@@ -64,6 +150,9 @@ class SynapseSparkCredentials(Credentials):
 
 class SynapseSparkConnectionManager(SQLConnectionManager):
     TYPE = "synapsespark"
+    # The (workspace, spark pool)s whose sessions are deleted at exit.
+    DELETE_AT_EXIT: Set[Tuple[str, str]] = set()
+    DELETE_AT_EXIT_LOCK = threading.Lock()
 
 
     @contextmanager
@@ -107,13 +196,15 @@ class SynapseSparkConnectionManager(SQLConnectionManager):
         logger.debug("NotImplemented: rollback")
 
     @classmethod
-    def open(cls, connection):
+    def open(cls, connection, cluster_profile: Optional[str] = None):
         """
         Receives a connection object and a Credentials object
         and moves it to the "open" state.
 
-        An handle is this case is actually a statement. So a thread will create
-        a new statement on a Livy Session.
+        An handle is this case is actually a statement. So a thread will check
+        out a Livy session from the pool and create a new statement on it. The
+        session goes back to the pool when the handle is closed. With a
+        `cluster_profile`, the session comes from the pool of that profile.
         """
         start_time = time.process_time()
         #do some stuff
@@ -125,14 +216,11 @@ class SynapseSparkConnectionManager(SQLConnectionManager):
         credentials = connection.credentials
 
         try:
-            handle = LivySessionFactory(
-                workspace_name=credentials.workspace,
-                authentication=credentials.authentication,
-                spark_pool_name=credentials.spark_pool,
-                user=credentials.user,
-                conf=credentials.cluster_configuration,
-                poll_interval=credentials.poll_interval
-            ).connect().get_statement()
+            handle = cls.get_session_pool(credentials, cluster_profile).checkout().get_statement()
+            cursor = handle.cursor()
+            cursor.stream_chunk_rows = credentials.stream_chunk_rows
+            cursor.stream_chunk_bytes = credentials.stream_chunk_bytes
+            cursor.statement_timeout = credentials.statement_timeout
             connection.state = "open"
             connection.handle = handle
         except Exception as exc:
@@ -143,28 +231,302 @@ class SynapseSparkConnectionManager(SQLConnectionManager):
         return connection
 
     @classmethod
-    def get_response(cls,cursor: LivyCursor) -> AdapterResponse:
+    def get_session_pool(cls, credentials: SynapseSparkCredentials,
+                         cluster_profile: Optional[str] = None) -> LivySessionPool:
+        """
+        Return the session pool for these credentials. The first call starts
+        `min_sessions` sessions and blocks until they are available. The
+        sessions of a cluster profile are only started when a model uses it.
+        """
+        conf = credentials.cluster_configuration
+        min_sessions = credentials.min_sessions
+        max_sessions = credentials.max_sessions
+        if cluster_profile is not None:
+            profile = dict(cls.get_cluster_profile(credentials, cluster_profile))
+            max_sessions = profile.pop("max_sessions", max_sessions)
+            spark_conf = {**conf.get("conf", {}), **profile.get("conf", {})}
+            conf = {**conf, **profile, "conf": spark_conf}
+            min_sessions = 0
+        return LivySessionPool.get_pool(
+            workspace_name=credentials.workspace,
+            authentication=credentials.authentication,
+            spark_pool_name=credentials.spark_pool,
+            user=credentials.user,
+            conf=conf,
+            poll_policy=PollPolicy(
+                initial_interval=credentials.poll_initial_interval,
+                max_interval=credentials.poll_interval,
+                backoff=credentials.poll_backoff
+            ),
+            min_sessions=min_sessions,
+            max_sessions=max_sessions,
+            session_registry_path=credentials.session_registry_path,
+            cluster_profile=cluster_profile
+        )
+
+    @staticmethod
+    def get_cluster_profile(credentials: SynapseSparkCredentials,
+                            cluster_profile: str) -> Dict[str, Any]:
+        profiles = credentials.cluster_profiles or {}
+        if cluster_profile not in profiles:
+            raise dbt.exceptions.RuntimeException(
+                f"Unknown cluster_profile {cluster_profile!r}, expected one of the "
+                f"cluster_profiles of the target: {', '.join(sorted(profiles)) or 'none'}"
+            )
+        return profiles[cluster_profile]
+
+    def use_cluster_profile(self, cluster_profile: Optional[str]) -> None:
+        """
+        Run the next statements of this thread on a session of the cluster
+        profile, or of cluster_configuration for None. The session of the
+        other profile goes back to its pool, the new one is checked out when
+        the first statement runs.
+        """
+        if cluster_profile is not None:
+            self.get_cluster_profile(self.profile.credentials, cluster_profile)
+        connection = self.get_thread_connection()
+        if connection.state == "open":
+            handle: SynapseStatement = connection.handle
+            if handle.cluster_profile == cluster_profile:
+                return
+            handle.close()
+        logger.debug(f"On {connection.name}: using cluster profile {cluster_profile}")
+        connection.state = "init"
+        connection.handle = LazyHandle(partial(self.open, cluster_profile=cluster_profile))
+
+    def set_spark_conf(self, conf: Dict[str, Any]) -> None:
+        """Set spark sql conf on this thread's session until restore_spark_conf."""
+        connection = self.get_thread_connection()
+        with self.exception_handler(f"set {conf}"):
+            logger.debug(f"On {connection.name}: set spark conf {conf}")
+            handle: SynapseStatement = connection.handle
+            handle.set_spark_conf(conf)
+
+    def restore_spark_conf(self) -> None:
+        """Put back the spark conf that set_spark_conf changed, if any."""
+        connection = self.get_if_exists()
+        if connection is None or connection.state != "open":
+            return
+        with self.exception_handler("restore spark conf"):
+            handle: SynapseStatement = connection.handle
+            handle.restore_spark_conf()
+
+    @classmethod
+    def warm_up(cls, credentials: SynapseSparkCredentials) -> threading.Thread:
+        """
+        Start the session pool in a background thread. Connections opened
+        in the meantime wait for the warm sessions instead of starting their
+        own.
+        """
+        def warm():
+            try:
+                cls.get_session_pool(credentials)
+            except Exception as exc:
+                logger.debug(f"Warming up Livy sessions failed: {exc}")
+
+        thread = threading.Thread(target=warm, name='livy-session-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def get_response(cls, cursor: Optional[LivyCursor]) -> SynapseSparkAdapterResponse:
         """
         Gets a cursor object and returns adapter-specific information
         about the last executed command generally a AdapterResponse ojbect
         that has items such as code, rows_affected,etc. can also just be a string ex. "OK"
         if your cursor does not offer rich metadata.
+
+        The response is built from the statement the cursor already fetched.
         """
         logger.debug("SynapseSparkConnectionManager - get_response()")
+        if cursor is None or cursor.statement is None:
+            return SynapseSparkAdapterResponse(_message="OK", code="OK", rows_affected=0)
+        statement = cursor.statement
         code = cursor.get_sql_state() or "OK"
-        status_message = f"{code}"
-        return AdapterResponse(
+        rows_affected = cls._get_rows_affected(cursor)
+        status_message = f"{code}" if rows_affected is None else f"{code} {rows_affected}"
+        return SynapseSparkAdapterResponse(
             _message=status_message,
             code=code,
-            rows_affected=0
+            # None when not known, 0 would read as no rows
+            rows_affected=rows_affected,
+            statement_id=statement.id,
+            session_id=cursor.session_id,
+            submitted_at=_isoformat(cursor.submitted_at),
+            started_at=_isoformat_ms(getattr(statement, 'started', None)),
+            completed_at=_isoformat_ms(getattr(statement, 'completed', None)),
         )
 
+    @staticmethod
+    def _get_rows_affected(cursor: LivyCursor) -> Optional[int]:
+        """Delta reports the affected rows of dml as the result of the statement."""
+        result_set = cursor.result_set
+        if not isinstance(result_set, LivyResultSet) or result_set.row_count == 0:
+            return None
+        column_names = result_set.column_names
+        if ROWS_AFFECTED_COLUMN not in column_names:
+            return None
+        value = result_set.columns[column_names.index(ROWS_AFFECTED_COLUMN)][0]
+        return int(value) if value is not None else None
+
+    @classmethod
+    def get_result_from_cursor(cls, cursor: LivyCursor) -> agate.Table:
+        """Build the agate table straight from the columnar result set."""
+        if cursor.result_set is None:
+            return super().get_result_from_cursor(cursor)
+        return cursor.result_set.to_agate_table()
+
+    def execute(
+        self, sql: str, auto_begin: bool = False, fetch: bool = False
+    ) -> Tuple[AdapterResponse, agate.Table]:
+        # With stream_results, the rows of statements that are fetched come
+        # in chunks. Other statements, like dml, have no rows to stream.
+        if fetch and self.profile.credentials.stream_results:
+            response, cursor = self.execute_streaming(sql)
+            try:
+                return response, self.get_result_from_cursor(cursor)
+            finally:
+                cursor.close()
+        return super().execute(sql, auto_begin, fetch)
+
+    def execute_batch(
+        self, sqls: List[str], fetch: bool = False
+    ) -> List[Tuple[AdapterResponse, agate.Table]]:
+        """
+        Run independent statements in one Livy round trip. They all share the
+        response of that Livy statement.
+        """
+        sqls = [self._add_query_comment(sql) for sql in sqls]
+        connection = self.get_thread_connection()
+        batch_sql = "\n;\n".join(sqls)
+        with self.exception_handler(batch_sql):
+            logger.debug(f"On {connection.name}: batch of {len(sqls)} statements\n{batch_sql}")
+            cursor: LivyCursor = connection.handle.cursor()
+            result_sets = cursor.execute_batch(sqls)
+            response = self.get_response(cursor)
+        return [
+            (response, result_set.to_agate_table() if fetch else empty_table())
+            for result_set in result_sets
+        ]
+
+    def execute_code(
+        self, code: str, kind: str = 'pyspark'
+    ) -> Tuple[AdapterResponse, Dict[str, Any]]:
+        """
+        Run a pyspark (or other Livy kind) statement on the thread's session,
+        and return its response and output data, by mime type.
+        """
+        connection = self.get_thread_connection()
+        with self.exception_handler(code):
+            logger.debug(f"On {connection.name}: {kind} statement\n{code}")
+            cursor: LivyCursor = connection.handle.cursor()
+            output = cursor.execute_code(code, kind)
+            return self.get_response(cursor), output
+
+    def add_code_comment(self, code: str) -> str:
+        """
+        Put the query comment of dbt in front of pyspark code, as python
+        comments, so a model's statement can be told apart in Livy and the
+        spark UI like its sql statements.
+        """
+        comment = self._add_query_comment('').strip()
+        if not comment:
+            return code
+        return ''.join(f'# {line}\n' for line in comment.splitlines()) + code
+
+    def cancel_open(self) -> List[str]:
+        """
+        Cancel the statements in flight of all threads at once, rather than
+        connection by connection: a cancelled statement takes a while to stop.
+        """
+        for pool in LivySessionPool.existing_pools():
+            pool.cancel_statements()
+        this_connection = self.get_if_exists()
+        with self.lock:
+            return [
+                connection.name
+                for connection in self.thread_connections.values()
+                if connection is not this_connection and connection.name is not None
+            ]
+
+    def cleanup_sessions(self) -> None:
+        """
+        At the end of a task, cancel the statements that still run on the
+        sessions. With `session_cleanup: delete`, the sessions are deleted
+        when the process exits: a command like `docs generate` cleans up its
+        connections between its tasks, and would otherwise start new
+        sessions for the next one.
+        """
+        credentials = self.profile.credentials
+        for pool in self.pools_of(credentials.workspace, credentials.spark_pool):
+            cancelled = pool.cancel_statements()
+            if cancelled:
+                logger.debug(f"Cancelled {cancelled} statement(s) left running")
+        if credentials.session_cleanup == "delete":
+            key = (credentials.workspace, credentials.spark_pool)
+            with self.DELETE_AT_EXIT_LOCK:
+                if key not in self.DELETE_AT_EXIT:
+                    self.DELETE_AT_EXIT.add(key)
+                    atexit.register(self.delete_sessions, *key)
+
+    @staticmethod
+    def pools_of(workspace: str, spark_pool: str) -> List[LivySessionPool]:
+        """The session pools of this workspace and spark pool, of all cluster profiles."""
+        return [
+            pool for pool in LivySessionPool.existing_pools()
+            if (pool.factory.workspace_name, pool.factory.spark_pool_name) == (workspace, spark_pool)
+        ]
+
+    @classmethod
+    def delete_sessions(cls, workspace: str, spark_pool: str) -> None:
+        for pool in cls.pools_of(workspace, spark_pool):
+            pool.delete_sessions()
+
+    def set_connection_name(self, name: Optional[str] = None) -> Connection:
+        # Spans of the work on this thread belong to the node of the connection,
+        # which dbt names master when there is no node.
+        CURRENT_NODE.set(name if name is not None else 'master')
+        return super().set_connection_name(name)
+
+    def release(self) -> None:
+        # The node is done, later work on this thread is not for it.
+        CURRENT_NODE.set(None)
+        super().release()
+
+    def execute_on_session(self, session_id: int, sql: str) -> None:
+        """
+        Run a statement on a specific session of the pool, to undo state of
+        that session, like a cached table.
+        """
+        credentials = self.profile.credentials
+        for pool in self.pools_of(credentials.workspace, credentials.spark_pool):
+            for session in pool.sessions():
+                if session.livy_session_id == session_id:
+                    with self.exception_handler(sql):
+                        logger.debug(f"On session {session_id}: {sql}")
+                        session.get_statement().cursor().execute(sql)
+                    return
+        logger.debug(f"Session {session_id} is gone, not running: {sql}")
+
+    def execute_streaming(
+        self, sql: str, chunk_rows: Optional[int] = None
+    ) -> Tuple[AdapterResponse, LivyCursor]:
+        """Run a statement and return the cursor, which fetches rows in chunks."""
+        sql = self._add_query_comment(sql)
+        connection = self.get_thread_connection()
+        with self.exception_handler(sql):
+            logger.debug(f"On {connection.name}: streaming {sql}")
+            cursor: LivyCursor = connection.handle.cursor()
+            cursor.execute_streaming(sql, chunk_rows)
+            return self.get_response(cursor), cursor
+
     def cancel(self, connection):
         """
         Gets a connection object and attempts to cancel any ongoing queries.
         """
         logger.debug("SynapseSparkConnectionManager - cancel()")
-        handle: LivySessionWrapper = connection.handle
+        handle: SynapseStatement = connection.handle
+        handle.cancel()
         handle.close()
         # ## Example ##
         # tid = connection.handle.transaction_id()
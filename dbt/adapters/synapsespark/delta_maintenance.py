@@ -0,0 +1,125 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# A table with at least this many files that average less than
+# SMALL_FILE_BYTES is fragmented. These are the defaults of delta's auto
+# compaction (minNumFiles and maxFileSize).
+DEFAULT_MIN_FILES = 50
+SMALL_FILE_BYTES = 128 * 1024 * 1024
+
+# The `describe history` operations after which the files are compacted.
+OPTIMIZE_OPERATIONS = ("OPTIMIZE",)
+# The `describe history` operations that write data files, and count as a run
+# of optimize_every_n_runs. VACUUM, SET TBLPROPERTIES and the like do not.
+WRITE_OPERATIONS = (
+    "WRITE",
+    "STREAMING UPDATE",
+    "MERGE",
+    "UPDATE",
+    "DELETE",
+    "TRUNCATE",
+    "COPY INTO",
+    "CREATE TABLE AS SELECT",
+    "REPLACE TABLE AS SELECT",
+    "CREATE OR REPLACE TABLE AS SELECT",
+)
+# The history that optimize_every_n_runs reads has room for this many other
+# operations between the writes, such as the VACUUM START and END entries of
+# each vacuum.
+OTHER_OPERATIONS_IN_HISTORY = 10
+
+
+@dataclass
+class DeltaMaintenance:
+    """
+    The OPTIMIZE, Z-ORDER and VACUUM maintenance of a delta model, from its
+    optimize, zorder_by, optimize_every_n_runs, optimize_min_files and
+    vacuum_retention_hours configs.
+
+    The table is optimized when it is fragmented according to `describe
+    detail`, or once every `every_n_runs` writes according to `describe
+    history`. It is vacuumed right after the adapter optimized it.
+    """
+
+    optimize: bool = False
+    zorder_by: List[str] = field(default_factory=list)
+    every_n_runs: Optional[int] = None
+    min_files: int = DEFAULT_MIN_FILES
+    vacuum_retention_hours: Optional[int] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        optimize: Optional[bool] = None,
+        zorder_by: Optional[Union[str, List[str]]] = None,
+        every_n_runs: Optional[int] = None,
+        min_files: Optional[int] = None,
+        vacuum_retention_hours: Optional[int] = None,
+    ) -> "DeltaMaintenance":
+        if isinstance(zorder_by, str):
+            zorder_by = [zorder_by]
+        return cls(
+            optimize=bool(optimize) or bool(zorder_by),
+            zorder_by=list(zorder_by or []),
+            every_n_runs=every_n_runs,
+            min_files=DEFAULT_MIN_FILES if min_files is None else min_files,
+            vacuum_retention_hours=vacuum_retention_hours,
+        )
+
+    def history_limit(self) -> int:
+        """The `describe history` entries `due` needs, 0 for none."""
+        if not self.every_n_runs:
+            return 0
+        return self.every_n_runs + OTHER_OPERATIONS_IN_HISTORY
+
+    def due(
+        self, detail: Dict[str, Any], operations: Optional[Sequence[str]] = None
+    ) -> Optional[str]:
+        """
+        The reason the table is due for maintenance, or None. `detail` is the
+        row of `describe detail`, `operations` the operations of `describe
+        history`, newest first. Only the WRITE_OPERATIONS since the last
+        optimize count as runs.
+        """
+        num_files = int(detail.get("numFiles") or 0)
+        size_bytes = int(detail.get("sizeInBytes") or 0)
+        if num_files >= max(self.min_files, 2) and size_bytes / num_files < SMALL_FILE_BYTES:
+            return f"{num_files} files of {size_bytes // num_files} bytes on average"
+        if self.every_n_runs and operations is not None:
+            writes = 0
+            for operation in operations:
+                if operation in OPTIMIZE_OPERATIONS:
+                    break
+                if operation in WRITE_OPERATIONS:
+                    writes += 1
+            if writes >= self.every_n_runs:
+                return f"{writes} writes since the last optimize"
+        return None
+
+    def statements(self, relation: str) -> List[str]:
+        statements = [f"optimize {relation}"]
+        if self.zorder_by:
+            statements[0] += f" zorder by ({', '.join(self.zorder_by)})"
+        if self.vacuum_retention_hours is not None:
+            statements.append(f"vacuum {relation} retain {self.vacuum_retention_hours} hours")
+        return statements
+
+
+# The operationMetrics of `describe history` with the rows an operation
+# changed. The other writes report the rows they wrote as numOutputRows.
+ROWS_AFFECTED_METRICS = {
+    "MERGE": ("numTargetRowsInserted", "numTargetRowsUpdated", "numTargetRowsDeleted"),
+    "UPDATE": ("numUpdatedRows",),
+    "DELETE": ("numDeletedRows",),
+}
+OUTPUT_ROWS_METRIC = "numOutputRows"
+
+
+def rows_affected(operation: str, metrics: Dict[str, str]) -> Optional[int]:
+    """The rows a `describe history` operation changed, None when not reported."""
+    values = [
+        metrics.get(name) for name in ROWS_AFFECTED_METRICS.get(operation, (OUTPUT_ROWS_METRIC,))
+    ]
+    if any(value is None for value in values):
+        return None
+    return sum(int(value) for value in values)
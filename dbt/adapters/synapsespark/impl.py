@@ -4,10 +4,15 @@ from dbt.adapters.synapsespark import SynapseSparkConnectionManager
 
 
 import re
+import base64
+import decimal
+import gzip
 import json
+import os
 from concurrent.futures import Future
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Union, Type
+from functools import partial
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union, Type
 from typing_extensions import TypeAlias
 
 import agate
@@ -16,20 +21,35 @@ from dbt.contracts.relation import RelationType
 import dbt
 import dbt.exceptions
 
-from dbt.adapters.base import AdapterConfig, PythonJobHelper
+from dbt.adapters.base import AdapterConfig, PythonJobHelper, available
 from dbt.adapters.base.impl import catch_as_completed
 from dbt.contracts.connection import AdapterResponse
 from dbt.adapters.sql import SQLAdapter
 from dbt.adapters.synapsespark import SynapseSparkConnectionManager
+from dbt.adapters.synapsespark.connections import SynapseSparkAdapterResponse
 from dbt.adapters.synapsespark import SparkRelation
 from dbt.adapters.synapsespark import SparkColumn
-# from dbt.adapters.synapsespark.python_submissions import (
-#     JobClusterPythonJobHelper,
-#     AllPurposeClusterPythonJobHelper,
-# )
+from dbt.adapters.synapsespark.catalog_cache import (
+    CATALOG_CACHE_FILE_NAME,
+    CatalogCache,
+    change_token,
+)
+from dbt.adapters.synapsespark.delta_maintenance import DeltaMaintenance, rows_affected
+from dbt.adapters.synapsespark.tracing import TRACER
+from dbt.adapters.synapsespark.spark_cache import (
+    SPARK_CACHE_STORAGE_LEVELS,
+    CachedRelation,
+    SparkCacheTracker,
+)
+from dbt.adapters.synapsespark.relation import (
+    parse_relation_information,
+    sql_type_from_tree_string,
+)
+from dbt.adapters.synapsespark.python_submissions import LivySessionPythonJobHelper
 from dbt.adapters.base import BaseRelation
-from dbt.clients.agate_helper import DEFAULT_TYPE_TESTER
+from dbt.clients.agate_helper import DEFAULT_TYPE_TESTER, empty_table, merge_tables
 from dbt.events import AdapterLogger
+from dbt.events.functions import get_invocation_id
 from dbt.utils import executor
 
 logger = AdapterLogger("SynapseSpark")
@@ -40,6 +60,14 @@ LIST_RELATIONS_MACRO_NAME = "list_relations_without_caching"
 DROP_RELATION_MACRO_NAME = "drop_relation"
 FETCH_TBL_PROPERTIES_MACRO_NAME = "fetch_tbl_properties"
 
+# The rows of a seed are inserted with one pyspark statement per chunk.
+SEED_CHUNK_ROWS = 100000
+
+# The relations a statement may create, replace or change.
+STATEMENT_RELATIONS_REGEX = re.compile(
+    r"\b(?:table|view|into)\s+(?:if\s+(?:not\s+)?exists\s+)?([\w`.]+)", re.IGNORECASE
+)
+
 KEY_TABLE_OWNER = "Owner"
 KEY_TABLE_STATISTICS = "Statistics"
 
@@ -53,6 +81,20 @@ class SparkConfig(AdapterConfig):
     buckets: Optional[int] = None
     options: Optional[Dict[str, str]] = None
     merge_update_columns: Optional[str] = None
+    # `range` or `values`, see the get_merge_partition_predicates macro
+    merge_partition_pruning: Optional[str] = None
+    replace_where: Optional[Union[List[str], str]] = None
+    spark_cache: Optional[str] = None
+    statement_timeout: Optional[float] = None
+    cluster_profile: Optional[str] = None
+    spark_conf: Optional[Dict[str, Any]] = None
+    optimize: Optional[bool] = None
+    zorder_by: Optional[Union[str, List[str]]] = None
+    optimize_every_n_runs: Optional[int] = None
+    optimize_min_files: Optional[int] = None
+    vacuum_retention_hours: Optional[int] = None
+    analyze: Optional[bool] = None
+    analyze_columns: Optional[Union[str, List[str]]] = None
 
 
 class SynapseSparkAdapter(SQLAdapter):
@@ -95,6 +137,25 @@ class SynapseSparkAdapter(SQLAdapter):
     ConnectionManager: TypeAlias = SynapseSparkConnectionManager
     AdapterSpecificConfigs: TypeAlias = SparkConfig
 
+    def __init__(self, config):
+        super().__init__(config)
+        # The relations listed by `show table extended` that have not changed
+        # since, by lowercase `schema.identifier`.
+        self._listed_relations: Dict[str, SparkRelation] = {}
+        # The columns of relations that did not change since they were
+        # described in this run, by the same key.
+        self._relation_columns: Dict[str, List[SparkColumn]] = {}
+        self.spark_cache = SparkCacheTracker(config.credentials.spark_cache_budget_bytes)
+        self._spark_cache_warned = False
+        if config.credentials.trace_path:
+            TRACER.configure(
+                config.credentials.trace_path,
+                config.credentials.trace_format,
+                invocation_id=get_invocation_id(),
+            )
+        if config.credentials.warm_up:
+            self.connections.warm_up(config.credentials)
+
     @classmethod
     def date_function(cls) -> str:
         return "current_timestamp()"
@@ -140,7 +201,8 @@ class SynapseSparkAdapter(SQLAdapter):
     ) -> List[SparkRelation]:
         kwargs = {"schema_relation": schema_relation}
         try:
-            results = self.execute_macro(LIST_RELATIONS_MACRO_NAME, kwargs=kwargs)
+            with TRACER.span("adapter.list_relations", schema=schema_relation.schema):
+                results = self.execute_macro(LIST_RELATIONS_MACRO_NAME, kwargs=kwargs)
         except dbt.exceptions.RuntimeException as e:
             errmsg = getattr(e, "msg", "")
             if f"Database '{schema_relation}' not found" in errmsg:
@@ -150,29 +212,166 @@ class SynapseSparkAdapter(SQLAdapter):
                 logger.debug(f"{description} {schema_relation}: {e.msg}")
                 return []
 
-        relations = []
         for row in results:
             if len(row) != 4:
                 raise dbt.exceptions.RuntimeException(
                     f'Invalid value from "show table extended ...", '
                     f"got {len(row)} values, expected 4"
                 )
-            _schema, name, _, information = row
-            rel_type = RelationType.View if "Type: VIEW" in information else RelationType.Table
-            is_delta = "Provider: delta" in information
-            is_hudi = "Provider: hudi" in information
-            relation = self.Relation.create(
-                schema=_schema,
-                identifier=name,
-                type=rel_type,
-                information=information,
-                is_delta=is_delta,
-                is_hudi=is_hudi,
+        return self._relations_from_information([(row[0], row[1], row[3]) for row in results])
+
+    def list_relations_in_schemas(
+        self, schemas: Iterable[str], catalog_cache: Optional[CatalogCache] = None
+    ) -> Dict[str, List[SparkRelation]]:
+        """
+        List the relations of many schemas with one pyspark statement, instead
+        of a `show table extended` round trip per schema. Schemas that do not
+        exist have no relations. The relations in `catalog_cache` that did not
+        change are created from it, without sending or parsing their
+        information again.
+        """
+        listed = self._list_information_in_schemas(
+            schemas, catalog_cache.tokens() if catalog_cache is not None else None
+        )
+        return {
+            schema: self._relations_from_information(rows, catalog_cache)
+            for schema, rows in listed.items()
+        }
+
+    def _list_information_in_schemas(
+        self, schemas: Iterable[str], known_tokens: Optional[Dict[str, str]] = None
+    ) -> Dict[str, List[Tuple[str, str, Optional[str]]]]:
+        """
+        The schema, name and information of the relations in the schemas. The
+        information is None for relations whose change token is in
+        `known_tokens`, by `schema.identifier`.
+        """
+        schemas = sorted(set(schemas))
+        with TRACER.span("adapter.list_relations", schemas=len(schemas)):
+            _, output = self.connections.execute_code(
+                LIST_RELATIONS_CODE.format(schemas=repr(schemas), known=repr(known_tokens or {}))
             )
+            listed = json.loads(output["text/plain"])
+        return {schema: [tuple(row) for row in listed.get(schema, [])] for schema in schemas}
+
+    def _relations_from_information(
+        self,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+        catalog_cache: Optional[CatalogCache] = None,
+    ) -> List[SparkRelation]:
+        """
+        Create the relations from the schema, name and information of `show
+        table extended`. Without information, the relation did not change
+        since it was put in `catalog_cache`.
+        """
+        relations = []
+        for _schema, name, information in rows:
+            key = self._relation_key(_schema, name)
+            if information is None:
+                cached = catalog_cache.get_relation(key)  # type: ignore[union-attr]
+                relation = self.Relation.create(
+                    schema=_schema,
+                    identifier=name,
+                    type=RelationType(cached["type"]),
+                    information=cached["information"],
+                    is_delta=cached["is_delta"],
+                    is_hudi=cached["is_hudi"],
+                )
+            else:
+                parsed = parse_relation_information(information)
+                relation = self.Relation.create(
+                    schema=_schema,
+                    identifier=name,
+                    type=RelationType.View if parsed.is_view else RelationType.Table,
+                    information=information,
+                    is_delta=parsed.is_delta,
+                    is_hudi=parsed.is_hudi,
+                )
             relations.append(relation)
+            self._listed_relations[key] = relation
+            self._relation_columns.pop(key, None)
 
         return relations
 
+    @staticmethod
+    def _relation_key(schema: Optional[str], identifier: Optional[str]) -> str:
+        return f"{schema}.{identifier}".lower()
+
+    def _forget_relation(self, relation: Optional[BaseRelation]) -> None:
+        if relation is not None:
+            key = self._relation_key(relation.schema, relation.identifier)
+            self._listed_relations.pop(key, None)
+            self._relation_columns.pop(key, None)
+
+    def _forget_statement_relations(self, sql: str) -> None:
+        """
+        Forget what is known about the relations a statement may create,
+        replace or change.
+        """
+        for name in STATEMENT_RELATIONS_REGEX.findall(sql):
+            parts = name.replace("`", "").lower().split(".")
+            if len(parts) >= 2:
+                key = ".".join(parts[-2:])
+                self._listed_relations.pop(key, None)
+                self._relation_columns.pop(key, None)
+                continue
+            # A temporary view, or a relation of the current schema.
+            suffix = f".{parts[0]}"
+            for known in (self._listed_relations, self._relation_columns):
+                for key in [key for key in list(known) if key.endswith(suffix)]:
+                    known.pop(key, None)
+
+    @available
+    def cache_added(self, relation: Optional[BaseRelation]) -> str:
+        self._forget_relation(relation)
+        return super().cache_added(relation)
+
+    @available
+    def cache_dropped(self, relation: Optional[BaseRelation]) -> str:
+        self._forget_relation(relation)
+        return super().cache_dropped(relation)
+
+    @available
+    def cache_renamed(
+        self,
+        from_relation: Optional[BaseRelation],
+        to_relation: Optional[BaseRelation],
+    ) -> str:
+        self._forget_relation(from_relation)
+        self._forget_relation(to_relation)
+        return super().cache_renamed(from_relation, to_relation)
+
+    @available.parse(lambda *a, **k: ("", empty_table()))
+    def execute(
+        self, sql: str, auto_begin: bool = False, fetch: bool = False
+    ) -> Tuple[AdapterResponse, agate.Table]:
+        # A statement may (re)create or alter a relation that was listed or
+        # described, what is known about it is no longer fresh.
+        self._forget_statement_relations(sql)
+        return super().execute(sql, auto_begin=auto_begin, fetch=fetch)
+
+    def _relations_cache_for_schemas(
+        self, manifest, cache_schemas: Optional[Set[BaseRelation]] = None
+    ) -> None:
+        if not cache_schemas:
+            cache_schemas = self._get_cache_schemas(manifest)
+        try:
+            with self.connection_named("list_relations"):
+                listed = self.list_relations_in_schemas(
+                    (cache_schema.schema for cache_schema in cache_schemas),
+                    self._get_catalog_cache(),
+                )
+        except dbt.exceptions.RuntimeException as e:
+            logger.debug(f"Listing all schemas at once failed, listing them one by one: {e}")
+            return super()._relations_cache_for_schemas(manifest, cache_schemas)
+
+        for relations in listed.values():
+            for relation in relations:
+                self.cache.add(relation)
+        self.cache.update_schemas(
+            (cache_schema.database, cache_schema.schema) for cache_schema in cache_schemas
+        )
+
     def get_relation(self, database: str, schema: str, identifier: str) -> Optional[BaseRelation]:
         if not self.Relation.include_policy.database:
             database = None  # type: ignore
@@ -182,32 +381,33 @@ class SynapseSparkAdapter(SQLAdapter):
     def parse_describe_extended(
         self, relation: Relation, raw_rows: List[agate.Row]
     ) -> List[SparkColumn]:
-        # Convert the Row to a dict
-        dict_rows = [dict(zip(row._keys, row._values)) for row in raw_rows]
-        # Find the separator between the rows and the metadata provided
-        # by the DESCRIBE TABLE EXTENDED statement
-        pos = self.find_table_information_separator(dict_rows)
-
-        # Remove rows that start with a hash, they are comments
-        rows = [row for row in raw_rows[0:pos] if not row["col_name"].startswith("#")]
-        metadata = {col["col_name"]: col["data_type"] for col in raw_rows[pos + 1 :]}
-
-        raw_table_stats = metadata.get(KEY_TABLE_STATISTICS)
-        table_stats = SparkColumn.convert_table_stats(raw_table_stats)
-        return [
-            SparkColumn(
-                table_database=None,
-                table_schema=relation.schema,
-                table_name=relation.name,
-                table_type=relation.type,
-                table_owner=str(metadata.get(KEY_TABLE_OWNER)),
-                table_stats=table_stats,
-                column=column["col_name"],
-                column_index=idx,
-                dtype=column["data_type"],
-            )
-            for idx, column in enumerate(rows)
-        ]
+        with TRACER.span("adapter.parse_describe_extended", relation=str(relation)):
+            # Convert the Row to a dict
+            dict_rows = [dict(zip(row._keys, row._values)) for row in raw_rows]
+            # Find the separator between the rows and the metadata provided
+            # by the DESCRIBE TABLE EXTENDED statement
+            pos = self.find_table_information_separator(dict_rows)
+
+            # Remove rows that start with a hash, they are comments
+            rows = [row for row in raw_rows[0:pos] if not row["col_name"].startswith("#")]
+            metadata = {col["col_name"]: col["data_type"] for col in raw_rows[pos + 1 :]}
+
+            raw_table_stats = metadata.get(KEY_TABLE_STATISTICS)
+            table_stats = SparkColumn.convert_table_stats(raw_table_stats)
+            return [
+                SparkColumn(
+                    table_database=None,
+                    table_schema=relation.schema,
+                    table_name=relation.name,
+                    table_type=relation.type,
+                    table_owner=str(metadata.get(KEY_TABLE_OWNER)),
+                    table_stats=table_stats,
+                    column=column["col_name"],
+                    column_index=idx,
+                    dtype=column["data_type"],
+                )
+                for idx, column in enumerate(rows)
+            ]
 
     @staticmethod
     def find_table_information_separator(rows: List[dict]) -> int:
@@ -219,6 +419,16 @@ class SynapseSparkAdapter(SQLAdapter):
         return pos
 
     def get_columns_in_relation(self, relation: Relation) -> List[SparkColumn]:
+        key = self._relation_key(relation.schema, relation.identifier)
+        columns = self._relation_columns.get(key)
+        if columns is not None:
+            return list(columns)
+
+        columns = self._get_listed_columns(relation)
+        if columns is not None:
+            self._relation_columns[key] = columns
+            return list(columns)
+
         columns = []
         try:
             rows: List[agate.Row] = self.execute_macro(
@@ -236,31 +446,59 @@ class SynapseSparkAdapter(SQLAdapter):
 
         # strip hudi metadata columns.
         columns = [x for x in columns if x.name not in self.HUDI_METADATA_COLUMNS]
-        return columns
+        # A relation that does not exist (yet) is described again.
+        if columns:
+            self._relation_columns[key] = columns
+        return list(columns)
+
+    def _get_listed_columns(self, relation: Relation) -> Optional[List[SparkColumn]]:
+        """
+        The columns of a relation from the information of the last listing,
+        as `describe extended` would return them. None when the relation
+        changed since, or when the information does not have every type.
+        """
+        listed = self._listed_relations.get(
+            self._relation_key(relation.schema, relation.identifier)
+        )
+        if listed is None:
+            return None
+        parsed = listed.parsed_information
+        if not parsed.columns or not parsed.has_complete_column_types:
+            return None
+        table_stats = SparkColumn.convert_table_stats(parsed.statistics)
+        return [
+            SparkColumn(
+                table_database=None,
+                table_schema=listed.schema,
+                table_name=listed.name,
+                table_type=listed.type,
+                table_owner=str(parsed.owner),
+                table_stats=table_stats,
+                column=column_name,
+                column_index=idx,
+                dtype=sql_type_from_tree_string(column_type),
+            )
+            for idx, (column_name, column_type, _) in enumerate(parsed.columns)
+            if column_name not in self.HUDI_METADATA_COLUMNS
+        ]
 
     def parse_columns_from_information(self, relation: SparkRelation) -> List[SparkColumn]:
-        owner_match = re.findall(self.INFORMATION_OWNER_REGEX, relation.information)
-        owner = owner_match[0] if owner_match else None
-        matches = re.finditer(self.INFORMATION_COLUMNS_REGEX, relation.information)
-        columns = []
-        stats_match = re.findall(self.INFORMATION_STATISTICS_REGEX, relation.information)
-        raw_table_stats = stats_match[0] if stats_match else None
-        table_stats = SparkColumn.convert_table_stats(raw_table_stats)
-        for match_num, match in enumerate(matches):
-            column_name, column_type, nullable = match.groups()
-            column = SparkColumn(
+        parsed = relation.parsed_information
+        table_stats = SparkColumn.convert_table_stats(parsed.statistics)
+        return [
+            SparkColumn(
                 table_database=None,
                 table_schema=relation.schema,
                 table_name=relation.table,
                 table_type=relation.type,
-                column_index=match_num,
-                table_owner=owner,
+                column_index=idx,
+                table_owner=parsed.owner,
                 column=column_name,
                 dtype=column_type,
                 table_stats=table_stats,
             )
-            columns.append(column)
-        return columns
+            for idx, (column_name, column_type, _) in enumerate(parsed.columns)
+        ]
 
     def _get_columns_for_catalog(self, relation: SparkRelation) -> Iterable[Dict[str, Any]]:
         columns = self.parse_columns_from_information(relation)
@@ -273,6 +511,273 @@ class SynapseSparkAdapter(SQLAdapter):
             as_dict["table_database"] = None
             yield as_dict
 
+    @available
+    def load_seed_rows(
+        self, relation: SparkRelation, agate_table: agate.Table, column_types: List[str]
+    ) -> int:
+        """
+        Insert the rows of a seed into its (existing) table with pyspark
+        statements. The rows are sent gzipped in the statement itself, read
+        into a DataFrame of strings and cast to the column types, which
+        avoids parsing huge `insert ... values` literal plans.
+        """
+        rows = [[self._seed_value(value) for value in row] for row in agate_table.rows]
+        for start in range(0, len(rows), SEED_CHUNK_ROWS):
+            chunk = json.dumps(rows[start : start + SEED_CHUNK_ROWS]).encode("utf-8")
+            payload = base64.b64encode(gzip.compress(chunk)).decode("ascii")
+            self.connections.execute_code(
+                SEED_CODE.format(
+                    payload=repr(payload),
+                    column_types=repr(list(column_types)),
+                    relation=repr(relation.render()),
+                )
+            )
+        return len(rows)
+
+    @staticmethod
+    def _seed_value(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, decimal.Decimal):
+            # avoid exponents, spark does not cast '1E+2' to a bigint
+            return format(value, "f")
+        return str(value)
+
+    @available
+    def execute_batch(
+        self, sqls: List[str], fetch: bool = False
+    ) -> List[Tuple[AdapterResponse, agate.Table]]:
+        """Run independent statements in one Livy round trip."""
+        if not sqls:
+            return []
+        for sql in sqls:
+            self._forget_statement_relations(sql)
+        return self.connections.execute_batch(sqls, fetch=fetch)
+
+    @available
+    def set_spark_conf(self, conf: Dict[str, Any]) -> str:
+        """
+        Set spark sql conf for the rest of the model. post_model_hook puts
+        back the values from before, so it does not leak into the next model
+        on the session.
+        """
+        self.connections.set_spark_conf(conf)
+        return ""
+
+    @available
+    def stream_query(self, sql: str, chunk_rows: Optional[int] = None) -> Iterator[agate.Table]:
+        """
+        Run a query that returns many rows, and yield them as an agate table
+        per chunk. The rows are pulled from Livy in chunks instead of one
+        statement output that has to fit in the memory of the spark driver,
+        and only one chunk is held at a time.
+        """
+        _, cursor = self.connections.execute_streaming(sql, chunk_rows)
+        # Statements in between chunks use the cursor, they must not drop the spool.
+        result_set, cursor.result_set = cursor.result_set, None
+
+        def chunks() -> Iterator[agate.Table]:
+            try:
+                for chunk in result_set.chunks():
+                    yield chunk.to_agate_table()
+            finally:
+                result_set.close()
+
+        return chunks()
+
+    @available
+    def spark_cache_relation(
+        self, relation: SparkRelation, storage: Optional[str], dependents: List[str]
+    ) -> str:
+        """
+        Cache a relation on the session that built it, until the nodes that
+        read it have finished. The table is cached lazily, on its first read.
+
+        Spark caches per Livy session, so a node that reads the relation on
+        another session would not benefit, while the cached bytes still count
+        against the budget. The relation is only cached when all models run
+        on one session.
+        """
+        if storage in (None, "none") or not dependents:
+            return ""
+        if storage not in SPARK_CACHE_STORAGE_LEVELS:
+            dbt.exceptions.raise_compiler_error(
+                f"Invalid spark_cache {storage!r}, expected one of "
+                f"{', '.join(list(SPARK_CACHE_STORAGE_LEVELS) + ['none'])}"
+            )
+        credentials = self.config.credentials
+        if credentials.max_sessions > 1 or credentials.cluster_profiles:
+            if not self._spark_cache_warned:
+                self._spark_cache_warned = True
+                logger.warning(
+                    "spark_cache is ignored: the models of this target run on more than "
+                    "one Livy session, and spark only caches a table for its own session. "
+                    "Set max_sessions: 1 and no cluster_profiles to cache relations."
+                )
+            return ""
+        response, _ = self.execute(
+            f"cache lazy table {relation} "
+            f"options ('storageLevel' '{SPARK_CACHE_STORAGE_LEVELS[storage]}')"
+        )
+        columns = self.get_columns_in_relation(relation)
+        table_stats = (columns[0].table_stats or {}) if columns else {}
+        size_bytes = table_stats.get("stats:bytes:value", 0)
+        evicted = self.spark_cache.add(
+            CachedRelation(
+                relation=relation.render(),
+                session_id=response.session_id,
+                size_bytes=int(size_bytes or 0),
+                dependents=set(dependents),
+            )
+        )
+        self._uncache(evicted)
+        return ""
+
+    @available
+    def spark_cache_node_finished(self, unique_id: str) -> str:
+        """Release the cached relations no other node has to read anymore."""
+        self._uncache(self.spark_cache.node_finished(unique_id))
+        return ""
+
+    @available
+    def maintain_delta_relation(
+        self,
+        relation: SparkRelation,
+        optimize: Optional[bool] = None,
+        zorder_by: Optional[Union[str, List[str]]] = None,
+        every_n_runs: Optional[int] = None,
+        min_files: Optional[int] = None,
+        vacuum_retention_hours: Optional[int] = None,
+        response: Optional[AdapterResponse] = None,
+    ) -> Optional[AdapterResponse]:
+        """
+        Optimize (and vacuum) a delta table when it is fragmented or was
+        written `every_n_runs` times since it was last optimized. The detail
+        and history of the table are read in one Livy round trip, and the
+        maintenance statements run in another.
+
+        Returns `response`, with the rows the last write affected from the
+        history of the table when the statement did not report them. Failed
+        maintenance is logged as a warning, it does not fail the model.
+        """
+        maintenance = DeltaMaintenance.from_config(
+            optimize, zorder_by, every_n_runs, min_files, vacuum_retention_hours
+        )
+        count_rows = (
+            isinstance(response, SynapseSparkAdapterResponse) and response.rows_affected is None
+        )
+        sqls = [f"describe detail {relation}"] if maintenance.optimize else []
+        history_limit = max(maintenance.history_limit(), 1 if count_rows else 0)
+        if history_limit:
+            sqls.append(f"describe history {relation} limit {history_limit}")
+        if not sqls:
+            return response
+        try:
+            results = self.execute_batch(sqls, fetch=True)
+        except dbt.exceptions.RuntimeException as e:
+            logger.warning(f"Could not read the detail and history of {relation}: {e}")
+            return response
+
+        operations = None
+        if history_limit:
+            history_table = results[-1][1]
+            column = history_table.column_names.index("operation")
+            operations = [row[column] for row in history_table.rows]
+            if count_rows and history_table.rows:
+                metrics = history_table.rows[0][history_table.column_names.index("operationMetrics")]
+                if isinstance(metrics, str):
+                    # a map is json in the agate table
+                    metrics = json.loads(metrics)
+                response = replace(
+                    response,  # type: ignore[arg-type]
+                    rows_affected=rows_affected(operations[0], metrics or {}),
+                )
+        if not maintenance.optimize:
+            return response
+        detail_table = results[0][1]
+        detail = dict(zip(detail_table.column_names, detail_table.rows[0])) if detail_table.rows else {}
+        reason = maintenance.due(detail, operations if maintenance.every_n_runs else None)
+        if reason is None:
+            logger.debug(f"No maintenance due for {relation}")
+            return response
+        logger.debug(f"Optimizing {relation}: {reason}")
+        try:
+            self.execute_batch(maintenance.statements(str(relation)))
+        except dbt.exceptions.RuntimeException as e:
+            logger.warning(f"Could not optimize {relation}, the model is built: {e}")
+        return response
+
+    @available
+    def analyze_relation(
+        self,
+        relation: SparkRelation,
+        columns: Optional[Union[str, List[str]]] = None,
+        partitions: Optional[List[str]] = None,
+        response: Optional[AdapterResponse] = None,
+    ) -> Optional[AdapterResponse]:
+        """
+        Compute the statistics of a relation, for its `partitions` specs only
+        when given, and for `columns` (or 'all'). The statements and the
+        `describe table extended` that reads the result back take one Livy
+        round trip. Returns `response` with the row and byte counts.
+
+        Partition statistics leave those of the table as they were, so the
+        size of the table is then updated without a scan, and the row count,
+        which that can not update, is not reported. When the statistics can
+        not be computed, a warning is logged and `response` is returned as is.
+        """
+        if partitions is not None and not partitions:
+            logger.debug(f"No new partitions of {relation} to analyze")
+            return response
+        analyze = f"analyze table {relation}"
+        if partitions:
+            sqls = [f"{analyze} partition ({spec}) compute statistics" for spec in partitions]
+            sqls.append(f"{analyze} compute statistics noscan")
+        elif not columns:
+            sqls = [f"{analyze} compute statistics"]
+        else:
+            # column statistics include the table statistics
+            sqls = []
+        if columns == "all":
+            sqls.append(f"{analyze} compute statistics for all columns")
+        elif columns:
+            columns = [columns] if isinstance(columns, str) else columns
+            sqls.append(f"{analyze} compute statistics for columns {', '.join(columns)}")
+        sqls.append(f"describe table extended {relation}")
+        try:
+            results = self.execute_batch(sqls, fetch=True)
+        except dbt.exceptions.RuntimeException as e:
+            # ANALYZE TABLE is not supported for every format, such as v2
+            # (delta) tables on some spark versions, and the model is built.
+            logger.warning(f"Could not analyze {relation}: {e}")
+            return response
+
+        # The description is fresh, keep it for later column lookups.
+        described = [
+            column
+            for column in self.parse_describe_extended(relation, list(results[-1][1].rows))
+            if column.name not in self.HUDI_METADATA_COLUMNS
+        ]
+        if described:
+            self._relation_columns[self._relation_key(relation.schema, relation.identifier)] = described
+        table_stats = (described[0].table_stats or {}) if described else {}
+        rows = table_stats.get("stats:rows:value") if not partitions else None
+        size_bytes = table_stats.get("stats:bytes:value")
+        logger.debug(f"Analyzed {relation}: {rows} rows, {size_bytes} bytes")
+        if not isinstance(response, SynapseSparkAdapterResponse):
+            return response
+        return replace(response, table_rows=rows, table_bytes=size_bytes)
+
+    def _uncache(self, relations: List[CachedRelation]) -> None:
+        for cached in relations:
+            logger.debug(f"Uncaching {cached.relation} ({cached.size_bytes} bytes)")
+            try:
+                self.connections.execute_on_session(
+                    cached.session_id, f"uncache table if exists {cached.relation}"
+                )
+            except dbt.exceptions.RuntimeException as e:
+                logger.debug(f"Could not uncache {cached.relation}: {e}")
+
     def get_properties(self, relation: Relation) -> Dict[str, str]:
         properties = self.execute_macro(
             FETCH_TBL_PROPERTIES_MACRO_NAME, kwargs={"relation": relation}
@@ -286,22 +791,93 @@ class SynapseSparkAdapter(SQLAdapter):
                 f"Expected only one database in get_catalog, found " f"{list(schema_map)}"
             )
 
+        catalog_cache = self._get_catalog_cache()
+        columns: List[Dict[str, Any]] = []
+        uncached: Dict[Any, List[str]] = {}
+        for info, schemas in schema_map.items():
+            for schema in schemas:
+                if self._schema_is_cached(info.database, schema):
+                    for relation in self.cache.get_relations(info.database, schema):
+                        columns.extend(self._get_cached_columns_for_catalog(relation, catalog_cache))
+                else:
+                    uncached.setdefault(info, []).append(schema)
+
+        catalogs: List[agate.Table] = []
+        exceptions: List[Exception] = []
+        for info, schemas in uncached.items():
+            try:
+                with self.connection_named("catalog"):
+                    listed = self.list_relations_in_schemas(schemas, catalog_cache)
+            except dbt.exceptions.RuntimeException as e:
+                logger.debug(f"Listing all schemas at once failed, listing them one by one: {e}")
+                catalog, schema_exceptions = self._get_catalogs_in_parallel(
+                    info, schemas, manifest
+                )
+                catalogs.append(catalog)
+                exceptions.extend(schema_exceptions)
+                continue
+            for relations in listed.values():
+                for relation in relations:
+                    columns.extend(self._get_cached_columns_for_catalog(relation, catalog_cache))
+
+        if catalog_cache is not None:
+            catalog_cache.save()
+        catalogs.insert(0, agate.Table.from_object(columns, column_types=DEFAULT_TYPE_TESTER))
+        return merge_tables(catalogs), exceptions
+
+    def _get_catalog_cache(self) -> Optional[CatalogCache]:
+        if not self.config.credentials.catalog_cache:
+            return None
+        target_path = os.path.join(self.config.project_root, self.config.target_path)
+        return CatalogCache(os.path.join(target_path, CATALOG_CACHE_FILE_NAME))
+
+    def _get_cached_columns_for_catalog(
+        self, relation: SparkRelation, catalog_cache: Optional[CatalogCache]
+    ) -> List[Dict[str, Any]]:
+        if catalog_cache is None or relation.information is None:
+            return list(self._get_columns_for_catalog(relation))
+        key = self._relation_key(relation.schema, relation.identifier)
+        token = change_token(relation.information)
+        columns = catalog_cache.get(key, token)
+        if columns is None:
+            columns = list(self._get_columns_for_catalog(relation))
+            catalog_cache.put(
+                key,
+                token,
+                columns,
+                {
+                    "type": relation.type,
+                    "information": relation.information,
+                    "is_delta": relation.is_delta,
+                    "is_hudi": relation.is_hudi,
+                },
+            )
+        return columns
+
+    def _get_catalogs_in_parallel(
+        self, information_schema, schemas: List[str], manifest
+    ) -> Tuple[agate.Table, List[Exception]]:
+        # One future per schema, at most `threads` at a time.
         with executor(self.config) as tpe:
-            futures: List[Future[agate.Table]] = []
-            for info, schemas in schema_map.items():
-                for schema in schemas:
-                    futures.append(
-                        tpe.submit_connected(
-                            self,
-                            schema,
-                            self._get_one_catalog,
-                            info,
-                            [schema],
-                            manifest,
-                        )
-                    )
-            catalogs, exceptions = catch_as_completed(futures)
-        return catalogs, exceptions
+            futures: List[Future[agate.Table]] = [
+                tpe.submit_connected(
+                    self,
+                    schema,
+                    self._get_one_catalog,
+                    information_schema,
+                    [schema],
+                    manifest,
+                )
+                for schema in schemas
+            ]
+            return catch_as_completed(futures)
+
+    def _catalog_from_relations(self, relations: Iterable[SparkRelation]) -> agate.Table:
+        """Build the catalog of relations in one pass over their columns."""
+        columns: List[Dict[str, Any]] = []
+        for relation in relations:
+            columns.extend(self._get_columns_for_catalog(relation))
+        return agate.Table.from_object(columns, column_types=DEFAULT_TYPE_TESTER)
 
     def _get_one_catalog(
         self,
@@ -317,11 +893,7 @@ class SynapseSparkAdapter(SQLAdapter):
         database = information_schema.database
         schema = list(schemas)[0]
 
-        columns: List[Dict[str, Any]] = []
-        for relation in self.list_relations(database, schema):
-            logger.debug("Getting table schema for relation {}", relation)
-            columns.extend(self._get_columns_for_catalog(relation))
-        return agate.Table.from_object(columns, column_types=DEFAULT_TYPE_TESTER)
+        return self._catalog_from_relations(self.list_relations(database, schema))
 
     def check_schema_exists(self, database, schema):
         results = self.execute_macro(LIST_SCHEMAS_MACRO_NAME, kwargs={"database": database})
@@ -381,19 +953,32 @@ class SynapseSparkAdapter(SQLAdapter):
         finally:
             conn.transaction_open = False
 
+    def submit_python_job(self, parsed_model: dict, compiled_code: str) -> AdapterResponse:
+        # The model (re)writes its table from pyspark, not through `execute`,
+        # and may change any other relation on the way.
+        self._listed_relations.pop(
+            self._relation_key(parsed_model["schema"], parsed_model["alias"]), None
+        )
+        self._relation_columns.clear()
+        return super().submit_python_job(parsed_model, compiled_code)
+
     def generate_python_submission_response(self, submission_result: Any) -> AdapterResponse:
+        if isinstance(submission_result, AdapterResponse):
+            return submission_result
         return self.connections.get_response(None)
 
     @property
     def default_python_submission_method(self) -> str:
-        return "all_purpose_cluster"
+        return "livy_session"
 
-    # @property
-    # def python_submission_helpers(self) -> Dict[str, Type[PythonJobHelper]]:
-    #     return {
-    #         "job_cluster": JobClusterPythonJobHelper,
-    #         "all_purpose_cluster": AllPurposeClusterPythonJobHelper,
-    #     }
+    @property
+    def python_submission_helpers(self) -> Dict[str, Type[PythonJobHelper]]:
+        return {
+            # the helper runs the code on the connection of the model's thread
+            "livy_session": partial(  # type: ignore
+                LivySessionPythonJobHelper, connections=self.connections
+            ),
+        }
 
     def standardize_grants_dict(self, grants_table: agate.Table) -> dict:
         grants_dict: Dict[str, List[str]] = {}
@@ -417,8 +1002,43 @@ class SynapseSparkAdapter(SQLAdapter):
 
         self.connections.handle.close()
 
+    def pre_model_hook(self, config: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Apply the model's settings to its connection and cursor. Returns
+        the previous values, which post_model_hook restores: the connection
+        is reused by the next node of the thread.
+        """
+        previous: Dict[str, Any] = {}
+        cluster_profile = config.get("cluster_profile")
+        if cluster_profile is not None:
+            # Before the cursor settings, which belong to the new session.
+            self.connections.use_cluster_profile(cluster_profile)
+            previous["cluster_profile"] = cluster_profile
+        statement_timeout = config.get("statement_timeout")
+        if statement_timeout is not None:
+            cursor = self.connections.get_thread_connection().handle.cursor()
+            previous["statement_timeout"] = cursor.statement_timeout
+            cursor.statement_timeout = statement_timeout
+        spark_conf = config.get("spark_conf")
+        if spark_conf:
+            self.connections.set_spark_conf(spark_conf)
+        return previous
+
+    def post_model_hook(self, config: Mapping[str, Any], context: Dict[str, Any]) -> None:
+        # Also what the materialization set with set_spark_conf.
+        self.connections.restore_spark_conf()
+        if "statement_timeout" in context:
+            cursor = self.connections.get_thread_connection().handle.cursor()
+            cursor.statement_timeout = context["statement_timeout"]
+        if "cluster_profile" in context:
+            self.connections.use_cluster_profile(None)
+
     def cleanup_connections(self) -> None:
+        # The sessions outlive the invocation, do not leave tables cached.
+        self._uncache(self.spark_cache.pop_all())
         self.connections.cleanup_all()
+        self.connections.cleanup_sessions()
+        TRACER.flush()
         logger.debug("cleanup_connections")
 
         # close all sessions
@@ -462,3 +1082,54 @@ select
 from row_count_diff
 cross join diff_count
 """.strip()
+
+# Inserts the gzipped rows of a seed into its table, casting the string
+# values to the column types.
+SEED_CODE = """
+import base64
+import gzip
+import json
+from pyspark.sql import functions as F
+from pyspark.sql.types import StringType, StructField, StructType
+
+_dbt_column_types = {column_types}
+_dbt_rows = json.loads(gzip.decompress(base64.b64decode({payload})).decode("utf-8"))
+_dbt_schema = StructType(
+    [StructField(f"_c{{i}}", StringType()) for i in range(len(_dbt_column_types))]
+)
+_dbt_df = spark.createDataFrame(_dbt_rows, _dbt_schema).select(
+    [F.col(f"_c{{i}}").cast(t) for i, t in enumerate(_dbt_column_types)]
+)
+_dbt_df.write.insertInto({relation})
+""".strip()
+
+LIST_RELATIONS_CODE = """
+import hashlib
+import json
+from pyspark.sql.utils import AnalysisException
+
+_dbt_known = {known}
+
+
+def _dbt_information(schema, name, information):
+    # Leave out the information of relations that did not change, the same
+    # way as catalog_cache.change_token.
+    key = f"{{schema}}.{{name}}".lower()
+    if key in _dbt_known:
+        lines = [l for l in information.splitlines() if not l.startswith("Last Access:")]
+        if hashlib.sha1("\\n".join(lines).encode("utf-8")).hexdigest() == _dbt_known[key]:
+            return None
+    return information
+
+
+_dbt_relations = {{}}
+for _dbt_schema in {schemas}:
+    try:
+        _dbt_rows = spark.sql(f"show table extended in `{{_dbt_schema}}` like '*'").collect()
+    except AnalysisException:
+        _dbt_rows = []
+    _dbt_relations[_dbt_schema] = [
+        [r[0], r[1], _dbt_information(r[0], r[1], r[3])] for r in _dbt_rows
+    ]
+print(json.dumps(_dbt_relations))
+""".strip()
@@ -0,0 +1,37 @@
+from typing import Dict
+
+from dbt.adapters.base import PythonJobHelper
+from dbt.adapters.synapsespark.connections import (
+    SynapseSparkAdapterResponse,
+    SynapseSparkConnectionManager,
+    SynapseSparkCredentials,
+)
+
+
+class LivySessionPythonJobHelper(PythonJobHelper):
+    """
+    Runs the code of a python model as a pyspark statement on the Livy session
+    of the model's connection.
+
+    The session is already running, so there is no cold start of a separate
+    spark job per model, and temporary views and cached DataFrames the model
+    creates are still there for the statements that follow it, like the merge
+    of an incremental model.
+    """
+
+    def __init__(
+        self,
+        parsed_model: Dict,
+        credential: SynapseSparkCredentials,
+        connections: SynapseSparkConnectionManager,
+    ) -> None:
+        self.parsed_model = parsed_model
+        self.credential = credential
+        self.connections = connections
+
+    def submit(self, compiled_code: str) -> SynapseSparkAdapterResponse:
+        # sql models run pyspark here too, for the replace_where strategy
+        response, _ = self.connections.execute_code(
+            self.connections.add_code_comment(compiled_code), kind='pyspark'
+        )
+        return response
@@ -1,4 +1,6 @@
-from typing import Optional
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
 from dataclasses import dataclass
 
@@ -6,6 +8,100 @@ from dbt.adapters.base.relation import BaseRelation, Policy
 from dbt.exceptions import RuntimeException
 
 
+INFORMATION_COLUMNS_REGEX = re.compile(r"^ \|-- (.*): (.*) \(nullable = (.*)\b", re.MULTILINE)
+INFORMATION_PROPERTY_REGEX = re.compile(r"^([A-Za-z ]+): (.*)$", re.MULTILINE)
+INFORMATION_PARTITION_COLUMNS_REGEX = re.compile(r"`([^`]*)`")
+
+# `show table extended` prints the schema as a tree with the spark type names,
+# `describe` uses the sql type names. Only these types are printed in full in
+# the tree, nested types lose their element types.
+TREE_STRING_TYPES = {
+    "long": "bigint",
+    "integer": "int",
+    "short": "smallint",
+    "byte": "tinyint",
+    "string": "string",
+    "double": "double",
+    "float": "float",
+    "boolean": "boolean",
+    "date": "date",
+    "timestamp": "timestamp",
+    "binary": "binary",
+}
+DECIMAL_TYPE_REGEX = re.compile(r"^decimal\(\d+,\d+\)$")
+
+
+def sql_type_from_tree_string(dtype: str) -> Optional[str]:
+    """The `describe` type of a schema tree type, None if it can not be known."""
+    if DECIMAL_TYPE_REGEX.match(dtype):
+        return dtype
+    return TREE_STRING_TYPES.get(dtype)
+
+
+@dataclass(frozen=True)
+class SparkRelationInformation:
+    """The `information` of `show table extended`, parsed once."""
+
+    properties: Dict[str, str]
+    # (name, data type, nullable) of the top level columns
+    columns: Tuple[Tuple[str, str, bool], ...]
+
+    @property
+    def table_type(self) -> Optional[str]:
+        return self.properties.get("Type")
+
+    @property
+    def provider(self) -> Optional[str]:
+        return self.properties.get("Provider")
+
+    @property
+    def owner(self) -> Optional[str]:
+        return self.properties.get("Owner")
+
+    @property
+    def statistics(self) -> Optional[str]:
+        return self.properties.get("Statistics")
+
+    @property
+    def location(self) -> Optional[str]:
+        return self.properties.get("Location")
+
+    @property
+    def partition_columns(self) -> Tuple[str, ...]:
+        raw = self.properties.get("Partition Columns", "")
+        return tuple(INFORMATION_PARTITION_COLUMNS_REGEX.findall(raw))
+
+    @property
+    def is_view(self) -> bool:
+        return self.table_type == "VIEW"
+
+    @property
+    def is_delta(self) -> bool:
+        return self.provider == "delta"
+
+    @property
+    def is_hudi(self) -> bool:
+        return self.provider == "hudi"
+
+    @property
+    def has_complete_column_types(self) -> bool:
+        return all(sql_type_from_tree_string(dtype) for _, dtype, _ in self.columns)
+
+
+@lru_cache(maxsize=4096)
+def parse_relation_information(information: str) -> SparkRelationInformation:
+    # The properties come before the schema tree.
+    head, _, _ = information.partition("\nSchema:")
+    properties = {}
+    for key, value in INFORMATION_PROPERTY_REGEX.findall(head):
+        properties.setdefault(key, value.strip())
+    columns = tuple(
+        (name, dtype, nullable == "true")
+        for name, dtype, nullable in INFORMATION_COLUMNS_REGEX.findall(information)
+    )
+    return SparkRelationInformation(properties=properties, columns=columns)
+
+
 @dataclass
 class SparkQuotePolicy(Policy):
     database: bool = False
@@ -45,3 +141,9 @@ class SparkRelation(BaseRelation):
 
     def log_relation(self, incremental_strategy):
         pass
+
+    @property
+    def parsed_information(self) -> Optional[SparkRelationInformation]:
+        if self.information is None:
+            return None
+        return parse_relation_information(self.information)
@@ -0,0 +1,247 @@
+import json
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import agate
+import dbt.utils
+from dbt.clients.agate_helper import table_from_rows
+
+# Spark types that are stored in a typed array, as long as there are no nulls.
+ARRAY_TYPECODES = {
+    'byte': 'q',
+    'short': 'q',
+    'integer': 'q',
+    'long': 'q',
+    'float': 'd',
+    'double': 'd',
+}
+
+Column = Union[array, List[Any]]
+
+
+class LivyResultSet:
+    """
+    The result of a Livy sql statement, decoded once into columns.
+
+    Livy returns `application/json` with a spark schema and the rows as
+    lists. The rows are transposed into one column per schema field, using a
+    typed array for numeric columns. Reading the rows keeps a position, so
+    fetching is O(1) per row instead of popping from the front of a list.
+    """
+
+    def __init__(self, fields: List[Dict[str, Any]], columns: List[Column], row_count: int):
+        self.fields = fields
+        self.columns = columns
+        self.row_count = row_count
+        self.position = 0
+
+    @classmethod
+    def from_json(cls, values: Dict[str, Any]) -> "LivyResultSet":
+        """Decode the `application/json` payload of a statement output."""
+        if not values:
+            return cls([], [], 0)
+        return cls.from_rows(values['schema']['fields'], values.get('data') or [])
+
+    @classmethod
+    def from_rows(cls, fields: List[Dict[str, Any]], rows: Sequence[Sequence[Any]]) -> "LivyResultSet":
+        columns = [
+            cls._decode_column(field, [row[index] for row in rows])
+            for index, field in enumerate(fields)
+        ]
+        return cls(fields, columns, len(rows))
+
+    @staticmethod
+    def _decode_column(field: Dict[str, Any], values: List[Any]) -> Column:
+        typecode = ARRAY_TYPECODES.get(field['type']) if isinstance(field['type'], str) else None
+        if typecode is not None and None not in values:
+            try:
+                return array(typecode, values)
+            except (TypeError, OverflowError):
+                pass
+        return values
+
+    @property
+    def column_names(self) -> List[str]:
+        return [field['name'] for field in self.fields]
+
+    def without_last_column(self) -> "LivyResultSet":
+        return LivyResultSet(self.fields[:-1], self.columns[:-1], self.row_count)
+
+    def approximate_row_bytes(self, sample_size: int = 100) -> float:
+        """The average json size of the first rows."""
+        sample = self._rows(0, min(sample_size, self.row_count))
+        if not sample:
+            return 0
+        return len(json.dumps(sample, cls=dbt.utils.JSONEncoder)) / len(sample)
+
+    def row(self, index: int) -> Tuple[Any, ...]:
+        return tuple(column[index] for column in self.columns)
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        while self.position < self.row_count:
+            yield self.fetchone()
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        if self.position >= self.row_count:
+            return None
+        row = self.row(self.position)
+        self.position += 1
+        return row
+
+    def fetchmany(self, size: int) -> List[Tuple[Any, ...]]:
+        end = min(self.position + size, self.row_count)
+        rows = self._rows(self.position, end)
+        self.position = end
+        return rows
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return self.fetchmany(self.row_count - self.position)
+
+    def _rows(self, start: int, end: int) -> List[Tuple[Any, ...]]:
+        return list(zip(*(column[start:end] for column in self.columns)))
+
+    def to_agate_table(self) -> agate.Table:
+        """
+        Build the agate table for all rows in one pass, the same way
+        `table_from_data_flat` does: container values become json strings and
+        columns with strings are not coerced.
+        """
+        column_names = self._unique_column_names()
+        text_only_columns = set()
+        columns: List[Sequence[Any]] = []
+        for name, column in zip(column_names, self.columns):
+            if isinstance(column, list):
+                if any(isinstance(value, (dict, list, tuple)) for value in column):
+                    column = [
+                        json.dumps(value, cls=dbt.utils.JSONEncoder)
+                        if isinstance(value, (dict, list, tuple)) else value
+                        for value in column
+                    ]
+                    text_only_columns.add(name)
+                elif any(isinstance(value, str) for value in column):
+                    text_only_columns.add(name)
+            columns.append(column)
+        rows = list(zip(*columns)) if columns else []
+        return table_from_rows(
+            rows=rows, column_names=column_names, text_only_columns=text_only_columns
+        )
+
+    def _unique_column_names(self) -> List[str]:
+        # Duplicate names get a suffix, like SQLConnectionManager.process_results.
+        seen: Dict[str, int] = {}
+        names = []
+        for name in self.column_names:
+            if name in seen:
+                seen[name] += 1
+                names.append(f"{name}_{seen[name]}")
+            else:
+                seen[name] = 1
+                names.append(name)
+        return names
+
+
+class LivyStreamingResultSet:
+    """
+    The result of a large Livy sql query, pulled in chunks.
+
+    Livy returns the whole result of a statement as one json document, which
+    has to fit in the memory of the spark driver. Instead, the statement
+    returns its first chunk, and when there are more rows, they are spooled
+    to a checkpointed temporary view with a row number and fetched in ranges
+    of row numbers. A chunk holds at most `chunk_rows` rows, and when
+    `chunk_bytes` is set, the first chunk is cut to that size and the size of
+    the next chunks is adjusted to the size of the rows so far.
+    """
+    ROW_NUMBER_COLUMN = '__dbt_row_number'
+
+    def __init__(self, run_sql: Callable[[str], LivyResultSet], first_chunk: LivyResultSet,
+                 spool_name: str, chunk_rows: int, chunk_bytes: Optional[int] = None,
+                 spooled: Optional[bool] = None):
+        self._run_sql = run_sql
+        self.spool_name = spool_name
+        self.chunk_rows = chunk_rows
+        self.chunk_bytes = chunk_bytes
+        self.position = first_chunk.row_count
+        self._chunk: Optional[LivyResultSet] = first_chunk
+        self.fields = first_chunk.fields
+        # a result smaller than a chunk was not spooled
+        if spooled is None:
+            spooled = first_chunk.row_count >= chunk_rows
+        self._closed = not spooled
+
+    @property
+    def column_names(self) -> List[str]:
+        return [field['name'] for field in self.fields]
+
+    def _fetch_chunk(self) -> None:
+        if self._closed:
+            self._chunk = None
+            return
+        size = self.chunk_rows
+        if self.chunk_bytes and self._chunk is not None:
+            row_bytes = self._chunk.approximate_row_bytes()
+            if row_bytes:
+                size = max(1, min(self.chunk_rows, int(self.chunk_bytes / row_bytes)))
+        self._chunk = self._run_sql(
+            f"select * from {self.spool_name} "
+            f"where {self.ROW_NUMBER_COLUMN} > {self.position} "
+            f"and {self.ROW_NUMBER_COLUMN} <= {self.position + size} "
+            f"order by {self.ROW_NUMBER_COLUMN}"
+        ).without_last_column()
+        self.position += self._chunk.row_count
+        if self._chunk.row_count < size:
+            self.close()
+
+    def _current_chunk(self) -> Optional[LivyResultSet]:
+        """The chunk with the next row, fetching it when needed."""
+        while self._chunk is not None and self._chunk.position >= self._chunk.row_count:
+            if self._closed:
+                return None
+            self._fetch_chunk()
+        return self._chunk
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        while True:
+            chunk = self._current_chunk()
+            if chunk is None:
+                return
+            yield from chunk
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        chunk = self._current_chunk()
+        return chunk.fetchone() if chunk is not None else None
+
+    def fetchmany(self, size: int) -> List[Tuple[Any, ...]]:
+        rows: List[Tuple[Any, ...]] = []
+        while len(rows) < size:
+            chunk = self._current_chunk()
+            if chunk is None:
+                break
+            rows.extend(chunk.fetchmany(size - len(rows)))
+        return rows
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return list(self)
+
+    def chunks(self) -> Iterator[LivyResultSet]:
+        """The rows not fetched yet, a chunk at a time."""
+        while True:
+            chunk = self._current_chunk()
+            if chunk is None:
+                return
+            rows = chunk.fetchall()
+            yield LivyResultSet.from_rows(self.fields, rows)
+
+    def to_agate_table(self) -> agate.Table:
+        return LivyResultSet.from_rows(self.fields, self.fetchall()).to_agate_table()
+
+    def close(self) -> None:
+        """Drop the spooled view, the rows of the current chunk stay readable."""
+        if self._closed:
+            return
+        self._closed = True
+        self._run_sql(f"uncache table if exists {self.spool_name}")
+        self._run_sql(f"drop view if exists {self.spool_name}")
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+# The `spark_cache` model config and the storage level it caches with.
+SPARK_CACHE_STORAGE_LEVELS = {
+    "memory": "MEMORY_ONLY",
+    "disk": "DISK_ONLY",
+}
+
+
+@dataclass
+class CachedRelation:
+    relation: str
+    # Spark caches per application, so per Livy session.
+    session_id: int
+    size_bytes: int
+    # The nodes that still have to read the relation.
+    dependents: Set[str] = field(default_factory=set)
+
+
+class SparkCacheTracker():
+    """
+    The relations the adapter cached on its Livy sessions, least recently
+    used first.
+
+    A relation is released once every node that reads it has finished. When
+    the total size of the cached relations exceeds the budget, the least
+    recently used relations are evicted first.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        self.budget_bytes = budget_bytes
+        self._relations: "OrderedDict[str, CachedRelation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, cached: CachedRelation) -> List[CachedRelation]:
+        """Track a cached relation, and return the relations to evict for it."""
+        with self._lock:
+            self._relations[cached.relation] = cached
+            self._relations.move_to_end(cached.relation)
+            evicted = []
+            if self.budget_bytes is not None:
+                total = sum(c.size_bytes for c in self._relations.values())
+                for key in list(self._relations):
+                    if total <= self.budget_bytes or key == cached.relation:
+                        break
+                    evicted.append(self._relations.pop(key))
+                    total -= evicted[-1].size_bytes
+            return evicted
+
+    def node_finished(self, unique_id: str) -> List[CachedRelation]:
+        """Mark the relations a node read as used, and return those no node needs anymore."""
+        with self._lock:
+            released = []
+            for key, cached in list(self._relations.items()):
+                if unique_id not in cached.dependents:
+                    continue
+                cached.dependents.discard(unique_id)
+                if cached.dependents:
+                    self._relations.move_to_end(key)
+                else:
+                    released.append(self._relations.pop(key))
+            return released
+
+    def pop_all(self) -> List[CachedRelation]:
+        with self._lock:
+            relations = list(self._relations.values())
+            self._relations.clear()
+            return relations
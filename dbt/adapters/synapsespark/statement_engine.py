@@ -0,0 +1,265 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Iterable, List, Optional, Set, Tuple
+
+from azure.core.exceptions import HttpResponseError
+from azure.identity.aio import DefaultAzureCredential, AzureCliCredential
+from azure.synapse.aio import SynapseClient
+from azure.synapse.aio.operations_async import SparkSessionOperations
+from azure.synapse.models import LivyStatementRequestBody, LivyStatementResponseBody
+from dbt.events import AdapterLogger
+
+from dbt.adapters.synapsespark.tracing import CURRENT_NODE, TRACER
+
+logger = AdapterLogger("SynapseSpark")
+
+# A statement in one of these states will not change anymore.
+STATEMENT_FINAL_STATES = ('available', 'error', 'cancelled')
+# A session in one of these states can not run statements (anymore).
+SESSION_FINAL_STATES = ('dead', 'killed', 'error', 'success')
+# The longest wait, in seconds, for Livy to stop a cancelled statement.
+CANCEL_TIMEOUT = 30
+
+
+@dataclass(frozen=True)
+class PollPolicy:
+    """
+    Adaptive delays between two polls of a statement or session.
+
+    The first polls follow each other quickly, so short metadata queries are
+    picked up as soon as they are done. The delay then grows geometrically
+    with `backoff` up to `max_interval`. When Livy reports the progress of a
+    statement, the delay never exceeds the predicted time to completion.
+    """
+    initial_interval: float = 0.05
+    max_interval: float = 1
+    backoff: float = 2
+
+    def delay(self, attempt: int, elapsed: float,
+              progress: Optional[float] = None) -> float:
+        """The delay after poll number `attempt` (0 based)."""
+        try:
+            delay = min(self.max_interval,
+                        self.initial_interval * self.backoff ** attempt)
+        except OverflowError:
+            # A long statement, polled over a thousand times.
+            delay = self.max_interval
+        if progress is not None and 0 < progress < 1 and elapsed > 0:
+            remaining = elapsed * (1 - progress) / progress
+            delay = min(delay, max(self.initial_interval, remaining))
+        return delay
+
+
+def _with_livy_fields(pipeline_response, deserialized, headers):
+    """Keep the Livy statement fields the Synapse models do not know about."""
+    body = pipeline_response.http_response.json()
+    deserialized.progress = body.get('progress')
+    deserialized.started = body.get('started')
+    deserialized.completed = body.get('completed')
+    return deserialized
+
+
+class LivyStatementEngine():
+    """
+    Runs the Livy statement calls on a single asyncio event loop.
+
+    The loop runs in a background thread and talks to Livy with the async
+    Synapse client, so any number of statements can be submitted and polled
+    at the same time without a thread (and a sleeping poll loop) each. The
+    blocking `run` is the facade used by the pyodbc style LivyCursor.
+    """
+
+    def __init__(self, workspace_name: str, spark_pool_name: str,
+                 authentication: str):
+        self.workspace_name = workspace_name
+        self.spark_pool_name = spark_pool_name
+        self.authentication = authentication
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[SynapseClient] = None
+        self._credential = None
+        # The (session id, statement id) of the statements that were
+        # submitted and are not done yet. Only used on the engine loop.
+        self._in_flight: Set[Tuple[int, int]] = set()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name='livy-statement-engine',
+                                 daemon=True).start()
+        return self._loop
+
+    def run(self, coroutine: Awaitable[Any]) -> Any:
+        """Run a coroutine on the engine loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(
+            self._for_node(coroutine, CURRENT_NODE.get()), self._get_loop()).result()
+
+    @staticmethod
+    async def _for_node(coroutine: Awaitable[Any], node: Optional[str]) -> Any:
+        # The loop runs in another thread, carry the node of the caller along.
+        CURRENT_NODE.set(node)
+        return await coroutine
+
+    def run_all(self, coroutines: Iterable[Awaitable[Any]]) -> List[Any]:
+        """Run coroutines concurrently on the engine loop, results in order."""
+        async def gather():
+            return await asyncio.gather(*coroutines)
+        return self.run(gather())
+
+    @property
+    def spark_session_operations(self) -> SparkSessionOperations:
+        # Only use this on the engine loop: the http session is bound to it.
+        if self._client is None:
+            if self.authentication == 'DefaultAzureCredential':
+                self._credential = DefaultAzureCredential()
+            elif self.authentication == 'AzureCliCredential':
+                self._credential = AzureCliCredential()
+            self._client = SynapseClient(self._credential)
+        return self._client.spark_session
+
+    async def submit(self, session_id: int, code: str, kind: str = 'sql') -> int:
+        """Submit a statement and return its id."""
+        with TRACER.span('livy.submit', session_id=session_id, kind=kind) as span:
+            response: LivyStatementResponseBody = await self.spark_session_operations.create_statement(
+                self.workspace_name, self.spark_pool_name, session_id,
+                LivyStatementRequestBody(kind=kind, code=code))
+            span['statement_id'] = response.id
+        self._in_flight.add((session_id, response.id))
+        return response.id
+
+    async def get_statement(self, session_id: int,
+                            statement_id: int) -> LivyStatementResponseBody:
+        with TRACER.span('livy.poll', session_id=session_id,
+                         statement_id=statement_id) as span:
+            statement = await self.spark_session_operations.get_statement(
+                self.workspace_name, self.spark_pool_name, session_id, statement_id,
+                cls=_with_livy_fields)
+            span['state'] = statement.state
+        return statement
+
+    async def get_result(self, session_id: int, statement_id: int,
+                         poll_policy: PollPolicy,
+                         timeout: Optional[float] = None) -> LivyStatementResponseBody:
+        """
+        Poll a statement until it is done and return it. A statement that is
+        not done after `timeout` seconds is cancelled, and raises
+        asyncio.TimeoutError.
+        """
+        if timeout is None:
+            return await self._poll(session_id, statement_id, poll_policy)
+        try:
+            return await asyncio.wait_for(
+                self._poll(session_id, statement_id, poll_policy), timeout)
+        except asyncio.TimeoutError:
+            logger.debug(f"Statement {statement_id} timed out after {timeout} seconds")
+            await self.cancel(session_id, statement_id, poll_policy)
+            raise
+
+    async def _poll(self, session_id: int, statement_id: int,
+                    poll_policy: PollPolicy) -> LivyStatementResponseBody:
+        previous_state = 'unknown'
+        start_time = time.monotonic()
+        state_since = time.time()
+        attempt = 0
+        while True:
+            result = await self.get_statement(session_id, statement_id)
+            if result.state != previous_state:
+                logger.debug(f"Query status ({statement_id}): {result.state}")
+                # The time in a state is known up to a poll interval.
+                now = time.time()
+                if previous_state != 'unknown':
+                    TRACER.record(f'livy.state.{previous_state}', state_since,
+                                  now - state_since, session_id=session_id,
+                                  statement_id=statement_id)
+                previous_state = result.state
+                state_since = now
+            if result.state in STATEMENT_FINAL_STATES:
+                self._in_flight.discard((session_id, statement_id))
+                return result
+            await asyncio.sleep(poll_policy.delay(
+                attempt, time.monotonic() - start_time,
+                getattr(result, 'progress', None)))
+            attempt += 1
+
+    async def execute(self, session_id: int, code: str, poll_policy: PollPolicy,
+                      kind: str = 'sql',
+                      timeout: Optional[float] = None) -> LivyStatementResponseBody:
+        statement_id = await self.submit(session_id, code, kind)
+        return await self.get_result(session_id, statement_id, poll_policy, timeout)
+
+    async def cancel(self, session_id: int, statement_id: int,
+                     poll_policy: PollPolicy,
+                     timeout: float = CANCEL_TIMEOUT) -> Optional[LivyStatementResponseBody]:
+        """
+        Cancel a statement and wait until Livy has stopped it, for at most
+        `timeout` seconds. Returns None when it did not stop in time.
+        """
+        with TRACER.span('livy.cancel', session_id=session_id,
+                         statement_id=statement_id) as span:
+            try:
+                await self.spark_session_operations.delete_statement(
+                    self.workspace_name, self.spark_pool_name, session_id, statement_id)
+            except HttpResponseError as exc:
+                # It may have finished in the meantime, the poll tells.
+                logger.debug(f"Could not cancel statement {statement_id}: {exc}")
+            try:
+                result = await asyncio.wait_for(
+                    self._poll(session_id, statement_id, poll_policy), timeout)
+            except asyncio.TimeoutError:
+                logger.debug(f"Statement {statement_id} did not stop within {timeout} seconds")
+                span['state'] = 'unknown'
+                return None
+            span['state'] = result.state
+        return result
+
+    async def cancel_all(self, poll_policy: PollPolicy,
+                         timeout: float = CANCEL_TIMEOUT) -> int:
+        """
+        Cancel every statement in flight, of all threads, at the same time.
+        Returns the number of statements that were cancelled.
+        """
+        statements = sorted(self._in_flight)
+        if statements:
+            logger.debug(f"Cancelling {len(statements)} statement(s) in flight")
+        await asyncio.gather(
+            *(self.cancel(session_id, statement_id, poll_policy, timeout)
+              for session_id, statement_id in statements),
+            return_exceptions=True)
+        return len(statements)
+
+    async def wait_for_session(self, session_id: int, poll_policy: PollPolicy) -> str:
+        """Poll a session until it is idle or dead and return that state."""
+        previous_state = 'Unknown state'
+        attempt = 0
+        while True:
+            livy_session_response = await self.spark_session_operations.get(
+                self.workspace_name, self.spark_pool_name, session_id)
+            state = livy_session_response.state
+            if state != previous_state:
+                logger.debug(f"Session state ({session_id}): {state}")
+                previous_state = state
+            if state == 'idle' or state in SESSION_FINAL_STATES:
+                return state
+            await asyncio.sleep(poll_policy.delay(attempt, 0))
+            attempt += 1
+
+    def close(self) -> None:
+        """Close the async client and stop the loop."""
+        if self._loop is None:
+            return
+
+        async def close_client():
+            if self._client is not None:
+                await self._client.close()
+            if self._credential is not None:
+                await self._credential.close()
+            self._client = None
+            self._credential = None
+        self.run(close_client())
+        with self._lock:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
@@ -1,16 +1,122 @@
+import asyncio
+import json
+import os
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from dbt.events import AdapterLogger
 from types import TracebackType
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from azure.core.exceptions import HttpResponseError
 from azure.identity import DefaultAzureCredential, AzureCliCredential
 from azure.synapse import SynapseClient
 from azure.synapse.operations import SparkSessionOperations
-from azure.synapse.models import LivyStatementRequestBody, LivyStatementResponseBody, ExtendedLivySessionRequest, ExtendedLivyListSessionResponse, ExtendedLivySessionResponse
+from azure.synapse.models import LivyStatementResponseBody, ExtendedLivySessionRequest, ExtendedLivyListSessionResponse, ExtendedLivySessionResponse
+from dbt.adapters.synapsespark.result_set import LivyResultSet, LivyStreamingResultSet
+from dbt.adapters.synapsespark.statement_engine import LivyStatementEngine, PollPolicy, SESSION_FINAL_STATES
+from dbt.adapters.synapsespark.tracing import TRACER
 from dbt.logger import GLOBAL_LOGGER as logger
 import dbt.exceptions
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
 logger = AdapterLogger("SynapseSpark")
 
+# Encodes the values of spark rows in json like Livy sql statements do, so
+# the results of pyspark statements decode to the same types: decimals are
+# numbers, and dates and timestamps are strings in UTC.
+RESULT_CODE = """
+import datetime
+import decimal
+import json
+
+def _dbt_json_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.date):
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.combine(value, datetime.time())
+        value = value.astimezone(datetime.timezone.utc)
+        return value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return str(value)
+"""
+
+# Runs a list of sql statements and prints their results like Livy sql
+# statements return them (schema and data), as one json list.
+BATCH_CODE = """
+_dbt_results = []
+for _dbt_sql in json.loads({statements}):
+    _dbt_df = spark.sql(_dbt_sql)
+    _dbt_results.append({{
+        'schema': json.loads(_dbt_df.schema.json()),
+        'data': [list(_dbt_row) for _dbt_row in _dbt_df.collect()],
+    }})
+print(json.dumps(_dbt_results, default=_dbt_json_value))
+"""
+
+# Runs a statement and prints its first chunk of rows like BATCH_CODE does.
+# When there are more rows, they are kept in a temporary view with a row
+# number, to be fetched in chunks; a smaller result is not spooled.
+#
+# The rows are numbered without moving them to one partition: the id of
+# monotonically_increasing_id has the partition in its upper 31 bits and the
+# position in the partition in its lower 33, and the row number adds the rows
+# of the partitions before. The ids are checkpointed before numbering, so an
+# evicted block is never recomputed with other rows or ids.
+STREAM_CODE = """
+from pyspark.sql import functions as _dbt_functions
+_dbt_stream_sql = json.loads({sql})
+_dbt_stream_view = {spool_name}
+_dbt_stream_chunk_rows = {chunk_rows}
+_dbt_stream_chunk_bytes = {chunk_bytes}
+_dbt_id = _dbt_functions.col({row_number})
+_dbt_partition = _dbt_functions.shiftRight(_dbt_id, 33).cast('int')
+_dbt_df = (spark.sql(_dbt_stream_sql)
+           .withColumn({row_number}, _dbt_functions.monotonically_increasing_id())
+           .localCheckpoint())
+_dbt_offsets, _dbt_rows_before = [], 0
+for _dbt_partition_rows in (_dbt_df.groupBy(_dbt_partition.alias('partition')).count()
+                            .orderBy('partition').collect()):
+    _dbt_offsets += [
+        _dbt_functions.lit(_dbt_partition_rows[0]),
+        _dbt_functions.lit(_dbt_rows_before - (_dbt_partition_rows[0] << 33) + 1).cast('long')]
+    _dbt_rows_before += _dbt_partition_rows[1]
+if _dbt_offsets:
+    _dbt_df = _dbt_df.withColumn(
+        {row_number}, _dbt_id + _dbt_functions.create_map(*_dbt_offsets)[_dbt_partition])
+_dbt_chunk = (_dbt_df.where(_dbt_id <= _dbt_stream_chunk_rows)
+              .orderBy({row_number}).drop({row_number}))
+_dbt_rows = _dbt_chunk.collect()
+# The first chunk keeps to chunk_bytes as well, with at least one row.
+_dbt_data, _dbt_bytes = [], 0
+for _dbt_row in _dbt_rows:
+    _dbt_value = json.dumps(list(_dbt_row), default=_dbt_json_value)
+    _dbt_bytes += len(_dbt_value)
+    if _dbt_data and _dbt_stream_chunk_bytes and _dbt_bytes > _dbt_stream_chunk_bytes:
+        break
+    _dbt_data.append(_dbt_value)
+_dbt_spooled = len(_dbt_data) < len(_dbt_rows) or len(_dbt_rows) == _dbt_stream_chunk_rows
+if _dbt_spooled:
+    _dbt_df.createOrReplaceTempView(_dbt_stream_view)
+print('{{"schema": %s, "data": [%s], "spooled": %s}}' % (
+    _dbt_chunk.schema.json(), ','.join(_dbt_data), json.dumps(_dbt_spooled)))
+"""
+
+# What `set <key>` returns for a spark conf key that has no value.
+UNDEFINED_CONF_VALUE = '<undefined>'
+
+
+def spark_conf_value(value: Any) -> str:
+    """A spark conf value from yaml as the string spark expects."""
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
 class LivyCursor:
     """
     Mock a pyodbc cursor.
@@ -20,27 +126,36 @@ class LivyCursor:
     https://github.com/mkleehammer/pyodbc/wiki/Cursor
     """
 
+    # The number of rows fetchmany() returns by default.
+    arraysize = 1000
+    # The chunks of execute_streaming, see LivyStreamingResultSet.
+    stream_chunk_rows = 100000
+    stream_chunk_bytes: Optional[int] = None
+    # Statements that run longer than this many seconds are cancelled.
+    statement_timeout: Optional[float] = None
+
     def __init__(self) -> None:
-        self._schema = None
-        self._rows = None
+        self.result_set = None
         self.session_id = -1
-        self.spark_session_operations = None
+        self.statement_engine = None
         self.workspace_name = None
         self.spark_pool_name = None
         self.statement_id = -1
-        self.poll_interval = 1
+        self.poll_policy = PollPolicy()
 
     def __init__(self, session_id, 
-                 spark_session_operations: SparkSessionOperations, 
-                 workspace_name, spark_pool_name, poll_interval) -> None:
-        self._rows = None
-        self._schema = None
+                 statement_engine: LivyStatementEngine, 
+                 workspace_name, spark_pool_name, poll_policy) -> None:
+        self.result_set: Optional[LivyResultSet] = None
+        # The last statement and when it was submitted, for the response.
+        self.statement: Optional[LivyStatementResponseBody] = None
+        self.submitted_at: Optional[float] = None
         self.session_id = session_id
-        self.spark_session_operations = spark_session_operations
+        self.statement_engine = statement_engine
         self.workspace_name = workspace_name
         self.spark_pool_name = spark_pool_name
         self.statement_id = -1
-        self.poll_interval = poll_interval
+        self.poll_policy = poll_policy
 
     def __enter__(self):
         return self
@@ -70,7 +185,7 @@ class LivyCursor:
         ------
         https://github.com/mkleehammer/pyodbc/wiki/Cursor#description
         """
-        if self._schema is None:
+        if self.result_set is None:
             description = list()
         else:
             description = [
@@ -83,7 +198,7 @@ class LivyCursor:
                     None,
                     field['nullable'],
                 )
-                for field in self._schema
+                for field in self.result_set.fields
             ]
         return description
 
@@ -96,61 +211,53 @@ class LivyCursor:
         https://github.com/mkleehammer/pyodbc/wiki/Cursor#close
         """
         logger.debug("LivyCursor - close")
-        self._rows = None
+        if isinstance(self.result_set, LivyStreamingResultSet):
+            try:
+                self.result_set.close()
+            except Exception as exc:
+                logger.debug(f"Could not drop {self.result_set.spool_name}: {exc}")
+        self.result_set = None
         
-    def _submitLivyCode(self, code) -> int:
+    def _submitLivyCode(self, code, kind: str = 'sql') -> int:
         logger.debug(f"""Executing query: 
         {code}
         """)
 
-        response: LivyStatementResponseBody = self.spark_session_operations.create_statement(
-            self.workspace_name, self.spark_pool_name, self.session_id,
-            LivyStatementRequestBody(kind='sql', code=code))
-
-        return response.id
+        return self.statement_engine.run(
+            self.statement_engine.submit(self.session_id, code, kind))
 
 
     def _get_statement(self) -> LivyStatementResponseBody:
         logger.debug("LivyCursor - _get_statement")
-        result = self.spark_session_operations.get_statement(self.workspace_name, 
-                                                        self.spark_pool_name, 
-                                                        self.session_id,
-                                                        self.statement_id)
-        return result
+        return self.statement_engine.run(
+            self.statement_engine.get_statement(self.session_id, self.statement_id))
 
     def get_sql_state(self):
         logger.debug("LivyCursor - get_sql_state()")
-        return self._get_statement().output.status
+        statement = self.statement or self._get_statement()
+        return statement.output.status if statement.output is not None else statement.state
 
 
     def _getLivyResult(self):
         logger.debug("LivyCursor - _getLivyResult")
-        while True:
-            result = self._get_statement()
-            previous_state = 'unknown'
-            current_state = result.state
-            if current_state != previous_state:
-                logger.debug(f"Query status: {current_state}")
-            if current_state == 'available':
-                return result
-            time.sleep(self.poll_interval)
+        try:
+            return self.statement_engine.run(
+                self.statement_engine.get_result(self.session_id, self.statement_id,
+                                                 self.poll_policy, self.statement_timeout))
+        except asyncio.TimeoutError:
+            raise dbt.exceptions.raise_database_error(
+                f'Statement {self.statement_id} did not finish within the statement_timeout '
+                f'of {self.statement_timeout} seconds and was cancelled'
+            )
 
     def cancel(self):
+        """Cancel the running statement, waiting a bounded time for Livy to stop it."""
+        if self.statement_id < 0:
+            return
         logger.debug(f"Cancelling query: {self.statement_id}")
-        self.spark_session_operations.delete_statement(
-            self.workspace_name,
-            self.spark_pool_name,
-            self.session_id,
-            self.statement_id
-        )
-        while True:
-            result = self._get_statement()
-            previous_state = 'unknown'
-            current_state = result.state
-            if current_state != previous_state:
-                logger.debug(f"Query status: {current_state}")
-            if current_state in ('available', 'error', 'cancelled'):
-                return
+        self.statement_engine.run(
+            self.statement_engine.cancel(self.session_id, self.statement_id,
+                                         self.poll_policy))
 
 
     def execute(self, sql: str, *parameters: Any) -> None:
@@ -180,30 +287,97 @@ class LivyCursor:
         
         # TODO: handle parameterised sql
 
-        statement_id = self._submitLivyCode(sql)
-        self.statement_id = statement_id
+        self.close()
+        self.result_set = self._run_sql(sql)
 
-        res = self._getLivyResult()
-        if (res.output.status == 'ok'):
-            # values = res['output']['data']['application/json']
-            values = res.output.data['application/json']
-            if (len(values) >= 1):
-                self._rows = values['data'] # values[0]['values']
-                self._schema = values['schema']['fields'] # values[0]['schema']
-            else:
-                self._rows = []
-                self._schema = []
+    def execute_streaming(self, sql: str, chunk_rows: Optional[int] = None,
+                          chunk_bytes: Optional[int] = None) -> None:
+        """
+        Execute a statement and fetch its rows in chunks, so a large result
+        does not have to fit in one Livy statement output. The first chunk
+        comes with the statement, so a result smaller than a chunk takes a
+        single round trip.
+        """
+        logger.debug("LivyCursor - execute_streaming")
+        self.close()
+        chunk_rows = chunk_rows or self.stream_chunk_rows
+        chunk_bytes = chunk_bytes or self.stream_chunk_bytes
+        spool_name = f'dbt_stream_{uuid.uuid4().hex}'
+        output = self._run_code(RESULT_CODE + STREAM_CODE.format(
+            sql=repr(json.dumps(sql)),
+            spool_name=repr(spool_name),
+            chunk_rows=chunk_rows,
+            chunk_bytes=chunk_bytes,
+            row_number=repr(LivyStreamingResultSet.ROW_NUMBER_COLUMN),
+        ), 'pyspark')
+        with TRACER.span('result.decode', statement_id=self.statement_id) as span:
+            values = json.loads(output['text/plain'])
+            first_chunk = LivyResultSet.from_json(values)
+            span['rows'] = first_chunk.row_count
+        self.result_set = LivyStreamingResultSet(
+            self._run_sql, first_chunk, spool_name, chunk_rows, chunk_bytes,
+            spooled=values['spooled'])
+
+    def execute_batch(self, statements: List[str]) -> List[LivyResultSet]:
+        """
+        Execute independent sql statements in one Livy statement.
+
+        Every Livy statement costs a submit and a few polls, which adds up
+        for many small metadata statements. The statements are run one after
+        the other by a pyspark snippet, which returns all results as one json
+        document. When a statement fails, the statements after it do not run.
+        """
+        logger.debug(f"LivyCursor - execute_batch ({len(statements)} statements)")
+        self.close()
+        if len(statements) <= 1:
+            result_sets = [self._run_sql(sql) for sql in statements]
         else:
-            self._rows = None
-            self._schema = None
+            output = self._run_code(
+                RESULT_CODE + BATCH_CODE.format(statements=repr(json.dumps(statements))),
+                'pyspark')
+            with TRACER.span('result.decode', statement_id=self.statement_id,
+                             statements=len(statements)):
+                result_sets = [LivyResultSet.from_json(values)
+                               for values in json.loads(output['text/plain'])]
+        self.result_set = result_sets[-1] if result_sets else None
+        return result_sets
 
-            raise dbt.exceptions.raise_database_error(
-                        'Error while executing query: ' + res.output.evalue
-                    ) 
+    def execute_code(self, code: str, kind: str = 'pyspark') -> Dict[str, Any]:
+        """Execute code of another Livy kind, and return its output data."""
+        logger.debug(f"LivyCursor - execute_code ({kind})")
+        self.close()
+        return self._run_code(code, kind)
+
+    def _run_sql(self, sql: str) -> LivyResultSet:
+        # values = res['output']['data']['application/json']
+        values = self._run_code(sql)['application/json']
+        with TRACER.span('result.decode', statement_id=self.statement_id) as span:
+            result_set = LivyResultSet.from_json(values)
+            span['rows'] = result_set.row_count
+        return result_set
+
+    def _run_code(self, code: str, kind: str = 'sql') -> Dict[str, Any]:
+        """Run a statement and return the data of its output."""
+        with TRACER.span('livy.statement', session_id=self.session_id, kind=kind) as span:
+            self.submitted_at = time.time()
+            statement_id = self._submitLivyCode(code, kind)
+            self.statement_id = statement_id
+            span['statement_id'] = statement_id
+
+            res = self._getLivyResult()
+            self.statement = res
+            span['state'] = res.state
+        if (res.output is not None and res.output.status == 'ok'):
+            return res.output.data
+
+        error = res.output.evalue if res.output is not None else f'statement {res.state}'
+        raise dbt.exceptions.raise_database_error(
+                    'Error while executing query: ' + error
+                ) 
 
     def fetchall(self):
         """
-        Fetch all data.
+        Fetch all remaining rows.
 
         Return
         -------
@@ -214,37 +388,77 @@ class LivyCursor:
         ------
         https://github.com/mkleehammer/pyodbc/wiki/Cursor#fetchall
         """
-        return self._rows
+        if self.result_set is None:
+            return None
+        return self.result_set.fetchall()
+
+    def fetchmany(self, size: Optional[int] = None):
+        """
+        Fetch the next rows.
+
+        Parameters
+        ----------
+        size : int
+            The number of rows, defaults to `arraysize`.
+
+        Returns
+        -------
+        out : list()
+            At most `size` rows.
+
+        Source
+        ------
+        https://github.com/mkleehammer/pyodbc/wiki/Cursor#fetchmanysize
+        """
+        if self.result_set is None:
+            return []
+        return self.result_set.fetchmany(size or self.arraysize)
 
     def fetchone(self):
         """
-        Fetch the first output.
+        Fetch the next row.
 
         Returns
         -------
         out : one row | None
-            The first row.
+            The next row.
 
         Source
         ------
         https://github.com/mkleehammer/pyodbc/wiki/Cursor#fetchone
         """
-       
-        if self._rows is not None and len(self._rows) > 0:
-            row = self._rows.pop(0)
-        else:
-            row = None
+        if self.result_set is None:
+            return None
+        return self.result_set.fetchone()
+
+    def __iter__(self):
+        if self.result_set is not None:
+            yield from self.result_set
+
+@dataclass
+class SparkConfOverride:
+    """A spark conf value that statements on a session hold."""
+    value: str
+    # The value before the first holder set it, None when it had none.
+    original: Optional[str]
+    holders: int = 1
 
-        return row
 
 class SynapseStatement:
     """The handle of the connection."""
 
-    def __init__(self, livy_session_id, spark_session_operations, 
-                 workspace_name, spark_pool_name, poll_interval):
-        self._cursor = LivyCursor(livy_session_id, spark_session_operations, 
-                                     workspace_name, spark_pool_name, 
-                                     poll_interval)
+    def __init__(self, session: "LivySessionWrapper"):
+        self._session = session
+        # The cluster profile of the pool the session is from, None for the
+        # cluster_configuration of the target.
+        self.cluster_profile = session.pool.cluster_profile if session.pool else None
+        # The spark conf keys this statement holds, see set_spark_conf.
+        self._held_conf: List[str] = []
+        self._cursor = LivyCursor(session.livy_session_id,
+                                  session.statement_engine,
+                                  session.workspace_name,
+                                  session.spark_pool_name,
+                                  session.poll_policy)
 
 
     def cursor(self):
@@ -261,9 +475,103 @@ class SynapseStatement:
     def cancel(self) -> None:
         self._cursor.cancel()
 
+    def set_spark_conf(self, conf: Dict[str, Any]) -> None:
+        """
+        Set spark sql conf on the session until restore_spark_conf.
+
+        Threads share a session when there are more threads than sessions,
+        so the values are held, counting the statements that hold them: a
+        value is only put back once the last holder restores it. A value
+        that another holder keeps at something else is waited for, or
+        raises when this statement already holds other values, which could
+        deadlock. Keys that already have the value are not set again, and
+        the value a key had before is read in the same Livy round trip as
+        the new values are set.
+        """
+        session = self._session
+        conf = {key: spark_conf_value(value) for key, value in conf.items()}
+        with session.conf_condition:
+            while True:
+                conflicts = [
+                    key for key, value in conf.items()
+                    if key in session.conf_overrides
+                    and session.conf_overrides[key].value != value
+                    and not (key in self._held_conf and session.conf_overrides[key].holders == 1)
+                ]
+                if not conflicts:
+                    break
+                if self._held_conf:
+                    raise dbt.exceptions.RuntimeException(
+                        f'Spark conf {", ".join(conflicts)} is held at another value by a '
+                        f'model running on the same Livy session, run these models on '
+                        f'sessions of their own (max_sessions)')
+                logger.debug(f'Waiting for spark conf {", ".join(conflicts)} to be released')
+                session.conf_condition.wait()
+
+            changed = {key: value for key, value in conf.items()
+                       if key not in session.spark_conf or session.spark_conf[key] != value}
+            unknown = [key for key in changed if key not in session.spark_conf]
+            if changed:
+                # Under the lock, so no other holder runs a statement that
+                # counts on the value before it is set.
+                try:
+                    result_sets = self._cursor.execute_batch(
+                        [f'set {key}' for key in unknown]
+                        + [f'set {key} = {value}' for key, value in changed.items()])
+                except BaseException:
+                    # Some of the values may have been set.
+                    for key in changed:
+                        session.spark_conf.pop(key, None)
+                    raise
+                for key, result_set in zip(unknown, result_sets):
+                    value = result_set.row(0)[1] if len(result_set) else UNDEFINED_CONF_VALUE
+                    session.spark_conf[key] = None if value == UNDEFINED_CONF_VALUE else value
+
+            for key, value in conf.items():
+                override = session.conf_overrides.get(key)
+                if override is None:
+                    session.conf_overrides[key] = SparkConfOverride(
+                        value, session.spark_conf.get(key))
+                elif key in self._held_conf:
+                    override.value = value
+                else:
+                    override.holders += 1
+                if key not in self._held_conf:
+                    self._held_conf.append(key)
+                session.spark_conf[key] = value
+
+    def restore_spark_conf(self) -> None:
+        """
+        Release the spark conf this statement holds, and put back the values
+        no other holder keeps, in one round trip.
+        """
+        session = self._session
+        with session.conf_condition:
+            restore: Dict[str, Optional[str]] = {}
+            for key in self._held_conf:
+                override = session.conf_overrides[key]
+                override.holders -= 1
+                if override.holders == 0:
+                    del session.conf_overrides[key]
+                    if session.spark_conf.get(key) != override.original:
+                        restore[key] = override.original
+            self._held_conf = []
+            try:
+                if restore:
+                    self._cursor.execute_batch(
+                        [f'reset {key}' if value is None else f'set {key} = {value}'
+                         for key, value in restore.items()])
+                    session.spark_conf.update(restore)
+            except BaseException:
+                for key in restore:
+                    session.spark_conf.pop(key, None)
+                raise
+            finally:
+                session.conf_condition.notify_all()
+
     def close(self) -> None:
         """
-        Close the connection.
+        Close the connection and hand the session back to its pool.
 
         Source
         ------
@@ -271,37 +579,146 @@ class SynapseStatement:
         """
         logger.debug("Connection.close()")
         self._cursor.close()
+        if self._session is not None:
+            self._session.release()
+            self._session = None
 
 class LivySessionWrapper():
     """Wrapper around a session to support calls as a handle."""
-    def __init__(self, livy_session_id: int, spark_session_operations: SparkSessionOperations, workspace_name, spark_pool_name, poll_interval):
+    def __init__(self, livy_session_id: int, spark_session_operations: SparkSessionOperations, workspace_name, spark_pool_name, poll_policy,
+                 statement_engine: LivyStatementEngine):
         logger.debug("Creating LivySessionWrapper")
         self.livy_session_id = livy_session_id
         self.spark_session_operations = spark_session_operations 
+        self.statement_engine = statement_engine
         self.workspace_name = workspace_name
         self.spark_pool_name = spark_pool_name
-        self.poll_interval = poll_interval
-        
+        self.poll_policy = poll_policy
+        # Set by the LivySessionPool that owns this session.
+        self.pool: Optional["LivySessionPool"] = None
+        self.pool_index = -1
+        # The spark sql conf of the session as far as the adapter knows it,
+        # None for keys that have no value.
+        self.spark_conf: Dict[str, Optional[str]] = {}
+        # The values statements on this session hold, by key.
+        self.conf_overrides: Dict[str, SparkConfOverride] = {}
+        self.conf_condition = threading.Condition()
+
     def get_statement(self) -> SynapseStatement:
-        return SynapseStatement(self.livy_session_id, 
-            self.spark_session_operations, self.workspace_name, 
-            self.spark_pool_name, self.poll_interval)
+        return SynapseStatement(self)
+
+    def release(self) -> None:
+        """Hand the session back to the pool it was checked out from."""
+        if self.pool is not None:
+            self.pool.checkin(self)
+
+
+
+class LivySessionRegistry():
+    """
+    Remembers the Livy sessions of earlier dbt invocations in a json file.
+
+    Finding a session by name means paging through all sessions of the spark
+    pool, which is slow on a busy pool. The registry maps
+    `workspace/spark pool/session name` to the session id and its last known
+    state, so the session can be validated with a single call instead.
+
+    Writers hold a lock while they read, change and replace the file: a lock
+    per file shared by the registries of the process, and where the os has
+    flock, a lock file against other dbt processes. A file that can not be
+    read is treated as empty, a missing entry only costs the search.
+    """
+
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            cache_home = os.environ.get(
+                'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+            path = os.path.join(cache_home, 'dbt-synapse-spark', 'sessions.json')
+        self.path = path
+        with self._locks_lock:
+            self._lock = self._locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # The file is replaced atomically, reading it needs no lock.
+        return self._read().get(key)
+
+    def put(self, key: str, session_id: int, state: str) -> None:
+        with self._locked():
+            sessions = self._read()
+            sessions[key] = {'id': session_id, 'state': state}
+            self._write(sessions)
+
+    def remove(self, key: str) -> None:
+        with self._locked():
+            sessions = self._read()
+            if sessions.pop(key, None) is not None:
+                self._write(sessions)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            lock_file = None
+            if fcntl is not None:
+                try:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    lock_file = open(f'{self.path}.lock', 'a')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except OSError as exc:
+                    logger.debug(f'Could not lock session registry {self.path}: {exc}')
+            try:
+                yield
+            finally:
+                if lock_file is not None:
+                    # closing the file releases the flock
+                    lock_file.close()
 
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as registry_file:
+                sessions = json.load(registry_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(sessions, dict):
+            return {}
+        return {
+            key: entry for key, entry in sessions.items()
+            if isinstance(entry, dict) and isinstance(entry.get('id'), int)
+        }
+
+    def _write(self, sessions: Dict[str, Dict[str, Any]]) -> None:
+        # Other dbt processes may read the file, so replace it atomically.
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as registry_file:
+                json.dump(sessions, registry_file)
+            os.replace(temp_path, self.path)
+        except OSError as exc:
+            logger.debug(f'Could not write session registry {self.path}: {exc}')
 
 
 class LivySessionFactory():
     """Responsible for creating or reusing a session."""
 
     def __init__(self, workspace_name: str, spark_pool_name: str, user: str, 
-                 authentication: str, conf: Dict[str, str | int],
-                 poll_interval: int):
+                 authentication: str, conf: Dict[str, Any],
+                 poll_policy: PollPolicy,
+                 session_registry: Optional[LivySessionRegistry] = None,
+                 cluster_profile: Optional[str] = None):
         self.workspace_name = workspace_name
         self.spark_pool_name = spark_pool_name
+        self.cluster_profile = cluster_profile
         # This is the session name. It is used to searched for any existing
-        # session that may be available.
+        # session that may be available. Sessions of a cluster profile have
+        # a name of their own, so they are not reused for another size.
         self.session_name = f'dbt-{user}'
+        if cluster_profile is not None:
+            self.session_name = f'{self.session_name}-{cluster_profile}'
         self.conf = conf
-        self.poll_interval = poll_interval
+        self.poll_policy = poll_policy
         # This can be much nicer (dynamic loading?)
         # Also: other authentication methods (ClientSecret, ManagedIdentity) 
         # should be possible.
@@ -311,82 +728,304 @@ class LivySessionFactory():
             credential = AzureCliCredential()
         synapse_client = SynapseClient(credential)
         self.spark_session_operations: SparkSessionOperations = synapse_client.spark_session
+        # Statements and polling go through the async client on one loop.
+        self.statement_engine = LivyStatementEngine(
+            workspace_name, spark_pool_name, authentication)
+        self.session_registry = session_registry or LivySessionRegistry()
 
 
-    """
-    A static cache, so going to the Livy API searching for a session is not
-    necessary (this takes time and is annoying).
-    """
-    SESSION: LivySessionWrapper = None
-
-    def connect(self) -> LivySessionWrapper:
-        """Connect to Livy."""
-        if LivySessionFactory.SESSION is not None:
-            logger.debug("Can reuse session")
-            return LivySessionFactory.SESSION
-        session = self.get_existing_session()
+    def connect(self, session_name: Optional[str] = None) -> LivySessionWrapper:
+        """Connect to Livy, reusing the session named `session_name` if it exists."""
+        session_name = session_name or self.session_name
+        session = self.get_existing_session(session_name)
         if session is None:
-            logger.debug('Did not find an existing session')
-            session = self.create_new_session()
+            logger.debug(f'Did not find an existing session {session_name}')
+            session = self.create_new_session(session_name)
         else:
             logger.debug(f'Found existing session (id: {session.livy_session_id})')
-        LivySessionFactory.SESSION = session
+        registry_key = self.registry_key(session_name)
+        if session is None:
+            self.session_registry.remove(registry_key)
+            raise dbt.exceptions.RuntimeException(
+                f'Livy session {session_name} died before it became available')
+        self.session_registry.put(registry_key, session.livy_session_id, 'idle')
         return session
 
+    def registry_key(self, session_name: str) -> str:
+        return f'{self.workspace_name}/{self.spark_pool_name}/{session_name}'
 
-    def create_new_session(self):
-        logger.debug('Creating a new session')
+    def delete_session(self, session: LivySessionWrapper, session_name: str) -> None:
+        """Delete a session, which frees its executors, and forget it."""
+        logger.debug(f'Deleting session {session_name} ({session.livy_session_id})')
+        try:
+            self.spark_session_operations.delete(
+                self.workspace_name, self.spark_pool_name, session.livy_session_id)
+        except HttpResponseError as exc:
+            logger.debug(f'Could not delete session {session_name}: {exc}')
+        self.session_registry.remove(self.registry_key(session_name))
+
+
+    def create_new_session(self, session_name: Optional[str] = None):
+        session_name = session_name or self.session_name
+        logger.debug(f'Creating a new session {session_name}')
         livy_session_response: ExtendedLivySessionResponse = self.spark_session_operations.create(
             self.workspace_name, self.spark_pool_name, 
             ExtendedLivySessionRequest(
-                name=self.session_name, 
+                name=session_name, 
                 driver_cores=self.conf['driver_cores'],
                 driver_memory=self.conf['driver_memory'],
                 executor_cores=self.conf['executor_cores'],
                 executor_memory=self.conf['executor_memory'],
-                num_executors=self.conf['num_executors']
+                num_executors=self.conf['num_executors'],
+                conf=self.spark_conf()
             )
         )
         session_id = livy_session_response.id
         return self.wait_for_available(session_id)
 
+    def spark_conf(self) -> Optional[Dict[str, str]]:
+        """
+        The `conf` of the cluster configuration, like dynamic allocation or
+        spark.sql.shuffle.partitions, as the strings Livy expects.
+        """
+        conf = self.conf.get('conf')
+        if not conf:
+            return None
+        return {key: spark_conf_value(value) for key, value in conf.items()}
 
-    def get_existing_session(self) -> LivySessionWrapper:
+    def get_existing_session(self, session_name: Optional[str] = None) -> LivySessionWrapper:
         """Search and returna session in the Livy Api."""
-        logger.debug(f'Searching for existing session with name {self.session_name}')
+        session_name = session_name or self.session_name
+        session_id = self.get_registered_session_id(session_name)
+        if session_id is not None:
+            # Still wait for availability, it may be in starting phase.
+            return self.wait_for_available(session_id)
+
+        logger.debug(f'Searching for existing session with name {session_name}')
         start = 0
+        # 20 is the largest page the Livy API returns.
         size = 20
         while True:
             session_list: ExtendedLivyListSessionResponse = self.spark_session_operations.list(
                 self.workspace_name, self.spark_pool_name, from_parameter=start, size=size,
                 detailed=True)
             for session in session_list.sessions:
-                if session.name == self.session_name:
-                    if session.state != 'dead':
+                if session.name == session_name:
+                    if session.state not in SESSION_FINAL_STATES:
                         logger.debug(f"Found {session.name} ({session.id}): {session.state}")
                         # Still wait for availability, it may be in starting phase.
                         return self.wait_for_available(session.id)
-            if len(session_list.sessions) == 0:
-                return None
             start = start+size
+            if len(session_list.sessions) == 0 or (
+                    session_list.total is not None and start >= session_list.total):
+                return None
+
+    def get_registered_session_id(self, session_name: str) -> Optional[int]:
+        """Validate the session the registry knows by this name with one call."""
+        registry_key = self.registry_key(session_name)
+        entry = self.session_registry.get(registry_key)
+        if entry is None:
+            return None
+        try:
+            session: ExtendedLivySessionResponse = self.spark_session_operations.get(
+                self.workspace_name, self.spark_pool_name, entry['id'])
+        except HttpResponseError as exc:
+            logger.debug(f'Registered session {session_name} is gone: {exc}')
+            session = None
+        if (session is None or session.name != session_name
+                or session.state in SESSION_FINAL_STATES):
+            self.session_registry.remove(registry_key)
+            return None
+        logger.debug(f"Found registered {session.name} ({session.id}): {session.state}")
+        self.session_registry.put(registry_key, session.id, session.state)
+        return session.id
 
 
     def wait_for_available(self, session_id: int):
-        previous_state = 'Unknown state'
-        state = previous_state
-        while True:
-            livy_session_response = self.spark_session_operations.get(
-                self.workspace_name, self.spark_pool_name, session_id)
-            state = livy_session_response.state
-            if state != previous_state:
-                logger.debug(f"Session state ({session_id}): {state}")
-                previous_state = state
-            time.sleep(self.poll_interval)
-            if state == 'idle':
-                break
-            if state == 'dead':
-                logger.debug(f'Session ({session_id}) is dead')
-                return None
+        state = self.statement_engine.run(
+            self.statement_engine.wait_for_session(session_id, self.poll_policy))
+        if state != 'idle':
+            logger.debug(f'Session ({session_id}) is {state}')
+            return None
         return LivySessionWrapper(session_id, self.spark_session_operations, 
-            self.workspace_name, self.spark_pool_name, self.poll_interval)
+            self.workspace_name, self.spark_pool_name, self.poll_policy,
+            self.statement_engine)
 
+
+class LivySessionPool():
+    """
+    A bounded pool of Livy sessions, shared by all dbt threads.
+
+    Livy runs the statements of one session one after the other, so every dbt
+    thread checks out a session of its own. Sessions are named
+    `dbt-{user}-{n}` so a later invocation can find and reuse them. Once
+    `max_sessions` sessions exist, threads share the least used session
+    instead of waiting, which is what happens with a single session as well.
+    """
+
+    """
+    A static cache of pools, so going to the Livy API searching for a session
+    is only necessary once per invocation.
+    """
+    POOLS: Dict[Tuple[str, str, str, Optional[str]], "LivySessionPool"] = {}
+    POOLS_LOCK = threading.Lock()
+
+    def __init__(self, factory: LivySessionFactory, min_sessions: int,
+                 max_sessions: int):
+        if min_sessions < 0 or max_sessions < 1 or min_sessions > max_sessions:
+            raise dbt.exceptions.RuntimeException(
+                f'Invalid session pool size: min_sessions={min_sessions}, '
+                f'max_sessions={max_sessions}')
+        self.factory = factory
+        self.cluster_profile = factory.cluster_profile
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        self._condition = threading.Condition()
+        self._sessions: Dict[int, LivySessionWrapper] = {}
+        self._leases: Dict[int, int] = {}
+        self._starting: Set[int] = set()
+        # The slots warm() starts, which no thread has leased yet.
+        self._warming: Set[int] = set()
+
+    @classmethod
+    def get_pool(cls, workspace_name: str, spark_pool_name: str, user: str,
+                 authentication: str, conf: Dict[str, Any],
+                 poll_policy: PollPolicy, min_sessions: int = 1,
+                 max_sessions: int = 1,
+                 session_registry_path: Optional[str] = None,
+                 cluster_profile: Optional[str] = None) -> "LivySessionPool":
+        """Return the pool for this workspace, spark pool, user and cluster profile."""
+        key = (workspace_name, spark_pool_name, user, cluster_profile)
+        with cls.POOLS_LOCK:
+            pool = cls.POOLS.get(key)
+            if pool is None:
+                factory = LivySessionFactory(
+                    workspace_name=workspace_name,
+                    spark_pool_name=spark_pool_name,
+                    user=user,
+                    authentication=authentication,
+                    conf=conf,
+                    poll_policy=poll_policy,
+                    session_registry=LivySessionRegistry(session_registry_path),
+                    cluster_profile=cluster_profile
+                )
+                pool = cls(factory, min_sessions, max_sessions)
+                cls.POOLS[key] = pool
+                # Reserve the warm slots while holding the lock, so other
+                # threads wait for the warm sessions instead of starting
+                # their own, but start them without it: cancel_open and
+                # cleanup must not wait for a cold start.
+                warming = pool._reserve_warm()
+            else:
+                warming = []
+        pool._start_warm(warming)
+        return pool
+
+    @classmethod
+    def existing_pools(cls) -> List["LivySessionPool"]:
+        """The pools created in this process, without starting any."""
+        with cls.POOLS_LOCK:
+            return list(cls.POOLS.values())
+
+    def session_name(self, index: int) -> str:
+        return f'{self.factory.session_name}-{index}'
+
+    def cancel_statements(self) -> int:
+        """
+        Cancel the statements in flight on the sessions of this pool, of all
+        threads. Returns the number of statements that were cancelled.
+        """
+        engine = self.factory.statement_engine
+        return engine.run(engine.cancel_all(self.factory.poll_policy))
+
+    def delete_sessions(self) -> None:
+        """
+        Delete the sessions of the pool. Connections opened afterwards start
+        new sessions.
+        """
+        with self._condition:
+            sessions = dict(self._sessions)
+            self._sessions.clear()
+            self._leases.clear()
+        for index, session in sorted(sessions.items()):
+            self.factory.delete_session(session, self.session_name(index))
+
+    def warm(self) -> None:
+        """Start `min_sessions` sessions concurrently and wait for them."""
+        self._start_warm(self._reserve_warm())
+
+    def _reserve_warm(self) -> List[int]:
+        with self._condition:
+            indexes = [i for i in range(self.min_sessions)
+                       if i not in self._sessions and i not in self._starting]
+            self._starting.update(indexes)
+            self._warming.update(indexes)
+        return indexes
+
+    def _start_warm(self, indexes: List[int]) -> None:
+        if not indexes:
+            return
+        logger.debug(f'Warming up {len(indexes)} Livy session(s)')
+        with ThreadPoolExecutor(max_workers=len(indexes)) as tpe:
+            for future in [tpe.submit(self._start, i) for i in indexes]:
+                future.result()
+
+    def sessions(self) -> List[LivySessionWrapper]:
+        """The sessions that are available, in slot order."""
+        with self._condition:
+            return [self._sessions[i] for i in sorted(self._sessions)]
+
+    def checkout(self) -> LivySessionWrapper:
+        """Lease an idle session, start a new one, or share the least used."""
+        with self._condition:
+            while True:
+                idle = [i for i, leases in self._leases.items() if leases == 0]
+                if idle:
+                    return self._lease(min(idle))
+                if self._warming:
+                    # A warm session is about to become idle.
+                    self._condition.wait()
+                    continue
+                free = [i for i in range(self.max_sessions)
+                        if i not in self._sessions and i not in self._starting]
+                if free:
+                    index = free[0]
+                    self._starting.add(index)
+                    break
+                if self._sessions:
+                    return self._lease(min(self._leases, key=self._leases.get))
+                # Every session is still starting, wait for the first one.
+                self._condition.wait()
+        return self._start(index, leased=True)
+
+    def checkin(self, session: LivySessionWrapper) -> None:
+        with self._condition:
+            if self._leases.get(session.pool_index, 0) > 0:
+                self._leases[session.pool_index] -= 1
+            self._condition.notify_all()
+
+    def _lease(self, index: int) -> LivySessionWrapper:
+        self._leases[index] += 1
+        logger.debug(f'Checked out {self.session_name(index)} '
+                     f'({self._leases[index]} lease(s))')
+        return self._sessions[index]
+
+    def _start(self, index: int, leased: bool = False) -> LivySessionWrapper:
+        """Connect the session in slot `index`, which must be reserved."""
+        try:
+            session = self.factory.connect(self.session_name(index))
+        except BaseException:
+            with self._condition:
+                self._starting.discard(index)
+                self._warming.discard(index)
+                self._condition.notify_all()
+            raise
+        session.pool = self
+        session.pool_index = index
+        with self._condition:
+            self._starting.discard(index)
+            self._warming.discard(index)
+            self._sessions[index] = session
+            self._leases[index] = 1 if leased else 0
+            self._condition.notify_all()
+        return session
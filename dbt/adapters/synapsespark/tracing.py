@@ -0,0 +1,124 @@
+"""
+Timings of the adapter's work, to tell a slow spark from adapter overhead.
+
+Spans are recorded around submitting a Livy statement, every poll, the time a
+statement spends in each Livy state, decoding results and parsing metadata.
+Each span carries the dbt node of the connection that caused it. Spans are
+logged at debug level, and written to `trace_path` when it is set in the
+target, as a Chrome trace (chrome://tracing, https://ui.perfetto.dev) or as
+json lines.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+from dbt.events import AdapterLogger
+
+logger = AdapterLogger("SynapseSpark")
+
+TRACE_FORMATS = ('chrome', 'jsonl')
+
+# The dbt node (the name of the connection) that the current work is for.
+CURRENT_NODE: ContextVar[Optional[str]] = ContextVar('synapsespark_node', default=None)
+
+# Spans that happen too often to log one by one, they are still traced.
+QUIET_SPANS = ('livy.poll',)
+
+
+class Tracer():
+    """Records spans, and writes them to a trace file when one is configured."""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.format = 'chrome'
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+        # Chrome traces group spans by (numeric) thread, one per dbt node.
+        self._node_tids: Dict[str, int] = {}
+        self._close_at_exit = False
+
+    def configure(self, path: Optional[str], trace_format: str = 'chrome',
+                  invocation_id: Optional[str] = None) -> None:
+        """
+        Start writing spans to `path`, which may contain `{invocation_id}`.
+        The file of an earlier configuration is closed.
+        """
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Invalid trace_format {trace_format!r}, "
+                             f"expected one of {', '.join(TRACE_FORMATS)}")
+        with self._lock:
+            self._close()
+            self.format = trace_format
+            self.path = path.format(invocation_id=invocation_id or '') if path else None
+            self._node_tids = {}
+            if self.path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'w')
+                if not self._close_at_exit:
+                    # cleanup_connections only flushes, a command can run more tasks
+                    atexit.register(self.close)
+                    self._close_at_exit = True
+                if self.format == 'chrome':
+                    # The closing bracket is optional in the Chrome trace format,
+                    # so spans can be written as they end.
+                    self._file.write('[\n')
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """Time the block. It can add to the returned args of the span."""
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, started, time.perf_counter() - start, **args)
+
+    def record(self, name: str, started: float, duration: float, **args: Any) -> None:
+        """Record a span that started at epoch `started` and took `duration` seconds."""
+        node = CURRENT_NODE.get()
+        if name not in QUIET_SPANS:
+            logger.debug(f"Timing {name}: {duration * 1000:.1f} ms "
+                         f"{json.dumps(dict(args, node=node), default=str)}")
+        if self._file is None:
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            if self.format == 'jsonl':
+                event = {'name': name, 'node': node, 'start': started,
+                         'duration': duration, 'args': args}
+                self._file.write(json.dumps(event, default=str) + '\n')
+                return
+            tid = self._node_tids.get(node or 'adapter')
+            if tid is None:
+                tid = self._node_tids[node or 'adapter'] = len(self._node_tids) + 1
+                self._write_chrome({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                                    'tid': tid, 'args': {'name': node or 'adapter'}})
+            self._write_chrome({'name': name, 'cat': name.split('.')[0], 'ph': 'X',
+                                'ts': int(started * 1e6), 'dur': int(duration * 1e6),
+                                'pid': os.getpid(), 'tid': tid, 'args': args})
+
+    def _write_chrome(self, event: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(event, default=str) + ',\n')
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+TRACER = Tracer()
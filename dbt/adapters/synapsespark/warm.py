@@ -0,0 +1,47 @@
+"""
+Start the Livy sessions of a dbt target ahead of dbt itself.
+
+A Synapse spark pool takes minutes to start. Running this before dbt, for
+example as an early step of a CI pipeline, overlaps that cold start with
+other work. dbt then finds the sessions by name and reuses them.
+
+    dbt-synapsespark-warm --profile my_dbt_project --target dev
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from dbt.config.profile import Profile, read_profile
+from dbt.config.renderer import ProfileRenderer
+import dbt.flags
+
+from dbt.adapters.synapsespark.connections import SynapseSparkConnectionManager
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='dbt-synapsespark-warm',
+        description='Start the Livy sessions of a dbt target.')
+    parser.add_argument('--profile', required=True,
+                        help='The profile in profiles.yml to use.')
+    parser.add_argument('--target', default=None,
+                        help='The target of the profile, defaults to its default target.')
+    parser.add_argument('--profiles-dir', default=dbt.flags.PROFILES_DIR,
+                        help='The directory with profiles.yml.')
+    args = parser.parse_args(argv)
+
+    raw_profiles = read_profile(args.profiles_dir)
+    profile = Profile.from_raw_profiles(
+        raw_profiles, args.profile, ProfileRenderer(), target_override=args.target)
+    if profile.credentials.type != SynapseSparkConnectionManager.TYPE:
+        print(f'Target {profile.target_name} is not a synapsespark target', file=sys.stderr)
+        return 1
+
+    pool = SynapseSparkConnectionManager.get_session_pool(profile.credentials)
+    for session in pool.sessions():
+        print(f'{pool.session_name(session.pool_index)}: {session.livy_session_id}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
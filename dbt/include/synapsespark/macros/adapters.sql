@@ -149,11 +149,9 @@
     {%- endif -%}
   {%- elif language == 'python' -%}
     {#--
-    N.B. Python models _can_ write to temp views HOWEVER they use a different session
-    and have already expired by the time they need to be used (I.E. in merges for incremental models)
-
-    TODO: Deep dive into spark sessions to see if we can reuse a single session for an entire
-    dbt invocation.
+    Python models run as pyspark statements on the Livy session of the model's
+    connection, so temp views they write survive until they are used (I.E. in
+    merges for incremental models).
      --#}
     {{ py_write_table(compiled_code=compiled_code, target_relation=relation) }}
   {%- endif -%}
@@ -242,16 +240,19 @@
 
 {% macro synapsespark__alter_column_comment(relation, column_dict) %}
   {% if config.get('file_format', validator=validation.any[basestring]) in ['delta', 'hudi'] %}
+    {% set comment_queries = [] %}
     {% for column_name in column_dict %}
       {% set comment = column_dict[column_name]['description'] %}
       {% set escaped_comment = comment | replace('\'', '\\\'') %}
       {% set comment_query %}
         alter table {{ relation }} change column
             {{ adapter.quote(column_name) if column_dict[column_name]['quote'] else column_name }}
-            comment '{{ escaped_comment }}';
+            comment '{{ escaped_comment }}'
       {% endset %}
-      {% do run_query(comment_query) %}
+      {% do comment_queries.append(comment_query) %}
     {% endfor %}
+    {#-- one Livy round trip for all columns --#}
+    {% do adapter.execute_batch(comment_queries) %}
   {% endif %}
 {% endmacro %}
 
@@ -298,3 +299,77 @@
   {% do run_query(sql) %}
 
 {% endmacro %}
+
+{% macro delta_maintain_relation(relation) %}
+  {#--
+    Optimize and vacuum the delta table when it is due, and add the rows the
+    main statement wrote, from the history of the table, to its response
+    when the statement did not return them.
+  --#}
+  {%- if not execute or config.get('file_format', 'parquet') != 'delta' -%}
+    {{ return('') }}
+  {%- endif -%}
+  {%- set main = load_result('main') -%}
+  {%- set response = adapter.maintain_delta_relation(
+    relation,
+    optimize=config.get('optimize'),
+    zorder_by=config.get('zorder_by'),
+    every_n_runs=config.get('optimize_every_n_runs'),
+    min_files=config.get('optimize_min_files'),
+    vacuum_retention_hours=config.get('vacuum_retention_hours'),
+    response=main.response if main else none
+  ) -%}
+  {%- if main -%}
+    {% do store_result('main', response=response, agate_table=main.table) %}
+  {%- endif -%}
+{% endmacro %}
+
+
+{% macro spark_analyze_enabled() %}
+  {{ return(config.get('analyze', false) or config.get('analyze_columns') is not none) }}
+{% endmacro %}
+
+
+{% macro spark_analyze_relation(relation, partitions=none) %}
+  {#--
+    Compute the statistics of the relation for the cost based optimizer, of
+    the `partitions` specs only when given, and add its row and byte counts
+    to the response of the main statement.
+  --#}
+  {%- if not execute or not spark_analyze_enabled() -%}
+    {{ return('') }}
+  {%- endif -%}
+  {%- set main = load_result('main') -%}
+  {%- set response = adapter.analyze_relation(
+    relation, config.get('analyze_columns'), partitions, main.response if main else none
+  ) -%}
+  {%- if main -%}
+    {% do store_result('main', response=response, agate_table=main.table) %}
+  {%- endif -%}
+{% endmacro %}
+
+
+{% macro spark_cache_relation(relation) %}
+  {#-- the parents this node read are no longer needed for it --#}
+  {% do adapter.spark_cache_node_finished(model.unique_id) %}
+
+  {%- set storage = config.get('spark_cache', 'none') -%}
+  {%- if storage == 'none' or not execute -%}
+    {{ return('') }}
+  {%- endif -%}
+
+  {#-- the selected nodes that read the relation, through views and ephemeral models --#}
+  {%- set dependents = [] -%}
+  {%- set parents = [model.unique_id] -%}
+  {%- for parent in parents -%}
+    {%- for node in graph.nodes.values() if parent in node.depends_on.nodes -%}
+      {%- if node.config.materialized in ('view', 'ephemeral') -%}
+        {%- do parents.append(node.unique_id) -%}
+      {%- elif node.resource_type in ('model', 'snapshot') and node.unique_id in selected_resources -%}
+        {%- do dependents.append(node.unique_id) -%}
+      {%- endif -%}
+    {%- endfor -%}
+  {%- endfor -%}
+
+  {% do adapter.spark_cache_relation(relation, storage, dependents) %}
+{% endmacro %}
@@ -31,9 +31,6 @@
 
 
 {% macro synapsespark__call_dcl_statements(dcl_statement_list) %}
-    {% for dcl_statement in dcl_statement_list %}
-        {% call statement('grant_or_revoke') %}
-            {{ dcl_statement }}
-        {% endcall %}
-    {% endfor %}
+    {#-- one Livy round trip for all grants and revokes --#}
+    {% do adapter.execute_batch(dcl_statement_list) %}
 {% endmacro %}
@@ -16,17 +16,17 @@
   {%- set target_relation = this -%}
   {%- set existing_relation = load_relation(this) -%}
   {%- set tmp_relation = make_temp_relation(this) -%}
+  {#-- the partitions to analyze, none for the whole table --#}
+  {%- set analyze_partitions = none -%}
 
   {#-- for SQL model we will create temp view that doesn't have database and schema --#}
   {%- if language == 'sql'-%}
     {%- set tmp_relation = tmp_relation.include(database=false, schema=false) -%}
   {%- endif -%}
 
-  {#-- Set Overwrite Mode --#}
+  {#-- Set Overwrite Mode, for this model only --#}
   {%- if strategy == 'insert_overwrite' and partition_by -%}
-    {%- call statement() -%}
-      set spark.sql.sources.partitionOverwriteMode = DYNAMIC
-    {%- endcall -%}
+    {%- do adapter.set_spark_conf({'spark.sql.sources.partitionOverwriteMode': 'DYNAMIC'}) -%}
   {%- endif -%}
 
   {#-- Run pre-hooks --#}
@@ -53,9 +53,16 @@
       {{ create_table_as(True, tmp_relation, compiled_code, language) }}
     {%- endcall -%}
     {%- do process_schema_changes(on_schema_change, tmp_relation, existing_relation) -%}
-    {%- call statement('main') -%}
-      {{ dbt_spark_get_incremental_sql(strategy, tmp_relation, target_relation, unique_key) }}
+    {#-- the columns of the target once, after any schema changes, for the strategy --#}
+    {%- set dest_columns = adapter.get_columns_in_relation(existing_relation) -%}
+    {#-- replace_where writes with pyspark, the other strategies are sql --#}
+    {%- call statement('main', language='python' if strategy == 'replace_where' else 'sql') -%}
+      {{ dbt_spark_get_incremental_sql(strategy, tmp_relation, target_relation, unique_key, dest_columns) }}
     {%- endcall -%}
+    {#-- delta has no partition statistics --#}
+    {%- if spark_analyze_enabled() and file_format != 'delta' -%}
+      {%- set analyze_partitions = get_incoming_partition_specs(tmp_relation) -%}
+    {%- endif -%}
     {%- if language == 'python' -%}
       {#--
       This is yucky.
@@ -75,6 +82,12 @@
 
   {% do persist_docs(target_relation, model) %}
 
+  {% do delta_maintain_relation(target_relation) %}
+
+  {% do spark_analyze_relation(target_relation, analyze_partitions) %}
+
+  {% do spark_cache_relation(target_relation) %}
+
   {{ run_hooks(post_hooks) }}
 
   {{ return({'relations': [target_relation]}) }}
@@ -1,6 +1,6 @@
-{% macro get_insert_overwrite_sql(source_relation, target_relation) %}
+{% macro get_insert_overwrite_sql(source_relation, target_relation, dest_columns=none) %}
 
-    {%- set dest_columns = adapter.get_columns_in_relation(target_relation) -%}
+    {%- set dest_columns = dest_columns if dest_columns is not none else adapter.get_columns_in_relation(target_relation) -%}
     {%- set dest_cols_csv = dest_columns | map(attribute='quoted') | join(', ') -%}
     insert overwrite table {{ target_relation }}
     {{ partition_cols(label="partition") }}
@@ -9,9 +9,9 @@
 {% endmacro %}
 
 
-{% macro get_insert_into_sql(source_relation, target_relation) %}
+{% macro get_insert_into_sql(source_relation, target_relation, dest_columns=none) %}
 
-    {%- set dest_columns = adapter.get_columns_in_relation(target_relation) -%}
+    {%- set dest_columns = dest_columns if dest_columns is not none else adapter.get_columns_in_relation(target_relation) -%}
     {%- set dest_cols_csv = dest_columns | map(attribute='quoted') | join(', ') -%}
     insert into table {{ target_relation }}
     select {{dest_cols_csv}} from {{ source_relation }}
@@ -22,9 +22,10 @@
 {% macro synapsespark__get_merge_sql(target, source, unique_key, dest_columns, predicates=none) %}
   {# need dest_columns for merge_exclude_columns, default to use "*" #}
   {%- set predicates = [] if predicates is none else [] + predicates -%}
-  {%- set dest_columns = adapter.get_columns_in_relation(target) -%}
   {%- set merge_update_columns = config.get('merge_update_columns') -%}
   {%- set merge_exclude_columns = config.get('merge_exclude_columns') -%}
+  {#-- callers other than the incremental materialization may not pass them --#}
+  {%- set dest_columns = dest_columns if dest_columns is not none else adapter.get_columns_in_relation(target) -%}
   {%- set update_columns = get_merge_update_columns(merge_update_columns, merge_exclude_columns, dest_columns) -%}
 
   {% if unique_key %}
@@ -41,6 +42,7 @@
           {% endset %}
           {% do predicates.append(unique_key_match) %}
       {% endif %}
+      {% do predicates.extend(get_merge_partition_predicates(source)) %}
   {% else %}
       {% do predicates.append('FALSE') %}
   {% endif %}
@@ -62,16 +64,223 @@
 {% endmacro %}
 
 
-{% macro dbt_spark_get_incremental_sql(strategy, source, target, unique_key) %}
+{% macro get_merge_partition_predicates(source) %}
+  {#--
+    With `merge_partition_pruning`, restrict the target of a merge to the
+    partitions the incoming rows fall in, so delta only rewrites the files of
+    those partitions: 'range' limits each `partition_by` column to the min and
+    max of the source, 'values' to its distinct values (or to the range, when
+    there are more than 1000).
+
+    The predicates are part of the ON clause of the merge, so the partition
+    values of an existing unique_key must never change: a row that moved to
+    another partition does not match its old version, which is pruned, and is
+    inserted as a duplicate.
+  --#}
+  {%- set mode = config.get('merge_partition_pruning', none) -%}
+  {%- set partition_by = config.get('partition_by', validator=validation.any[list, basestring]) -%}
+  {%- if mode is none or not partition_by -%}
+    {{ return([]) }}
+  {%- endif -%}
+  {%- if mode not in ['range', 'values'] -%}
+    {% set invalid_pruning_msg -%}
+      Invalid merge_partition_pruning provided: {{ mode }}
+      Expected one of: 'range', 'values'
+    {%- endset %}
+    {% do exceptions.raise_compiler_error(invalid_pruning_msg) %}
+  {%- endif -%}
+  {%- set partition_by = [partition_by] if partition_by is string else partition_by -%}
+  {%- set max_values = 1000 -%}
+
+  {#-- the bounds are cast back to the type of the column in the predicates --#}
+  {%- set data_types = partition_column_types(source, partition_by) -%}
+
+  {#-- one pass over the source for the bounds of all partition columns --#}
+  {%- set bounds_sql -%}
+    select
+    {%- for column in partition_by %}
+      cast(min({{ column }}) as string),
+      cast(max({{ column }}) as string),
+      max(case when {{ column }} is null then 1 else 0 end),
+      {% if mode == 'values' -%}
+        case when count(distinct {{ column }}) <= {{ max_values }}
+          then to_json(collect_set(cast({{ column }} as string))) end
+      {%- else -%}
+        null
+      {%- endif -%}
+      {%- if not loop.last %},{% endif %}
+    {%- endfor %}
+    from {{ source }}
+  {%- endset -%}
+  {%- set bounds = run_query(bounds_sql).rows[0] -%}
+
+  {%- set predicates = [] -%}
+  {%- for column in partition_by -%}
+    {%- set data_type = data_types[loop.index0] -%}
+    {%- set min_value, max_value, has_nulls, values = bounds[loop.index0 * 4 : loop.index0 * 4 + 4] -%}
+    {%- set conditions = [] -%}
+    {%- if values is not none -%}
+      {%- set literals = [] -%}
+      {%- for value in fromjson(values) -%}
+        {%- do literals.append(partition_literal(value, data_type)) -%}
+      {%- endfor -%}
+      {%- if literals -%}
+        {%- do conditions.append('DBT_INTERNAL_DEST.' ~ column ~ ' in (' ~ literals | join(', ') ~ ')') -%}
+      {%- endif -%}
+    {%- elif min_value is not none -%}
+      {%- do conditions.append('DBT_INTERNAL_DEST.' ~ column ~ ' between '
+          ~ partition_literal(min_value, data_type) ~ ' and ' ~ partition_literal(max_value, data_type)) -%}
+    {%- endif -%}
+    {%- if has_nulls -%}
+      {%- do conditions.append('DBT_INTERNAL_DEST.' ~ column ~ ' is null') -%}
+    {%- endif -%}
+    {#-- no conditions means no incoming rows, there is nothing to prune then --#}
+    {%- if conditions -%}
+      {%- do predicates.append('(' ~ conditions | join(' or ') ~ ')') -%}
+    {%- endif -%}
+  {%- endfor -%}
+
+  {{ return(predicates) }}
+{% endmacro %}
+
+
+{% macro get_replace_where_sql(source_relation, target_relation, dest_columns=none) %}
+  {#--
+    Overwrite the rows of the target that match the `replace_where` config,
+    or by default the partitions of the new rows, with delta's replaceWhere.
+    Spark SQL has no `replace where`, so this is a pyspark statement.
+  --#}
+  {%- set predicate = config.get('replace_where', validator=validation.any[list, basestring]) -%}
+  {%- if predicate is none -%}
+    {%- set predicate = get_replace_where_partition_predicate(source_relation) -%}
+  {%- elif predicate is not string -%}
+    {%- set predicate = predicate | join(' and ') -%}
+  {%- endif -%}
+  {%- set dest_columns = dest_columns if dest_columns is not none else adapter.get_columns_in_relation(target_relation) -%}
+  {%- set dest_cols = dest_columns | map(attribute='quoted') | list -%}
+(spark.table({{ tojson(source_relation.render()) }})
+    .select({{ tojson(dest_cols) }})
+    .write.format("delta")
+    .mode("overwrite")
+    .option("replaceWhere", {{ tojson(predicate) }})
+    .saveAsTable({{ tojson(target_relation.render()) }}))
+{% endmacro %}
+
+
+{% macro get_replace_where_partition_predicate(source) %}
+  {#-- exactly the partitions of the new rows, not the range they span --#}
+  {%- set partition_by = config.get('partition_by', validator=validation.any[list, basestring]) -%}
+  {%- if not partition_by -%}
+    {% set missing_partition_msg -%}
+      Invalid incremental strategy provided: replace_where
+      Set either replace_where or partition_by in the config of the model
+    {%- endset %}
+    {% do exceptions.raise_compiler_error(missing_partition_msg) %}
+  {%- endif -%}
+  {%- set partition_by = [partition_by] if partition_by is string else partition_by -%}
+  {%- set data_types = partition_column_types(source, partition_by) -%}
+
+  {%- set partitions_sql -%}
+    select distinct
+    {%- for column in partition_by %}
+      cast({{ column }} as string){%- if not loop.last %},{% endif %}
+    {%- endfor %}
+    from {{ source }}
+  {%- endset -%}
+
+  {%- set partitions = [] -%}
+  {%- for row in run_query(partitions_sql).rows -%}
+    {%- set conditions = [] -%}
+    {%- for column in partition_by -%}
+      {%- if row[loop.index0] is none -%}
+        {%- do conditions.append(column ~ ' is null') -%}
+      {%- else -%}
+        {%- do conditions.append(column ~ ' = ' ~ partition_literal(row[loop.index0], data_types[loop.index0])) -%}
+      {%- endif -%}
+    {%- endfor -%}
+    {%- do partitions.append('(' ~ conditions | join(' and ') ~ ')') -%}
+  {%- endfor -%}
+
+  {#-- no new rows replace nothing --#}
+  {{ return(partitions | join(' or ') if partitions else 'false') }}
+{% endmacro %}
+
+
+{% macro get_incoming_partition_specs(source) %}
+  {#--
+    The partition specs, like `a = '1', b = 'x'`, of the partitions the new
+    rows are in, to analyze only those. None when there are no partitions, or
+    a partition value is null, which a partition spec can not express.
+  --#}
+  {%- set partition_by = config.get('partition_by', validator=validation.any[list, basestring]) -%}
+  {%- if not partition_by -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set partition_by = [partition_by] if partition_by is string else partition_by -%}
+
+  {%- set partitions_sql -%}
+    select distinct
+    {%- for column in partition_by %}
+      cast({{ column }} as string){%- if not loop.last %},{% endif %}
+    {%- endfor %}
+    from {{ source }}
+  {%- endset -%}
+
+  {%- set specs = [] -%}
+  {%- for row in run_query(partitions_sql).rows -%}
+    {%- set values = [] -%}
+    {%- for column in partition_by -%}
+      {%- if row[loop.index0] is none -%}
+        {{ return(none) }}
+      {%- endif -%}
+      {#-- spark casts the string to the type of the partition column --#}
+      {%- set escaped = row[loop.index0] | replace('\\', '\\\\') | replace("'", "\\'") -%}
+      {%- do values.append(column ~ " = '" ~ escaped ~ "'") -%}
+    {%- endfor -%}
+    {%- do specs.append(values | join(', ')) -%}
+  {%- endfor -%}
+  {{ return(specs) }}
+{% endmacro %}
+
+
+{% macro partition_column_types(relation, partition_by) %}
+  {%- set relation_types = {} -%}
+  {%- for column in adapter.get_columns_in_relation(relation) -%}
+    {%- do relation_types.update({column.column | lower: column.data_type}) -%}
+  {%- endfor -%}
+  {%- set data_types = [] -%}
+  {%- for column in partition_by -%}
+    {%- if (column | lower) not in relation_types -%}
+      {% do exceptions.raise_compiler_error(
+          "Partition column " ~ column ~ " is not a column of " ~ relation
+      ) %}
+    {%- endif -%}
+    {%- do data_types.append(relation_types[column | lower]) -%}
+  {%- endfor -%}
+  {{ return(data_types) }}
+{% endmacro %}
+
+
+{% macro partition_literal(value, data_type) %}
+  {%- set escaped = value | replace('\\', '\\\\') | replace("'", "\\'") -%}
+  {{ return("cast('" ~ escaped ~ "' as " ~ data_type ~ ")") }}
+{% endmacro %}
+
+
+{% macro dbt_spark_get_incremental_sql(strategy, source, target, unique_key, dest_columns=none) %}
+  {#-- dest_columns: the columns of target, when the caller already has them --#}
   {%- if strategy == 'append' -%}
     {#-- insert new records into existing table, without updating or overwriting #}
-    {{ get_insert_into_sql(source, target) }}
+    {{ get_insert_into_sql(source, target, dest_columns) }}
   {%- elif strategy == 'insert_overwrite' -%}
     {#-- insert statements don't like CTEs, so support them via a temp view #}
-    {{ get_insert_overwrite_sql(source, target) }}
+    {{ get_insert_overwrite_sql(source, target, dest_columns) }}
   {%- elif strategy == 'merge' -%}
   {#-- merge all columns with databricks delta - schema changes are handled for us #}
-    {{ get_merge_sql(target, source, unique_key, dest_columns=none, predicates=none) }}
+    {{ get_merge_sql(target, source, unique_key, dest_columns=dest_columns, predicates=none) }}
+  {%- elif strategy == 'replace_where' -%}
+    {#-- overwrite the replaced partitions of a delta table, this is pyspark --#}
+    {{ get_replace_where_sql(source, target, dest_columns) }}
   {%- else -%}
     {% set no_sql_for_strategy_msg -%}
       No known SQL for the incremental strategy provided: {{ strategy }}
@@ -21,7 +21,7 @@
 
   {% set invalid_strategy_msg -%}
     Invalid incremental strategy provided: {{ raw_strategy }}
-    Expected one of: 'append', 'merge', 'insert_overwrite'
+    Expected one of: 'append', 'merge', 'insert_overwrite', 'replace_where'
   {%- endset %}
 
   {% set invalid_merge_msg -%}
@@ -29,10 +29,15 @@
     You can only choose this strategy when file_format is set to 'delta' or 'hudi'
   {%- endset %}
 
+  {% set invalid_replace_where_msg -%}
+    Invalid incremental strategy provided: {{ raw_strategy }}
+    You can only choose this strategy when file_format is set to 'delta'
+  {%- endset %}
+
   {% set invalid_insert_overwrite_delta_msg -%}
     Invalid incremental strategy provided: {{ raw_strategy }}
     You cannot use this strategy when file_format is set to 'delta'
-    Use the 'append' or 'merge' strategy instead
+    Use the 'append', 'merge' or 'replace_where' strategy instead
   {%- endset %}
 
   {% set invalid_insert_overwrite_endpoint_msg -%}
@@ -41,12 +46,15 @@
     Use the 'append' or 'merge' strategy instead
   {%- endset %}
 
-  {% if raw_strategy not in ['append', 'merge', 'insert_overwrite'] %}
+  {% if raw_strategy not in ['append', 'merge', 'insert_overwrite', 'replace_where'] %}
     {% do exceptions.raise_compiler_error(invalid_strategy_msg) %}
   {%-else %}
     {% if raw_strategy == 'merge' and file_format not in ['delta', 'hudi'] %}
       {% do exceptions.raise_compiler_error(invalid_merge_msg) %}
     {% endif %}
+    {% if raw_strategy == 'replace_where' and file_format != 'delta' %}
+      {% do exceptions.raise_compiler_error(invalid_replace_where_msg) %}
+    {% endif %}
     {% if raw_strategy == 'insert_overwrite' and file_format == 'delta' %}
       {% do exceptions.raise_compiler_error(invalid_insert_overwrite_delta_msg) %}
     {% endif %}
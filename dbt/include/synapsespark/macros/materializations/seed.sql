@@ -14,40 +14,19 @@
 
 {% macro synapsespark__load_csv_rows(model, agate_table) %}
 
-  {% set batch_size = get_batch_size() %}
   {% set column_override = model['config'].get('column_types', {}) %}
+  {% set column_types = [] %}
 
-  {% set statements = [] %}
-
-  {% for chunk in agate_table.rows | batch(batch_size) %}
-      {% set bindings = [] %}
-
-      {% for row in chunk %}
-          {% do bindings.extend(row) %}
-      {% endfor %}
-
-      {% set sql %}
-          insert into {{ this.render() }} values
-          {% for row in chunk -%}
-              ({%- for col_name in agate_table.column_names -%}
-                  {%- set inferred_type = adapter.convert_type(agate_table, loop.index0) -%}
-                  {%- set type = column_override.get(col_name, inferred_type) -%}
-                    cast({{ get_binding_char() }} as {{type}})
-                  {%- if not loop.last%},{%- endif %}
-              {%- endfor -%})
-              {%- if not loop.last%},{%- endif %}
-          {%- endfor %}
-      {% endset %}
-
-      {% do adapter.add_query(sql, bindings=bindings, abridge_sql_log=True) %}
-
-      {% if loop.index0 == 0 %}
-          {% do statements.append(sql) %}
-      {% endif %}
+  {% for col_name in agate_table.column_names %}
+      {% set inferred_type = adapter.convert_type(agate_table, loop.index0) %}
+      {% do column_types.append(column_override.get(col_name, inferred_type)) %}
   {% endfor %}
 
-  {# Return SQL so we can render it out into the compiled files #}
-  {{ return(statements[0]) }}
+  {#-- one pyspark statement instead of a round trip per batch of rows --#}
+  {% set row_count = adapter.load_seed_rows(this, agate_table, column_types) %}
+
+  {# Return a description so we can render it out into the compiled files #}
+  {{ return('-- inserted ' ~ row_count ~ ' rows into ' ~ this.render() ~ ' with pyspark') }}
 {% endmacro %}
 
 
@@ -169,6 +169,8 @@
 
   {% do persist_docs(target_relation, model) %}
 
+  {% do spark_cache_relation(target_relation) %}
+
   {{ run_hooks(post_hooks, inside_transaction=True) }}
 
   {{ adapter.commit() }}
@@ -29,6 +29,12 @@
 
   {% do persist_docs(target_relation, model) %}
 
+  {% do delta_maintain_relation(target_relation) %}
+
+  {% do spark_analyze_relation(target_relation) %}
+
+  {% do spark_cache_relation(target_relation) %}
+
   {{ run_hooks(post_hooks) }}
 
   {{ return({'relations': [target_relation]})}}
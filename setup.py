@@ -20,6 +20,12 @@ setup(
         "dbt-core~=1.3.0",
         "azure-identity==1.12.0",
         "azure-synapse==0.1.1",
-        "azure-synapse-spark==0.7.0"
+        "azure-synapse-spark==0.7.0",
+        "aiohttp>=3.8"
     ],
+    entry_points={
+        "console_scripts": [
+            "dbt-synapsespark-warm=dbt.adapters.synapsespark.warm:main",
+        ],
+    },
 )
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from tests.fake_livy import (  # noqa: F401
+    dbt_profile_target,
+    fake_livy,
+    fake_livy_settings,
+    profile_options,
+)
+
+# Set to a file name to also write the results as json.
+BENCHMARK_JSON_ENV = "SYNAPSESPARK_BENCHMARK_JSON"
+
+RESULTS: List[Dict[str, Any]] = []
+
+
+@pytest.fixture
+def benchmark(request):
+    """
+    Time `func` over `rounds` calls and record the result. Returns the
+    result of the last call.
+    """
+
+    def run(func: Callable[[], Any], rounds: int = 1, items: int = 1) -> Any:
+        durations = []
+        result = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = func()
+            durations.append(time.perf_counter() - start)
+        best = min(durations)
+        RESULTS.append({
+            "benchmark": request.node.nodeid.split("::", 1)[-1],
+            "rounds": rounds,
+            "best": best,
+            "mean": sum(durations) / rounds,
+            "items_per_second": items / best if best else None,
+        })
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section("synapsespark benchmarks")
+    for result in RESULTS:
+        rate = result["items_per_second"]
+        terminalreporter.write_line(
+            f"{result['benchmark']:<70} best {result['best'] * 1000:9.1f} ms  "
+            f"mean {result['mean'] * 1000:9.1f} ms"
+            + (f"  {rate:10.1f}/s" if rate else "")
+        )
+    path = os.environ.get(BENCHMARK_JSON_ENV)
+    if path:
+        with open(path, "w") as results_file:
+            json.dump(RESULTS, results_file, indent=2)
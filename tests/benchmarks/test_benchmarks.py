@@ -0,0 +1,142 @@
+"""
+Benchmarks of the adapter against the fake Livy of `fake_livy.py`.
+
+    python -m pytest tests/benchmarks
+
+Besides timing, the benchmarks check the number of Livy calls, which is what
+polling, batching and pooling regressions change first.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from dbt.tests.util import run_dbt
+
+from tests.fake_livy import FakeLivySettings, ModelsInTestSchema
+
+
+class TestStatementThroughput:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(request_latency=0.002, statement_duration=0.02,
+                                result_rows=1000, result_columns=10)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"max_sessions": 4}
+
+    def execute(self, adapter, name):
+        with adapter.connection_named(name):
+            _, table = adapter.execute("select * from fake", fetch=True)
+        return table
+
+    def test_execute_fetch(self, project, fake_livy, benchmark):
+        polls = fake_livy.calls.get("get_statement", 0)
+        table = benchmark(lambda: self.execute(project.adapter, "bench"), rounds=20)
+        assert len(table.rows) == 1000
+        # with adaptive polling a short statement takes a few polls, not one per poll_interval
+        polls = fake_livy.calls["get_statement"] - polls
+        assert polls / 20 <= 8
+
+    def test_execute_fetch_parallel(self, project, fake_livy, benchmark):
+        def run():
+            with ThreadPoolExecutor(4) as executor:
+                return list(executor.map(
+                    lambda i: self.execute(project.adapter, f"bench_{i % 4}"), range(40)))
+
+        tables = benchmark(run, rounds=3, items=40)
+        assert all(len(table.rows) == 1000 for table in tables)
+        # every thread got a session of its own
+        assert len(fake_livy.sessions) == 4
+
+
+class TestRelationListing:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=500, columns_per_relation=50)
+
+    def test_list_relations(self, project, benchmark):
+        schema_relation = project.adapter.Relation.create(
+            schema=project.test_schema).without_identifier()
+
+        def run():
+            with project.adapter.connection_named("bench"):
+                return project.adapter.list_relations_without_caching(schema_relation)
+
+        relations = benchmark(run, rounds=5, items=500)
+        assert len(relations) == 500
+
+    def test_columns_from_listing(self, project, fake_livy, benchmark):
+        relations = project.adapter.Relation.create(
+            schema=project.test_schema).without_identifier()
+        with project.adapter.connection_named("bench"):
+            project.adapter.list_relations_without_caching(relations)
+        statements = fake_livy.calls["create_statement"]
+
+        def run():
+            with project.adapter.connection_named("bench"):
+                return [
+                    project.adapter.get_columns_in_relation(
+                        project.adapter.Relation.create(schema=project.test_schema,
+                                                        identifier=f"table_{i}"))
+                    for i in range(500)
+                ]
+
+        columns = benchmark(run, rounds=3, items=500)
+        assert all(len(relation_columns) == 50 for relation_columns in columns)
+        # answered from the listing, without a describe per relation
+        assert fake_livy.calls["create_statement"] == statements
+
+
+models__view_sql = """
+{{ config(materialized='view') }}
+select 1 as id
+"""
+
+class TestCatalog(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=1000, columns_per_relation=50)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"catalog_cache": True}
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {"view_model.sql": models__view_sql}
+
+    def read_catalog(self, project):
+        with open(os.path.join(project.project_root, "target", "catalog.json")) as catalog:
+            return json.load(catalog)
+
+    def test_docs_generate(self, project, fake_livy, benchmark):
+        benchmark(lambda: run_dbt(["docs", "generate"]), rounds=3, items=1000)
+        assert len(self.read_catalog(project)["nodes"]) == 0
+        assert os.path.exists(
+            os.path.join(project.project_root, "target", "catalog_cache.json"))
+
+    def test_docs_generate_no_compile(self, project, fake_livy, benchmark):
+        statements = fake_livy.calls["create_statement"]
+        benchmark(lambda: run_dbt(["docs", "generate", "--no-compile"]), rounds=3, items=1000)
+        # one statement lists every schema of the catalog
+        assert fake_livy.calls["create_statement"] - statements <= 3
+
+
+seeds__large_csv = "id,name,amount,created_at\n" + "".join(
+    f"{i},name {i},{i * 1.5},2022-01-01 00:00:00\n" for i in range(20000)
+)
+
+
+class TestSeed:
+    @pytest.fixture(scope="class")
+    def seeds(self):
+        return {"large.csv": seeds__large_csv}
+
+    def test_seed(self, project, fake_livy, benchmark):
+        statements = fake_livy.calls.get("create_statement", 0)
+        results = benchmark(lambda: run_dbt(["seed"]), rounds=3, items=20000)
+        assert len(results) == 1
+        # the rows go in one pyspark statement, not a statement per batch of rows
+        assert (fake_livy.calls["create_statement"] - statements) / 3 <= 5
@@ -0,0 +1,588 @@
+"""
+An in-process stand-in for the Synapse Spark session API.
+
+The fake replaces the sync and async `SynapseClient` of the adapter. It keeps
+sessions and statements in memory, and answers the statements the adapter
+sends with generated results: a configurable number of rows for queries,
+`schemas x relations_per_schema` relations with `columns_per_relation`
+columns for relation listing and describe, and the json the pyspark
+statements of the adapter print. Every call waits `request_latency` seconds
+and a statement runs for `statement_duration` seconds, so the overhead of the
+adapter can be measured apart from spark.
+"""
+import ast
+import asyncio
+import base64
+import datetime
+import decimal
+import gzip
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from unittest import mock
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+from azure.synapse.models import (
+    ExtendedLivyListSessionResponse,
+    ExtendedLivySessionResponse,
+    LivyStatementOutput,
+    LivyStatementResponseBody,
+)
+
+from dbt.adapters.synapsespark import statement_engine, synapse_spark
+from dbt.adapters.synapsespark.catalog_cache import change_token
+from dbt.adapters.synapsespark.synapse_spark import LivySessionPool
+
+# The comments dbt puts in front of a statement.
+COMMENTS = r"^\s*(?:/\*.*?\*/\s*|--[^\n]*\n\s*)*"
+QUERY_REGEX = re.compile(COMMENTS + r"(?:select|with)\b", re.IGNORECASE | re.DOTALL)
+SHOW_TABLES_REGEX = re.compile(r"show table extended in `?(\w+)`? like", re.IGNORECASE)
+DESCRIBE_REGEX = re.compile(COMMENTS + r"describe\b", re.IGNORECASE | re.DOTALL)
+DETAIL_REGEX = re.compile(COMMENTS + r"describe detail\b", re.IGNORECASE | re.DOTALL)
+HISTORY_REGEX = re.compile(COMMENTS + r"describe history\b.*?(?:limit (\d+))?\s*$",
+                           re.IGNORECASE | re.DOTALL)
+SPOOL_REGEX = re.compile(r"from (dbt_stream_\w+) where __dbt_row_number > (\d+) "
+                         r"and __dbt_row_number <= (\d+)", re.IGNORECASE)
+DROP_SPOOL_REGEX = re.compile(r"drop view if exists (dbt_stream_\w+)", re.IGNORECASE)
+SET_REGEX = re.compile(COMMENTS + r"set\s+([\w.]+)\s*(?:=\s*(.*?))?\s*$",
+                       re.IGNORECASE | re.DOTALL)
+CREATE_TABLE_REGEX = re.compile(COMMENTS + r"create table (\S+) \((.*?)\)\s*(?:using|$)",
+                                re.IGNORECASE | re.DOTALL)
+COLUMN_REGEX = re.compile(r"`?(\w+)`?\s+(\w+(?:\(\d+,\s*\d+\))?)")
+SELECT_TABLE_REGEX = re.compile(COMMENTS + r"select \* from (\S+)\s*$", re.IGNORECASE | re.DOTALL)
+
+
+# The type of a map<string,string> column in the schema json of spark.
+MAP_TYPE = {'type': 'map', 'keyType': 'string', 'valueType': 'string', 'valueContainsNull': True}
+
+# The session sizes of the target of the tests.
+CLUSTER_CONFIGURATION = {
+    "driver_memory": "4g",
+    "driver_cores": 4,
+    "executor_memory": "4g",
+    "executor_cores": 4,
+    "num_executors": 2,
+}
+
+
+@dataclass
+class FakeLivySettings:
+    # seconds per API call, in either direction
+    request_latency: float = 0.0
+    # seconds from submitting a statement until it is available
+    statement_duration: float = 0.0
+    # seconds from creating a session until it is idle
+    session_start_duration: float = 0.0
+    result_rows: int = 1
+    result_columns: int = 4
+    relations_per_schema: int = 0
+    columns_per_relation: int = 10
+    # the types of the first columns of the relations, then bigint and string
+    column_types: Tuple[str, ...] = ()
+    # the `describe detail` of a delta table, and its writes in `describe history`
+    files_per_relation: int = 1
+    bytes_per_file: int = 1024
+    writes_per_relation: int = 1
+    # the operations of `describe history` instead, newest first
+    history_operations: Tuple[str, ...] = ()
+    # keep the tables created with `create table` and the rows seeds insert
+    # into them, to select them back
+    keep_tables: bool = False
+
+
+@dataclass
+class FakeStatement:
+    id: int
+    code: str
+    kind: str
+    submitted: float
+    cancelled: bool = False
+    output: Optional[Dict[str, Any]] = None
+    # the wall clock time it was submitted, Livy timestamps are in milliseconds
+    submitted_at: int = field(default_factory=lambda: int(time.time() * 1000))
+
+
+@dataclass
+class FakeSession:
+    id: int
+    name: str
+    created: float
+    statements: Dict[int, FakeStatement] = field(default_factory=dict)
+    deleted: bool = False
+    conf: Optional[Dict[str, str]] = None
+
+    def state(self, settings: FakeLivySettings) -> str:
+        if self.deleted:
+            return 'killed'
+        if time.monotonic() - self.created < settings.session_start_duration:
+            return 'starting'
+        return 'idle'
+
+
+class FakeLivy:
+    """The state of the fake Livy server, shared by the sync and async clients."""
+
+    def __init__(self, settings: Optional[FakeLivySettings] = None):
+        self.settings = settings or FakeLivySettings()
+        self.sessions: Dict[int, FakeSession] = {}
+        # API calls by operation name
+        self.calls: Dict[str, int] = {}
+        # results for sql a test controls, see `respond`
+        self.responses: List[Tuple[Pattern, List[Tuple[str, str]], List[List[Any]]]] = []
+        # statements that fail, see `fail`
+        self.failures: List[Tuple[Pattern, str]] = []
+        # the results of streamed statements with more rows than a chunk, by view
+        self.spools: Dict[str, Dict[str, Any]] = {}
+        # the kept tables, by lower case name, see `keep_tables`
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def respond(self, pattern: str, columns: List[Tuple[str, str]],
+                rows: List[List[Any]]) -> None:
+        """Answer sql that matches `pattern` with `rows`, instead of a generated result."""
+        self.responses.append((re.compile(pattern, re.IGNORECASE | re.DOTALL), columns, rows))
+
+    def fail(self, pattern: str, error: str) -> None:
+        """Fail the statements whose code matches `pattern`, with `error` as its evalue."""
+        self.failures.append((re.compile(pattern, re.IGNORECASE | re.DOTALL), error))
+
+    def codes(self) -> List[str]:
+        """The code of all statements, in the order they were submitted per session."""
+        return [statement.code for session in self.sessions.values()
+                for statement in session.statements.values()]
+
+    def count(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def create_session(self, name: str, conf: Optional[Dict[str, str]] = None) -> FakeSession:
+        with self._lock:
+            session = FakeSession(len(self.sessions) + 1, name, time.monotonic(), conf=conf)
+            self.sessions[session.id] = session
+            return session
+
+    def running(self) -> int:
+        """The number of statements that were neither cancelled nor completed."""
+        with self._lock:
+            return sum(1 for session in self.sessions.values()
+                       for statement in session.statements.values()
+                       if not statement.cancelled and statement.output is None)
+
+    def session_response(self, session: FakeSession) -> ExtendedLivySessionResponse:
+        return ExtendedLivySessionResponse(
+            id=session.id, name=session.name, state=session.state(self.settings))
+
+    def submit(self, session_id: int, code: str, kind: str) -> FakeStatement:
+        session = self.sessions[session_id]
+        with self._lock:
+            statement = FakeStatement(len(session.statements), code, kind, time.monotonic())
+            session.statements[statement.id] = statement
+            return statement
+
+    def statement_response(self, session_id: int,
+                           statement_id: int) -> Tuple[LivyStatementResponseBody, Dict[str, Any]]:
+        statement = self.sessions[session_id].statements[statement_id]
+        elapsed = time.monotonic() - statement.submitted
+        # the statement starts running as soon as it is submitted
+        body: Dict[str, Any] = {'id': statement.id, 'started': statement.submitted_at,
+                                'completed': 0}
+        if statement.cancelled:
+            return LivyStatementResponseBody(id=statement.id, code=statement.code,
+                                             state='cancelled'), body
+        if elapsed < self.settings.statement_duration:
+            body['progress'] = elapsed / self.settings.statement_duration
+            return LivyStatementResponseBody(id=statement.id, code=statement.code,
+                                             state='running'), body
+        body['progress'] = 1.0
+        body['completed'] = statement.submitted_at + int(self.settings.statement_duration * 1000)
+        for pattern, error in self.failures:
+            if pattern.search(statement.code):
+                return LivyStatementResponseBody(
+                    id=statement.id, code=statement.code, state='available',
+                    output=LivyStatementOutput(status='error', execution_count=statement.id,
+                                               ename='Exception', evalue=error)), body
+        if statement.output is None:
+            statement.output = self.run(statement.code, statement.kind)
+        return LivyStatementResponseBody(
+            id=statement.id, code=statement.code, state='available',
+            output=LivyStatementOutput(status='ok', execution_count=statement.id,
+                                       data=statement.output)), body
+
+    # The results of the statements
+
+    def run(self, code: str, kind: str) -> Dict[str, Any]:
+        if kind == 'sql':
+            return {'application/json': self.run_sql(code)}
+        if '_dbt_relations' in code:
+            return {'text/plain': self.list_relations(code)}
+        if '_dbt_stream_sql' in code:
+            return {'text/plain': self.stream(code)}
+        if '_dbt_results' in code:
+            statements = json.loads(ast.literal_eval(
+                re.search(r"json\.loads\((.*)\):\n", code).group(1)))
+            return {'text/plain': json.dumps([self.run_sql(sql) for sql in statements])}
+        if '_dbt_column_types' in code and self.settings.keep_tables:
+            self.insert_seed(code)
+        return {'text/plain': ''}
+
+    def run_sql(self, sql: str) -> Dict[str, Any]:
+        for pattern, columns, rows in self.responses:
+            if pattern.search(sql):
+                return self.result(columns, rows)
+        if self.settings.keep_tables:
+            match = CREATE_TABLE_REGEX.match(sql)
+            if match:
+                with self._lock:
+                    self.tables[match.group(1).lower()] = self.result(
+                        COLUMN_REGEX.findall(match.group(2)), [])
+                return self.result([], [])
+            match = SELECT_TABLE_REGEX.match(sql)
+            if match and match.group(1).lower() in self.tables:
+                return self.tables[match.group(1).lower()]
+        match = SPOOL_REGEX.search(sql)
+        if match:
+            result = self.spools[match.group(1)]
+            start, end = int(match.group(2)), int(match.group(3))
+            fields = result['schema']['fields'] + [
+                {'name': '__dbt_row_number', 'type': 'integer', 'nullable': False, 'metadata': {}}]
+            return {'schema': {'type': 'struct', 'fields': fields},
+                    'data': [row + [start + i + 1]
+                             for i, row in enumerate(result['data'][start:end])]}
+        match = DROP_SPOOL_REGEX.search(sql)
+        if match:
+            with self._lock:
+                self.spools.pop(match.group(1), None)
+            return self.result([], [])
+        match = SHOW_TABLES_REGEX.search(sql)
+        if match:
+            return self.result(
+                [('database', 'string'), ('tableName', 'string'),
+                 ('isTemporary', 'boolean'), ('information', 'string')],
+                [[schema, name, False, information]
+                 for schema, name, information in self.relations(match.group(1))])
+        if DETAIL_REGEX.match(sql):
+            return self.result(
+                [('format', 'string'), ('numFiles', 'long'), ('sizeInBytes', 'long')],
+                [['delta', self.settings.files_per_relation,
+                  self.settings.files_per_relation * self.settings.bytes_per_file]])
+        match = HISTORY_REGEX.match(sql)
+        if match:
+            operations = (self.settings.history_operations
+                          or ('WRITE',) * self.settings.writes_per_relation)
+            if match.group(1):
+                operations = operations[:int(match.group(1))]
+            return self.result(
+                [('version', 'long'), ('operation', 'string'), ('operationMetrics', MAP_TYPE)],
+                [[len(operations) - index, operation,
+                  {'numFiles': '1', 'numOutputRows': str(self.settings.result_rows)}]
+                 for index, operation in enumerate(operations)])
+        if DESCRIBE_REGEX.match(sql):
+            rows = [[f'column_{i}', self.column_type(i), None]
+                    for i in range(self.settings.columns_per_relation)]
+            rows += [['', '', ''], ['# Detailed Table Information', '', ''],
+                     ['Owner', 'dbt', ''], ['Statistics', '1024 bytes, 10 rows', '']]
+            return self.result(
+                [('col_name', 'string'), ('data_type', 'string'), ('comment', 'string')], rows)
+        match = SET_REGEX.match(sql)
+        if match:
+            # no conf is set before the adapter sets it
+            return self.result([('key', 'string'), ('value', 'string')],
+                               [[match.group(1), match.group(2) or '<undefined>']])
+        if QUERY_REGEX.match(sql):
+            columns = [(f'column_{i}', 'long' if i % 2 else 'string')
+                       for i in range(self.settings.result_columns)]
+            rows = [[row if i % 2 else f'value {row}' for i in range(len(columns))]
+                    for row in range(self.settings.result_rows)]
+            return self.result(columns, rows)
+        return self.result([], [])
+
+    @staticmethod
+    def result(columns: List[Tuple[str, Any]], rows: List[List[Any]]) -> Dict[str, Any]:
+        return {
+            'schema': {'type': 'struct', 'fields': [
+                {'name': name, 'type': dtype, 'nullable': True, 'metadata': {}}
+                for name, dtype in columns]},
+            'data': rows,
+        }
+
+    def column_type(self, index: int) -> str:
+        if index < len(self.settings.column_types):
+            return self.settings.column_types[index]
+        return 'bigint' if index % 2 else 'string'
+
+    def stream(self, code: str) -> str:
+        """The first chunk of a streamed statement, spooling the rest."""
+        sql = json.loads(ast.literal_eval(
+            re.search(r"_dbt_stream_sql = json\.loads\((.*)\)\n", code).group(1)))
+        view = ast.literal_eval(re.search(r"_dbt_stream_view = (.*)\n", code).group(1))
+        chunk_rows = int(re.search(r"_dbt_stream_chunk_rows = (\d+)\n", code).group(1))
+        chunk_bytes = ast.literal_eval(
+            re.search(r"_dbt_stream_chunk_bytes = (.*)\n", code).group(1))
+        result = self.run_sql(sql)
+        rows, size = [], 0
+        for row in result['data'][:chunk_rows]:
+            size += len(json.dumps(row))
+            if rows and chunk_bytes and size > chunk_bytes:
+                break
+            rows.append(row)
+        spooled = len(rows) < len(result['data']) or len(rows) == chunk_rows
+        if spooled:
+            with self._lock:
+                self.spools[view] = result
+        return json.dumps({'schema': result['schema'], 'data': rows, 'spooled': spooled})
+
+    def insert_seed(self, code: str) -> None:
+        """
+        Insert the rows of a seed into its kept table like `insertInto` does:
+        by position, cast to the types of the table, and a value that does not
+        cast is null. The rows are kept as the json of Livy sql statements.
+        """
+        column_types = ast.literal_eval(re.search(r"_dbt_column_types = (.*)\n", code).group(1))
+        payload = ast.literal_eval(re.search(r"b64decode\((.*?)\)\)", code).group(1))
+        relation = ast.literal_eval(re.search(r"insertInto\((.*)\)", code).group(1)).lower()
+        rows = json.loads(gzip.decompress(base64.b64decode(payload)).decode('utf-8'))
+        table = self.tables[relation]
+        types = [field['type'] for field in table['schema']['fields']]
+        assert len(types) == len(column_types), f'{relation} has {len(types)} columns'
+        cast = [[spark_cast(spark_cast(value, source), target)
+                 for value, source, target in zip(row, column_types, types)] for row in rows]
+        encoded = json.dumps(cast, default=RESULT_NAMESPACE['_dbt_json_value'])
+        with self._lock:
+            table['data'].extend(json.loads(encoded))
+
+    def relations(self, schema: str) -> List[Tuple[str, str, str]]:
+        # the schema tree of spark calls bigint long
+        schema_tree = ''.join(
+            f" |-- column_{i}: {self.column_type(i).replace('bigint', 'long')} (nullable = true)\n"
+            for i in range(self.settings.columns_per_relation))
+        return [
+            (schema, f'table_{i}',
+             f"Database: {schema}\nTable: table_{i}\nOwner: dbt\nType: MANAGED\n"
+             f"Provider: delta\nLocation: abfss://fake/{schema}/table_{i}\n"
+             f"Statistics: 1024 bytes, 10 rows\nSchema: root\n{schema_tree}")
+            for i in range(self.settings.relations_per_schema)
+        ]
+
+    def list_relations(self, code: str) -> str:
+        known = ast.literal_eval(re.search(r"_dbt_known = (.*)\n", code).group(1))
+        schemas = ast.literal_eval(re.search(r"for _dbt_schema in (.*):\n", code).group(1))
+        listed = {}
+        for schema in schemas:
+            listed[schema] = [
+                [s, name, None if known.get(f'{s}.{name}'.lower()) == change_token(information)
+                 else information]
+                for s, name, information in self.relations(schema)]
+        return json.dumps(listed)
+
+
+# `_dbt_json_value`, which encodes values like Livy sql statements.
+RESULT_NAMESPACE: Dict[str, Any] = {}
+exec(synapse_spark.RESULT_CODE, RESULT_NAMESPACE)
+
+
+def spark_cast(value: Any, spark_type: str) -> Any:
+    """Cast a value like spark casts a string, or a value of another type, to `spark_type`."""
+    if value is None:
+        return None
+    try:
+        if spark_type in ('tinyint', 'smallint', 'int', 'integer', 'bigint'):
+            return int(value)
+        if spark_type in ('float', 'double'):
+            return float(value)
+        if spark_type.startswith('decimal'):
+            scale = int(re.search(r",\s*(\d+)\)", spark_type).group(1))
+            return decimal.Decimal(str(value)).quantize(decimal.Decimal(1).scaleb(-scale))
+        if spark_type == 'date':
+            return datetime.date.fromisoformat(str(value)[:10])
+        if spark_type == 'timestamp':
+            return datetime.datetime.fromisoformat(str(value)).replace(tzinfo=datetime.timezone.utc)
+        if spark_type == 'boolean':
+            return {'true': True, 'false': False}[str(value).lower()]
+    except (ValueError, KeyError, decimal.InvalidOperation):
+        return None
+    return str(value)
+
+
+class _PipelineResponse:
+    """What the `cls` hook of an operation gets to see of the http response."""
+
+    def __init__(self, body: Dict[str, Any]):
+        self.http_response = self
+        self._body = body
+
+    def json(self) -> Dict[str, Any]:
+        return self._body
+
+
+class FakeSparkSessionOperations:
+    """The sync session operations the adapter uses to find and start sessions."""
+
+    def __init__(self, livy: FakeLivy):
+        self.livy = livy
+
+    def _call(self, operation: str) -> None:
+        self.livy.count(operation)
+        time.sleep(self.livy.settings.request_latency)
+
+    def list(self, workspace_name, spark_pool_name, from_parameter=None, size=None,
+             detailed=None, **kwargs) -> ExtendedLivyListSessionResponse:
+        self._call('list')
+        sessions = list(self.livy.sessions.values())
+        page = sessions[from_parameter or 0:(from_parameter or 0) + (size or 20)]
+        return ExtendedLivyListSessionResponse(
+            from_property=from_parameter, total=len(sessions),
+            sessions=[self.livy.session_response(session) for session in page])
+
+    def create(self, workspace_name, spark_pool_name, livy_request, **kwargs):
+        self._call('create')
+        return self.livy.session_response(self.livy.create_session(livy_request.name, livy_request.conf))
+
+    def get(self, workspace_name, spark_pool_name, session_id, **kwargs):
+        self._call('get')
+        if session_id not in self.livy.sessions:
+            raise HttpResponseError(message=f"Session {session_id} not found")
+        return self.livy.session_response(self.livy.sessions[session_id])
+
+    def delete(self, workspace_name, spark_pool_name, session_id, **kwargs):
+        self._call('delete')
+        self.livy.sessions[session_id].deleted = True
+
+
+class FakeAsyncSparkSessionOperations:
+    """The async session operations of the statement engine."""
+
+    def __init__(self, livy: FakeLivy):
+        self.livy = livy
+
+    async def _call(self, operation: str) -> None:
+        self.livy.count(operation)
+        await asyncio.sleep(self.livy.settings.request_latency)
+
+    async def get(self, workspace_name, spark_pool_name, session_id, **kwargs):
+        await self._call('get')
+        return self.livy.session_response(self.livy.sessions[session_id])
+
+    async def create_statement(self, workspace_name, spark_pool_name, session_id,
+                               livy_statement_request, **kwargs):
+        await self._call('create_statement')
+        statement = self.livy.submit(session_id, livy_statement_request.code,
+                                     livy_statement_request.kind)
+        return LivyStatementResponseBody(id=statement.id, code=statement.code, state='waiting')
+
+    async def get_statement(self, workspace_name, spark_pool_name, session_id, statement_id,
+                            cls=None, **kwargs):
+        await self._call('get_statement')
+        response, body = self.livy.statement_response(session_id, statement_id)
+        return cls(_PipelineResponse(body), response, {}) if cls else response
+
+    async def delete_statement(self, workspace_name, spark_pool_name, session_id,
+                               statement_id, **kwargs):
+        await self._call('delete_statement')
+        self.livy.sessions[session_id].statements[statement_id].cancelled = True
+
+
+class FakeSynapseClient:
+    """Replaces the sync `SynapseClient`, `livy` is set by the fixture."""
+    livy: Optional[FakeLivy] = None
+
+    def __init__(self, credential=None, **kwargs):
+        self.spark_session = FakeSparkSessionOperations(self.livy)
+
+
+class FakeAsyncSynapseClient:
+    """Replaces the async `SynapseClient`, `livy` is set by the fixture."""
+    livy: Optional[FakeLivy] = None
+
+    def __init__(self, credential=None, **kwargs):
+        self.spark_session = FakeAsyncSparkSessionOperations(self.livy)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeCredential:
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+# The fixtures of the tests against the fake, a conftest imports them.
+
+@pytest.fixture(scope="class")
+def fake_livy_settings():
+    return FakeLivySettings()
+
+
+@pytest.fixture(scope="class")
+def fake_livy(fake_livy_settings):
+    livy = FakeLivy(fake_livy_settings)
+    FakeSynapseClient.livy = livy
+    FakeAsyncSynapseClient.livy = livy
+    with mock.patch.multiple(
+        synapse_spark,
+        SynapseClient=FakeSynapseClient,
+        AzureCliCredential=FakeCredential,
+        DefaultAzureCredential=FakeCredential,
+    ), mock.patch.multiple(
+        statement_engine,
+        SynapseClient=FakeAsyncSynapseClient,
+        AzureCliCredential=FakeCredential,
+        DefaultAzureCredential=FakeCredential,
+    ):
+        LivySessionPool.POOLS.clear()
+        yield livy
+        for pool in LivySessionPool.POOLS.values():
+            pool.factory.statement_engine.close()
+        LivySessionPool.POOLS.clear()
+
+
+@pytest.fixture(scope="class")
+def profile_options():
+    """Extra keys of the target, for a test class to override."""
+    return {}
+
+
+@pytest.fixture(scope="class")
+def dbt_profile_target(fake_livy, profile_options, tmp_path_factory):
+    target = {
+        "type": "synapsespark",
+        "threads": 4,
+        "workspace": "fake_workspace",
+        "authentication": "AzureCliCredential",
+        "user": "tester",
+        "spark_pool": "fake_pool",
+        "cluster_configuration": dict(CLUSTER_CONFIGURATION),
+        "poll_interval": 0.05,
+        "poll_initial_interval": 0.005,
+        "session_registry_path": str(tmp_path_factory.mktemp("registry") / "sessions.json"),
+    }
+    target.update(profile_options)
+    return target
+
+
+# `schema` is not part of the `target` of this adapter, so the schema of the
+# models is set with a var.
+GENERATE_SCHEMA_NAME_SQL = """
+{% macro generate_schema_name(custom_schema_name, node) -%}
+  {{ var('test_schema') }}
+{%- endmacro %}
+"""
+
+
+class ModelsInTestSchema:
+    """Builds the models of a test class in the schema the fake lists relations for."""
+
+    @pytest.fixture(scope="class")
+    def macros(self):
+        return {"generate_schema_name.sql": GENERATE_SCHEMA_NAME_SQL}
+
+    @pytest.fixture(scope="class")
+    def project_config_update(self, unique_schema):
+        return {"vars": {"test_schema": unique_schema}}
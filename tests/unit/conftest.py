@@ -0,0 +1,6 @@
+from tests.fake_livy import (  # noqa: F401
+    dbt_profile_target,
+    fake_livy,
+    fake_livy_settings,
+    profile_options,
+)
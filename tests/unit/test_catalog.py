@@ -0,0 +1,55 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+from dbt.tests.util import run_dbt
+
+from dbt.adapters.synapsespark import impl, relation
+from tests.fake_livy import DESCRIBE_REGEX, FakeLivySettings, ModelsInTestSchema
+
+models__view_sql = """
+{{ config(materialized='view') }}
+select 1 as id
+"""
+
+
+class TestCatalogCache(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=3, columns_per_relation=4)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"catalog_cache": True}
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        # the fake lists table_0 to table_2 in the schema of the models
+        return {"table_0.sql": models__view_sql}
+
+    def read_catalog(self, project):
+        with open(os.path.join(project.project_root, "target", "catalog.json")) as catalog:
+            return json.load(catalog)["nodes"]
+
+    def describes(self, fake_livy):
+        return sum(1 for code in fake_livy.codes() if DESCRIBE_REGEX.match(code))
+
+    @pytest.mark.parametrize("args", [[], ["--no-compile"]])
+    def test_unchanged_relations_reused(self, project, fake_livy, args):
+        run_dbt(["docs", "generate"])
+        catalog = self.read_catalog(project)
+        assert len(catalog["model.test.table_0"]["columns"]) == 4
+        describes = self.describes(fake_livy)
+
+        with mock.patch.object(impl, "parse_relation_information",
+                               wraps=impl.parse_relation_information) as impl_parse, \
+                mock.patch.object(relation, "parse_relation_information",
+                                  wraps=relation.parse_relation_information) as relation_parse:
+            run_dbt(["docs", "generate", *args])
+
+        # the relations of the fake did not change, nothing is described or
+        # parsed again, with or without compiling first
+        assert impl_parse.call_count == relation_parse.call_count == 0
+        assert self.describes(fake_livy) == describes
+        assert self.read_catalog(project) == catalog
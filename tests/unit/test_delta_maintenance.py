@@ -0,0 +1,77 @@
+import pytest
+
+from dbt.adapters.synapsespark.delta_maintenance import (
+    OTHER_OPERATIONS_IN_HISTORY,
+    DeltaMaintenance,
+)
+from tests.fake_livy import FakeLivySettings
+
+
+class TestDeltaMaintenance:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(files_per_relation=200, writes_per_relation=3)
+
+    def maintenance_sqls(self, fake_livy):
+        return [statement.code for session in fake_livy.sessions.values()
+                for statement in session.statements.values()
+                if "optimize" in statement.code or "vacuum" in statement.code]
+
+    def test_maintain_fragmented(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="fragmented")
+
+        def run():
+            with project.adapter.connection_named("test"):
+                project.adapter.maintain_delta_relation(
+                    relation, zorder_by="id", vacuum_retention_hours=168)
+
+        for _ in range(3):
+
+            run()
+        # 200 files of 1 kB: optimized and vacuumed in one round trip, every time
+        assert len(self.maintenance_sqls(fake_livy)) == 3
+
+    def test_maintain_every_n_runs(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="runs")
+        sqls = len(self.maintenance_sqls(fake_livy))
+        with project.adapter.connection_named("test"):
+            # not fragmented, and 3 writes since the last optimize
+            project.adapter.maintain_delta_relation(relation, optimize=True, min_files=1000,
+                                                    every_n_runs=5)
+            assert len(self.maintenance_sqls(fake_livy)) == sqls
+            project.adapter.maintain_delta_relation(relation, optimize=True, min_files=1000,
+                                                    every_n_runs=3)
+        assert len(self.maintenance_sqls(fake_livy)) == sqls + 1
+
+
+class TestMaintenanceHistory:
+    # newest first: two writes since the last optimize, with the vacuum after
+    # it and a change of the table properties in between
+    history = ("MERGE", "SET TBLPROPERTIES", "CREATE OR REPLACE TABLE AS SELECT",
+               "VACUUM END", "VACUUM START", "OPTIMIZE", "WRITE", "WRITE")
+
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(history_operations=self.history)
+
+    @pytest.mark.parametrize("every_n_runs, due", [(2, True), (3, False)])
+    def test_only_writes_count(self, every_n_runs, due):
+        maintenance = DeltaMaintenance.from_config(optimize=True, every_n_runs=every_n_runs)
+        reason = maintenance.due({"numFiles": 1, "sizeInBytes": 1024}, self.history)
+        assert reason == ("2 writes since the last optimize" if due else None)
+
+    def test_history_without_optimize(self):
+        maintenance = DeltaMaintenance.from_config(optimize=True, every_n_runs=3)
+        assert maintenance.due({}, ("VACUUM END", "VACUUM START", "WRITE", "UPDATE")) is None
+        assert maintenance.due({}, ("DELETE", "WRITE", "STREAMING UPDATE")) is not None
+
+    def test_maintain_every_n_runs(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="mixed")
+        with project.adapter.connection_named("test"):
+            project.adapter.maintain_delta_relation(relation, optimize=True, every_n_runs=3)
+            assert not any("optimize " in code for code in fake_livy.codes())
+            project.adapter.maintain_delta_relation(relation, optimize=True, every_n_runs=2)
+        assert [code for code in fake_livy.codes() if "optimize " in code] == [f"optimize {relation}"]
+        # the history has room for the operations that are not writes
+        limit = 3 + OTHER_OPERATIONS_IN_HISTORY
+        assert any(f"describe history {relation} limit {limit}" in code for code in fake_livy.codes())
@@ -0,0 +1,143 @@
+import json
+import re
+
+import pytest
+from dbt.tests.util import run_dbt
+
+from tests.fake_livy import FakeLivySettings, ModelsInTestSchema
+
+
+models__merge_sql = """
+{{{{ config(
+    materialized='incremental',
+    file_format='delta',
+    incremental_strategy='merge',
+    unique_key='column_0',
+    partition_by='column_1',
+    merge_partition_pruning='{mode}',
+) }}}}
+select * from fake
+"""
+
+
+class TestMergePartitionPruning(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        # table_0 and table_1 exist, as delta tables
+        return FakeLivySettings(relations_per_schema=2)
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {
+            "table_0.sql": models__merge_sql.format(mode="range"),
+            "table_1.sql": models__merge_sql.format(mode="values"),
+        }
+
+    def merges(self, fake_livy, table):
+        return [code for code in fake_livy.codes()
+                if re.search(rf"merge into \S*{table}\b", code)]
+
+    def test_merge_predicates(self, project, fake_livy):
+        bounds = [("min", "string"), ("max", "string"), ("has_nulls", "integer"),
+                  ("values", "string")]
+        # the values of column_1 in the new rows, one of them null
+        fake_livy.respond(r"collect_set\(cast\(column_1", bounds, [["3", "7", 1, '["3","5","7"]']])
+        fake_livy.respond(r"cast\(min\(column_1\)", bounds, [["3", "7", 0, None]])
+
+        for _ in range(3):
+
+            results = run_dbt(["run"])
+        assert len(results) == 2
+        range_merges = self.merges(fake_livy, "table_0")
+        values_merges = self.merges(fake_livy, "table_1")
+        assert len(range_merges) == len(values_merges) == 3
+        assert ("(DBT_INTERNAL_DEST.column_1 between cast('3' as bigint) and cast('7' as bigint))"
+                in range_merges[-1])
+        assert ("(DBT_INTERNAL_DEST.column_1 in (cast('3' as bigint), cast('5' as bigint), "
+                "cast('7' as bigint)) or DBT_INTERNAL_DEST.column_1 is null)" in values_merges[-1])
+        # the pruning is joined to the unique key, not instead of it
+        for merge in (range_merges[-1], values_merges[-1]):
+            assert re.search(r"DBT_INTERNAL_SOURCE\.column_0 = DBT_INTERNAL_DEST\.column_0\s+and \(",
+                             merge)
+
+
+models__replace_where_sql = """
+{{ config(
+    materialized='incremental',
+    file_format='delta',
+    incremental_strategy='replace_where',
+    partition_by=['column_0', 'column_1', 'column_2'],
+) }}
+select * from fake
+"""
+
+
+class TestReplaceWhere(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=1, column_types=("string", "bigint", "date"))
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {"table_0.sql": models__replace_where_sql}
+
+    def test_replace_where_predicate(self, project, fake_livy):
+        fake_livy.respond(
+            r"select distinct\s+cast\(column_0",
+            [("column_0", "string"), ("column_1", "string"), ("column_2", "string")],
+            [["it's", "42", "2024-01-31"], ["b", "7", None]])
+
+        for _ in range(3):
+
+            results = run_dbt(["run"])
+        assert len(results) == 1
+        writes = [code for code in fake_livy.codes() if "replaceWhere" in code]
+        assert len(writes) == 3
+        predicate = json.loads(re.search(r'\.option\("replaceWhere", (".*")\)', writes[-1]).group(1))
+        # exactly the partitions of the new rows, with literals of the type of each column
+        assert predicate == (
+            "(column_0 = cast('it\\'s' as string) and column_1 = cast('42' as bigint)"
+            " and column_2 = cast('2024-01-31' as date))"
+            " or (column_0 = cast('b' as string) and column_1 = cast('7' as bigint)"
+            " and column_2 is null)")
+        # the sql model runs as pyspark, with the query comment of dbt
+        assert writes[-1].startswith("# ")
+        assert "model.test.table_0" in writes[-1].split("\n(spark.table", 1)[0]
+
+
+# get_merge_sql without dest_columns, like a custom materialization calls it
+models__merge_sql_macro_sql = """
+{{{{ config(materialized='view'{config}) }}}}
+{{% if execute %}}
+  {{% do run_query(get_merge_sql(this, this, 'column_0', none)) %}}
+{{% endif %}}
+select 1 as id
+"""
+
+
+class TestMergeColumns(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=2, columns_per_relation=3)
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {
+            "table_0.sql": models__merge_sql_macro_sql.format(config=""),
+            "table_1.sql": models__merge_sql_macro_sql.format(
+                config=", merge_exclude_columns=['column_1']"),
+        }
+
+    def update_columns(self, fake_livy, table):
+        merge = [code for code in fake_livy.codes()
+                 if re.search(rf"merge into \S*{table}\b", code)][-1]
+        return [column.strip("`") for column in
+                re.findall(r"(`?\w+`?) = DBT_INTERNAL_SOURCE\.\1", merge)]
+
+    def test_merge_without_dest_columns(self, project, fake_livy):
+        for _ in range(3):
+            results = run_dbt(["run"])
+        assert len(results) == 2
+        # the columns of the target, from the relation listing
+        assert self.update_columns(fake_livy, "table_0") == ["column_0", "column_1", "column_2"]
+        assert self.update_columns(fake_livy, "table_1") == ["column_0", "column_2"]
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from dbt.adapters.synapsespark import statement_engine
+from dbt.adapters.synapsespark.statement_engine import LivyStatementEngine, PollPolicy
+
+
+class TestPollPolicy:
+    def test_defaults(self):
+        policy = PollPolicy()
+        assert policy.delay(0, 0) == 0.05
+        assert policy.delay(1, 0) == 0.1
+        assert policy.delay(10, 0) == 1
+
+    def test_backoff_up_to_max_interval(self):
+        policy = PollPolicy(initial_interval=0.1, max_interval=2, backoff=3)
+        assert [policy.delay(attempt, 0) for attempt in range(5)] == pytest.approx(
+            [0.1, 0.3, 0.9, 2, 2])
+
+    def test_no_backoff(self):
+        policy = PollPolicy(initial_interval=0.5, max_interval=5, backoff=1)
+        assert {policy.delay(attempt, 10) for attempt in range(100)} == {0.5}
+
+    def test_overflow(self):
+        # a long statement, polled over a thousand times
+        assert PollPolicy(max_interval=3).delay(5000, 3600) == 3
+
+    def test_progress_predicts_completion(self):
+        policy = PollPolicy(initial_interval=0.1, max_interval=10, backoff=2)
+        # 8 seconds for 80%, done in about 2 more seconds
+        assert policy.delay(10, 8, 0.8) == pytest.approx(2)
+        # the prediction is longer than the backoff delay
+        assert policy.delay(2, 8, 0.2) == pytest.approx(0.4)
+        # never below the initial interval
+        assert policy.delay(10, 0.5, 0.99) == 0.1
+
+    @pytest.mark.parametrize("progress, elapsed", [(None, 8), (0, 8), (1, 8), (0.5, 0)])
+    def test_progress_unknown(self, progress, elapsed):
+        policy = PollPolicy(initial_interval=0.1, max_interval=10, backoff=2)
+        assert policy.delay(3, elapsed, progress) == pytest.approx(0.8)
+
+
+class TestStatementPolling:
+    def test_poll_sleeps_by_policy(self):
+        states = [("waiting", None), ("running", 0.25), ("running", 0.6), ("available", 1)]
+        engine = LivyStatementEngine("fake_workspace", "fake_pool", "AzureCliCredential")
+        engine.get_statement = mock.AsyncMock(side_effect=[
+            SimpleNamespace(state=state, progress=progress) for state, progress in states])
+        clock = iter(range(0, 100, 4))
+        sleeps = []
+
+        async def sleep(delay):
+            sleeps.append(delay)
+
+        # the clock and sleep of the engine only, not of the event loop
+        with mock.patch.object(statement_engine, "time", SimpleNamespace(
+                    monotonic=lambda: next(clock), time=time.time)), \
+                mock.patch.object(statement_engine, "asyncio", SimpleNamespace(sleep=sleep)):
+            result = asyncio.run(engine._poll(1, 2, PollPolicy(
+                initial_interval=1, max_interval=30, backoff=3)))
+
+        assert result.state == "available"
+        # 1 then 3 by backoff, then 12 seconds at 60% predict 8 more, not 9
+        assert sleeps == pytest.approx([1, 3, 8])
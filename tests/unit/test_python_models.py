@@ -0,0 +1,59 @@
+import pytest
+from dbt.exceptions import RuntimeException
+from dbt.tests.util import run_dbt
+
+from dbt.adapters.synapsespark.python_submissions import LivySessionPythonJobHelper
+from tests.fake_livy import FakeLivySettings, ModelsInTestSchema
+
+models__python_model_py = """
+def model(dbt, spark):
+    dbt.config(materialized='table')
+    return spark.createDataFrame([[1, 'a']], ['id', 'name'])
+"""
+
+# dbt only parses a model that returns a dataframe
+models__broken_py = """
+def model(dbt, spark):
+    dbt.config(materialized='table')
+    if spark:
+        raise ValueError('the model is broken')
+    return spark.createDataFrame([[1]], ['id'])
+"""
+
+
+class TestPythonModels(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=0)
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {"python_model.py": models__python_model_py, "broken.py": models__broken_py}
+
+    def statements(self, fake_livy, text):
+        return [(session, statement) for session in fake_livy.sessions.values()
+                for statement in session.statements.values() if text in statement.code]
+
+    def test_model_on_pooled_session(self, project, fake_livy):
+        results = run_dbt(["run", "--select", "python_model"])
+        assert len(results) == 1
+        ((session, statement),) = self.statements(fake_livy, "def model(dbt, spark)")
+        # a pyspark statement on the session of the pool, no spark job of its own
+        assert statement.kind == "pyspark"
+        assert session.name == "dbt-tester-0"
+        assert len(fake_livy.sessions) == 1
+        assert (f'.saveAsTable("{project.test_schema}.python_model")'
+                in statement.code.replace("`", ""))
+        assert statement.code.startswith("# ")
+
+    def test_failure_is_runtime_error(self, project, fake_livy):
+        fake_livy.fail(r"the model is broken", "ValueError: the model is broken")
+        results = run_dbt(["run", "--select", "broken"], expect_pass=False)
+        assert results[0].status == "error"
+        assert "the model is broken" in results[0].message
+
+        helper = LivySessionPythonJobHelper(
+            {}, project.adapter.config.credentials, project.adapter.connections)
+        with project.adapter.connection_named("test"):
+            with pytest.raises(RuntimeException, match="the model is broken"):
+                helper.submit(models__broken_py)
@@ -0,0 +1,44 @@
+import pytest
+from dbt.tests.util import run_dbt
+
+from tests.fake_livy import FakeLivySettings, ModelsInTestSchema
+
+models__delta_table_sql = """
+{{ config(materialized='table', file_format='delta') }}
+select * from fake
+"""
+
+
+class TestAdapterResponse(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=0, result_rows=42)
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {"counted.sql": models__delta_table_sql}
+
+    def test_statement_response(self, project, fake_livy):
+        fake_livy.respond(r"merge into", [("num_affected_rows", "long"), ("num_inserted_rows", "long")],
+                          [[7, 3]])
+        with project.adapter.connection_named("test"):
+            response, _ = project.adapter.execute("merge into target using source on false")
+        assert response.rows_affected == 7
+        assert response.session_id is not None and response.statement_id is not None
+        assert response.submitted_at and response.started_at
+        assert response.started_at <= response.completed_at
+
+    def test_rows_affected_unknown(self, project, fake_livy):
+        with project.adapter.connection_named("test"):
+            response, _ = project.adapter.execute("insert into target select * from fake")
+        # not 0, which would read as nothing written
+        assert response.rows_affected is None
+
+    def test_delta_history_rows(self, project, fake_livy):
+        results = run_dbt(["run"])
+        response = results[0].adapter_response
+        # create or replace table returns no rows, the count is from the history
+        assert response["rows_affected"] == 42
+        assert all(response[key] for key in ("submitted_at", "started_at", "completed_at"))
+        history = [code for code in fake_livy.codes() if "describe history" in code]
+        assert len(history) == 1 and history[0].endswith("limit 1")
@@ -0,0 +1,106 @@
+import datetime
+import decimal
+import json
+import re
+
+import pytest
+
+from dbt.adapters.synapsespark.result_set import LivyResultSet
+from dbt.adapters.synapsespark.synapse_spark import RESULT_CODE
+from tests.fake_livy import FakeLivySettings
+
+
+class TestBatchResults:
+    fields = [
+        {"name": "amount", "type": "decimal(10,2)", "nullable": True, "metadata": {}},
+        {"name": "day", "type": "date", "nullable": True, "metadata": {}},
+        {"name": "at", "type": "timestamp", "nullable": True, "metadata": {}},
+    ]
+
+    def test_types_like_sql_statements(self):
+        namespace: dict = {}
+        exec(RESULT_CODE, namespace)
+        row = [decimal.Decimal("1.50"), datetime.date(2024, 1, 31),
+               datetime.datetime(2024, 1, 31, 10, 30, tzinfo=datetime.timezone.utc)]
+        # what the pyspark batch prints for a row, and Livy's sql json of it
+        batch = json.loads(json.dumps([row], default=namespace["_dbt_json_value"]))
+        sql = [[1.5, "2024-01-31T00:00:00.000Z", "2024-01-31T10:30:00.000Z"]]
+        assert batch[0][0] == 1.5
+        assert batch[0][2] == sql[0][2]
+        assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:00\.000Z", batch[0][1])
+
+        def column_types(data):
+            table = LivyResultSet.from_json({"schema": {"fields": self.fields}, "data": data})
+            return [type(column_type) for column_type in table.to_agate_table().column_types]
+
+        assert column_types(batch) == column_types(sql)
+
+
+class TestFetch:
+    fields = [
+        {"name": "id", "type": "long", "nullable": False, "metadata": {}},
+        {"name": "name", "type": "string", "nullable": True, "metadata": {}},
+        {"name": "ratio", "type": "double", "nullable": True, "metadata": {}},
+    ]
+    data = [[1, "a", 0.5], [2, None, None], [3, "c", 1.5], [4, "d", 2.0], [5, "e", 2.5]]
+
+    def result_set(self):
+        return LivyResultSet.from_json({"schema": {"fields": self.fields}, "data": self.data})
+
+    def test_fetchone(self):
+        result_set = self.result_set()
+        assert [result_set.fetchone() for _ in range(5)] == [tuple(row) for row in self.data]
+        # exhausted, and stays exhausted
+        assert result_set.fetchone() is None
+        assert result_set.fetchone() is None
+        assert result_set.fetchmany(3) == [] and result_set.fetchall() == []
+
+    def test_fetchmany(self):
+        result_set = self.result_set()
+        assert result_set.fetchmany(2) == [(1, "a", 0.5), (2, None, None)]
+        assert result_set.fetchone() == (3, "c", 1.5)
+        # fewer rows than asked for at the end
+        assert result_set.fetchmany(10) == [(4, "d", 2.0), (5, "e", 2.5)]
+        assert result_set.fetchmany(10) == []
+        assert result_set.fetchone() is None
+
+    def test_fetchall_and_iteration(self):
+        result_set = self.result_set()
+        result_set.fetchone()
+        assert list(result_set) == [tuple(row) for row in self.data[1:]]
+        assert list(result_set) == [] and result_set.fetchall() == []
+        assert len(result_set) == 5
+
+    def test_empty(self):
+        for result_set in (LivyResultSet.from_json({}),
+                           LivyResultSet.from_json({"schema": {"fields": self.fields}, "data": []})):
+            assert result_set.fetchone() is None
+            assert result_set.fetchmany(5) == [] and result_set.fetchall() == []
+            assert list(result_set) == []
+
+
+class TestCursorFetch:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=0)
+
+    def test_cursor(self, project, fake_livy):
+        fake_livy.respond(r"from numbers\b", [("id", "long"), ("name", "string")],
+                          [[i, None if i % 2 else f"n{i}"] for i in range(5)])
+        fake_livy.respond(r"from other\b", [("id", "long")], [[10]])
+        with project.adapter.connection_named("test"):
+            cursor = project.adapter.connections.get_thread_connection().handle.cursor()
+            cursor.execute("select * from numbers")
+            assert [column[0] for column in cursor.description] == ["id", "name"]
+            assert cursor.fetchone() == (0, "n0")
+            assert cursor.fetchmany(2) == [(1, None), (2, "n2")]
+            assert cursor.fetchmany() == [(3, None), (4, "n4")]
+            assert cursor.fetchone() is None
+            assert cursor.fetchmany(1) == [] and cursor.fetchall() == []
+
+            # a new statement replaces the rows that were not fetched
+            cursor.execute("select * from numbers")
+            cursor.fetchone()
+            cursor.execute("select * from other")
+            assert cursor.fetchall() == [(10,)]
+            assert cursor.fetchone() is None
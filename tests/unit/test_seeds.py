@@ -0,0 +1,58 @@
+import datetime
+import decimal
+
+import pytest
+from dbt.tests.util import run_dbt
+
+from tests.fake_livy import RESULT_NAMESPACE, FakeLivySettings, ModelsInTestSchema
+
+json_value = RESULT_NAMESPACE["_dbt_json_value"]
+
+# the columns of the types seeds infer and of column_types, with nulls
+seeds__typed_csv = """id,day,amount,name,ratio
+1,2024-01-31,1.5,alpha,0.25
+2,,100,,
+3,2024-02-29,0.000001,gamma,1E-7
+"""
+
+
+class TestTypedSeed(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(keep_tables=True)
+
+    @pytest.fixture(scope="class")
+    def seeds(self):
+        return {"typed.csv": seeds__typed_csv}
+
+    @pytest.fixture(scope="class")
+    def project_config_update(self, unique_schema):
+        # listed in another order than the columns of the seed
+        column_types = {"ratio": "double", "amount": "decimal(10,2)", "id": "int"}
+        return {
+            "vars": {"test_schema": unique_schema},
+            "seeds": {"test": {"typed": {"+column_types": column_types}}},
+        }
+
+    def test_seed_round_trip(self, project, fake_livy):
+        results = run_dbt(["seed"])
+        assert len(results) == 1
+        relation = f"{project.test_schema}.typed"
+        table = fake_livy.tables[relation.lower()]
+        assert [(field["name"], field["type"]) for field in table["schema"]["fields"]] == [
+            ("id", "int"), ("day", "date"), ("amount", "decimal(10,2)"),
+            ("name", "string"), ("ratio", "double")]
+
+        with project.adapter.connection_named("test"):
+            _, rows = project.adapter.execute(f"select * from {relation}", fetch=True)
+        assert rows.column_names == ("id", "day", "amount", "name", "ratio")
+        # every value is in its own column, with the type of the table
+        assert [row[0] for row in rows.rows] == [1, 2, 3]
+        # dates come back like Livy sql statements return them
+        assert [row[1] for row in rows.rows] == [
+            json_value(datetime.date(2024, 1, 31)), None, json_value(datetime.date(2024, 2, 29))]
+        assert [row[2] for row in rows.rows] == [
+            decimal.Decimal("1.5"), decimal.Decimal("100"), decimal.Decimal("0")]
+        assert [row[3] for row in rows.rows] == ["alpha", None, "gamma"]
+        assert [row[4] for row in rows.rows] == [
+            decimal.Decimal("0.25"), None, decimal.Decimal("1E-7")]
@@ -0,0 +1,79 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from dbt.adapters.synapsespark.statement_engine import PollPolicy
+from dbt.adapters.synapsespark.synapse_spark import LivySessionFactory, LivySessionRegistry
+
+from tests.fake_livy import CLUSTER_CONFIGURATION
+
+
+class TestSessionRegistry:
+    def connect(self, path, user):
+        factory = LivySessionFactory(
+            "fake_workspace", "fake_pool", user, "AzureCliCredential",
+            dict(CLUSTER_CONFIGURATION),
+            PollPolicy(initial_interval=0.005, max_interval=0.05),
+            session_registry=LivySessionRegistry(str(path)))
+        try:
+            session = factory.connect()
+        finally:
+            factory.statement_engine.close()
+        return session.livy_session_id, factory.registry_key(factory.session_name)
+
+    def registered(self, path):
+        with open(path) as registry_file:
+            return json.load(registry_file)
+
+    def test_hit_skips_search(self, fake_livy, tmp_path):
+        path = tmp_path / "sessions.json"
+        session_id, key = self.connect(path, "hit")
+        calls = dict(fake_livy.calls)
+        assert self.connect(path, "hit")[0] == session_id
+        # validated with a single get, without paging through the sessions
+        assert fake_livy.calls.get("list", 0) == calls.get("list", 0)
+        assert fake_livy.calls.get("create", 0) == calls.get("create", 0)
+        assert fake_livy.calls["get"] > calls.get("get", 0)
+        assert self.registered(path)[key] == {"id": session_id, "state": "idle"}
+
+    def test_unknown_id_searched(self, fake_livy, tmp_path):
+        path = tmp_path / "sessions.json"
+        session_id, key = self.connect(tmp_path / "other.json", "unknown")
+        path.write_text(json.dumps({key: {"id": 999, "state": "idle"}}))
+        lists = fake_livy.calls.get("list", 0)
+        # the session is found by its name, and registered again
+        assert self.connect(path, "unknown")[0] == session_id
+        assert fake_livy.calls["list"] > lists
+        assert self.registered(path)[key]["id"] == session_id
+
+    def test_dead_session_replaced(self, fake_livy, tmp_path):
+        path = tmp_path / "sessions.json"
+        session_id, key = self.connect(path, "dead")
+        fake_livy.sessions[session_id].deleted = True
+        creates = fake_livy.calls["create"]
+        new_id = self.connect(path, "dead")[0]
+        assert new_id != session_id
+        assert fake_livy.calls["create"] == creates + 1
+        assert self.registered(path)[key]["id"] == new_id
+
+    def test_corrupt_file(self, fake_livy, tmp_path):
+        path = tmp_path / "sessions.json"
+        for content in ('{"fake_workspace/fake_pool/dbt-corrupt": {"id": ', '[1, 2]',
+                        '{"fake_workspace/fake_pool/dbt-corrupt": {"state": "idle"}}'):
+            path.write_text(content)
+            session_id, key = self.connect(path, "corrupt")
+            assert self.registered(path) == {key: {"id": session_id, "state": "idle"}}
+
+    def test_concurrent_writers(self, tmp_path):
+        path = str(tmp_path / "sessions.json")
+
+        def register(writer):
+            # a registry of its own, like the pool of another cluster profile
+            registry = LivySessionRegistry(path)
+            for i in range(20):
+                registry.put(f"writer_{writer}/{i}", i, "idle")
+            registry.remove(f"writer_{writer}/0")
+
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(register, range(8)))
+        assert set(self.registered(path)) == {
+            f"writer_{writer}/{i}" for writer in range(8) for i in range(1, 20)}
@@ -0,0 +1,195 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dbt.adapters.synapsespark.statement_engine import PollPolicy
+from dbt.adapters.synapsespark.synapse_spark import LivySessionPool
+from dbt.exceptions import RuntimeException
+
+from tests.fake_livy import CLUSTER_CONFIGURATION, FakeLivySettings
+
+
+class TestWarmUp:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(session_start_duration=0.5)
+
+    def test_warm_up_does_not_block(self, project, fake_livy, tmp_path):
+        def get_pool():
+            return LivySessionPool.get_pool(
+                workspace_name="fake_workspace", spark_pool_name="fake_pool",
+                user="warm_up", authentication="AzureCliCredential",
+                conf=dict(CLUSTER_CONFIGURATION),
+                poll_policy=PollPolicy(initial_interval=0.005, max_interval=0.05),
+                min_sessions=1, max_sessions=2,
+                session_registry_path=str(tmp_path / "sessions.json"))
+
+        with ThreadPoolExecutor(2) as executor:
+            warming = executor.submit(get_pool)
+            while not any(pool.factory.session_name == "dbt-warm_up"
+                          for pool in LivySessionPool.existing_pools()):
+                time.sleep(0.005)
+            # Ctrl-C and cleanup list the pools while the session starts
+            start = time.perf_counter()
+            for _ in range(5):
+                LivySessionPool.existing_pools()
+            assert time.perf_counter() - start < 0.25
+            assert not warming.done()
+            checkout = executor.submit(lambda: get_pool().checkout())
+            session = checkout.result()
+            warming.result()
+        # the second thread waited for the warm session instead of starting one
+        assert session.pool_index == 0
+        assert sum(1 for s in fake_livy.sessions.values() if s.name.startswith("dbt-warm_up")) == 1
+
+
+class TestCancellation:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(request_latency=0.002, statement_duration=60)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"max_sessions": 4}
+
+    def test_cancel_open(self, project, fake_livy):
+        errors = []
+
+        def execute(name):
+            try:
+                with project.adapter.connection_named(name):
+                    project.adapter.execute("select * from fake")
+            except RuntimeException as exc:
+                errors.append(exc)
+
+        def run():
+            threads = [threading.Thread(target=execute, args=(f"test_{i}",)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            while fake_livy.running() < 4:
+                time.sleep(0.01)
+            project.adapter.cancel_open_connections()
+            for thread in threads:
+                thread.join()
+
+        for _ in range(3):
+
+            run()
+        # every statement was cancelled in Livy, and stopped its thread
+        assert len(errors) == 12
+        assert fake_livy.calls["delete_statement"] == 12
+
+
+class TestSessionCleanup:
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"session_cleanup": "delete"}
+
+    def test_delete_at_exit(self, project, fake_livy):
+        connections = project.adapter.connections
+        with project.adapter.connection_named("test"):
+            project.adapter.execute("select * from fake")
+        # docs generate cleans up after compiling, and then builds the catalog
+        for _ in range(3):
+            project.adapter.cleanup_connections()
+        assert fake_livy.calls.get("delete", 0) == 0
+        assert ("fake_workspace", "fake_pool") in connections.DELETE_AT_EXIT
+        # what atexit runs
+        connections.delete_sessions("fake_workspace", "fake_pool")
+        assert fake_livy.calls["delete"] == len(fake_livy.sessions)
+
+
+class TestClusterProfiles:
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {
+            "cluster_profiles": {
+                "small": {
+                    "num_executors": 1,
+                    "conf": {"spark.dynamicAllocation.enabled": True},
+                },
+            },
+        }
+
+    def test_model_on_profile_session(self, project, fake_livy):
+        config = {"cluster_profile": "small"}
+
+        def run():
+            with project.adapter.connection_named("test"):
+                context = project.adapter.pre_model_hook(config)
+                project.adapter.execute("select * from fake")
+                project.adapter.post_model_hook(config, context)
+                project.adapter.execute("select * from fake")
+
+        for _ in range(5):
+
+            run()
+        sessions = {session.name: session for session in fake_livy.sessions.values()}
+        # one session per profile, reused across rounds
+        assert set(sessions) == {"dbt-tester-0", "dbt-tester-small-0"}
+        assert sessions["dbt-tester-small-0"].conf == {"spark.dynamicAllocation.enabled": "true"}
+
+
+class TestSparkConf:
+    def test_model_spark_conf(self, project, fake_livy):
+        config = {"spark_conf": {"spark.sql.shuffle.partitions": 8}}
+
+        def run():
+            with project.adapter.connection_named("test"):
+                context = project.adapter.pre_model_hook(config)
+                # already set, no round trip
+                project.adapter.set_spark_conf({"spark.sql.shuffle.partitions": "8"})
+                project.adapter.execute("select * from fake")
+                project.adapter.post_model_hook(config, context)
+
+        statements = fake_livy.calls.get("create_statement", 0)
+        for _ in range(5):
+            run()
+        # set (reading the old value only once), query and restore
+        assert fake_livy.calls["create_statement"] - statements == 5 * 3
+        sqls = [statement.code for session in fake_livy.sessions.values()
+                for statement in session.statements.values()]
+        assert sqls.count("reset spark.sql.shuffle.partitions") == 5
+
+    def test_shared_session(self, project, fake_livy):
+        # max_sessions is 1, so both models run on the same session
+        adapter = project.adapter
+        config = {"spark_conf": {"spark.sql.sources.partitionOverwriteMode": "DYNAMIC"}}
+        reset = "reset spark.sql.sources.partitionOverwriteMode"
+        model_a, model_b = ThreadPoolExecutor(1), ThreadPoolExecutor(1)
+
+        def on(executor, func):
+            # a model runs all its statements on the thread of its connection
+            return executor.submit(func).result()
+
+        def sqls():
+            return [statement.code for session in fake_livy.sessions.values()
+                    for statement in session.statements.values()]
+
+        def run():
+            on(model_a, lambda: adapter.connections.set_connection_name("model_a"))
+            on(model_b, lambda: adapter.connections.set_connection_name("model_b"))
+            context_a = on(model_a, lambda: adapter.pre_model_hook(config))
+            context_b = on(model_b, lambda: adapter.pre_model_hook(config))
+            on(model_a, lambda: adapter.post_model_hook(config, context_a))
+            # model b still holds the conf, it is not reset under its overwrite
+            resets = sqls().count(reset)
+            on(model_b, lambda: adapter.execute("insert overwrite table fake_target select * from fake"))
+            on(model_b, lambda: adapter.post_model_hook(config, context_b))
+            on(model_a, adapter.connections.release)
+            on(model_b, adapter.connections.release)
+            return resets
+
+        for _ in range(3):
+
+            resets = run()
+        model_a.shutdown()
+        model_b.shutdown()
+        codes = sqls()
+        assert resets == 2
+        assert codes.count(reset) == 3
+        # the last reset follows the overwrite of model b
+        overwrite = max(i for i, code in enumerate(codes) if "insert overwrite" in code)
+        assert max(i for i, code in enumerate(codes) if code == reset) > overwrite
@@ -0,0 +1,62 @@
+import pytest
+
+from dbt.adapters.synapsespark.spark_cache import CachedRelation, SparkCacheTracker
+
+
+class TestSparkCache:
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        # the relations of the fake have 1024 bytes by their statistics
+        return {"spark_cache_budget_bytes": 2048}
+
+    def test_cache_until_read(self, project, fake_livy):
+        adapter = project.adapter
+        relations = [adapter.Relation.create(schema=project.test_schema, identifier=f"cached_{i}")
+                     for i in range(3)]
+
+        def run():
+            with adapter.connection_named("test"):
+                for i, relation in enumerate(relations):
+                    adapter.spark_cache_relation(relation, "memory", [f"model.test.reader_{i}"])
+                for i in range(3):
+                    adapter.spark_cache_node_finished(f"model.test.reader_{i}")
+
+        for _ in range(3):
+
+            run()
+        codes = [code for code in fake_livy.codes()
+                 if "cache lazy table" in code or "uncache table" in code]
+        assert sum("cache lazy table" in code for code in codes) == 9
+        # the third relation is over the budget, the least recently used one
+        # is evicted, and the other two are released by their readers
+        uncached = [code.split()[-1] for code in codes if "uncache table" in code]
+        assert uncached == [str(relations[i]) for i in (0, 1, 2)] * 3
+        assert codes[3] == f"uncache table if exists {relations[0]}"
+
+    def test_least_recently_used(self):
+        tracker = SparkCacheTracker(budget_bytes=2000)
+
+        def cached(name, *dependents):
+            return CachedRelation(name, session_id=1, size_bytes=1000, dependents=set(dependents))
+
+        assert tracker.add(cached("a", "reader_1", "reader_2")) == []
+        assert tracker.add(cached("b", "reader_3")) == []
+        # a is read again, which makes b the least recently used
+        assert tracker.node_finished("reader_1") == []
+        assert [c.relation for c in tracker.add(cached("c", "reader_4"))] == ["b"]
+        assert [c.relation for c in tracker.node_finished("reader_2")] == ["a"]
+        assert [c.relation for c in tracker.pop_all()] == ["c"]
+
+
+class TestSparkCacheSessions:
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"max_sessions": 2}
+
+    def test_not_cached_on_many_sessions(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="cached")
+        with project.adapter.connection_named("test"):
+            project.adapter.spark_cache_relation(relation, "memory", ["model.test.reader"])
+        # a reader on the other session would not find it cached
+        assert not any("cache lazy table" in code for code in fake_livy.codes())
+        assert project.adapter.spark_cache.pop_all() == []
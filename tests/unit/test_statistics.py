@@ -0,0 +1,63 @@
+import pytest
+from dbt.tests.util import run_dbt
+
+from tests.fake_livy import FakeLivySettings, ModelsInTestSchema
+
+
+class TestAnalyze:
+    def test_analyze_relation(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="analyzed")
+
+        def run():
+            with project.adapter.connection_named("test"):
+                response, _ = project.adapter.execute("select * from fake")
+                response = project.adapter.analyze_relation(
+                    relation, columns=["id"], partitions=["day = '2024-01-01'"], response=response)
+                project.adapter.get_columns_in_relation(relation)
+            return response
+
+        statements = fake_livy.calls.get("create_statement", 0)
+        for _ in range(3):
+            response = run()
+        # the row count of the table is stale after analyzing a partition
+        assert (response.table_rows, response.table_bytes) == (None, 1024)
+        # the query, then the analyze statements and the description in one round trip
+        assert fake_livy.calls["create_statement"] - statements == 3 * 2
+        batch = [code for code in fake_livy.codes() if "analyze table" in code][-1]
+        assert f"analyze table {relation} compute statistics noscan" in batch
+
+    def test_analyze_table(self, project, fake_livy):
+        relation = project.adapter.Relation.create(schema=project.test_schema, identifier="whole")
+        with project.adapter.connection_named("test"):
+            response, _ = project.adapter.execute("select * from fake")
+            response = project.adapter.analyze_relation(relation, response=response)
+        assert (response.table_rows, response.table_bytes) == (10, 1024)
+
+
+models__analyzed_delta_sql = """
+{{ config(materialized='table', file_format='delta', analyze=true, optimize=true,
+          optimize_min_files=1) }}
+select * from fake
+"""
+
+
+class TestUnsupportedStatistics(ModelsInTestSchema):
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(relations_per_schema=0, files_per_relation=200)
+
+    @pytest.fixture(scope="class")
+    def models(self):
+        return {"analyzed_delta.sql": models__analyzed_delta_sql}
+
+    def test_failures_are_warnings(self, project, fake_livy):
+        fake_livy.fail(r"analyze table \S+ compute statistics",
+                       "AnalysisException: ANALYZE TABLE is not supported for v2 tables.")
+        fake_livy.fail(r"optimize \S+", "AnalysisException: OPTIMIZE failed")
+        results = run_dbt(["run"])
+        # the model is built, without statistics
+        assert results[0].status == "success"
+        assert results[0].adapter_response.get("table_rows") is None
+        codes = fake_livy.codes()
+        assert any("compute statistics" in code for code in codes)
+        assert any("optimize " in code for code in codes)
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from tests.fake_livy import FakeLivySettings
+
+
+class TestStreaming:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(result_rows=250, result_columns=2)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"stream_results": True, "stream_chunk_rows": 100}
+
+    def test_stream_query(self, project, fake_livy):
+        fake_livy.respond(r"from small\b", [("id", "long")], [[1], [2]])
+        adapter = project.adapter
+
+        def run():
+            sizes = []
+            with adapter.connection_named("test"):
+                for chunk in adapter.stream_query("select * from fake"):
+                    sizes.append(len(chunk.rows))
+                    # other statements in between chunks keep the spool
+                    adapter.execute("select * from small", fetch=True)
+            return sizes
+
+        statements = fake_livy.calls.get("create_statement", 0)
+        for _ in range(3):
+            sizes = run()
+        assert sizes == [100, 100, 50]
+        # the first chunk with the query, two more chunks, dropping the spool,
+        # and a single statement for each small query
+        assert fake_livy.calls["create_statement"] - statements == 3 * (1 + 2 + 2 + 3)
+        assert fake_livy.spools == {}
+
+    def test_fetch_small_result(self, project, fake_livy):
+        fake_livy.respond(r"from small\b", [("id", "long")], [[1], [2]])
+
+        def run():
+            with project.adapter.connection_named("test"):
+                return project.adapter.execute("select * from small", fetch=True)[1]
+
+        statements = fake_livy.calls.get("create_statement", 0)
+        for _ in range(5):
+            table = run()
+        assert [row[0] for row in table.rows] == [1, 2]
+        assert fake_livy.calls["create_statement"] - statements == 5
+
+    def test_fetch_large_result(self, project, fake_livy):
+        with project.adapter.connection_named("test"):
+            _, table = project.adapter.execute("select * from fake", fetch=True)
+        assert len(table.rows) == 250
+        assert fake_livy.spools == {}
+
+    def test_dml_not_streamed(self, project, fake_livy):
+        sql = "with source as (select * from fake) insert into fake_target select * from source"
+        with project.adapter.connection_named("test"):
+            project.adapter.execute(sql)
+        statement = [statement for session in fake_livy.sessions.values()
+                     for statement in session.statements.values() if sql in statement.code][-1]
+        assert statement.kind == "sql"
+
+
+class TestStreamingChunkBytes:
+    @pytest.fixture(scope="class")
+    def fake_livy_settings(self):
+        return FakeLivySettings(result_rows=250, result_columns=2)
+
+    @pytest.fixture(scope="class")
+    def profile_options(self):
+        return {"stream_results": True, "stream_chunk_rows": 100, "stream_chunk_bytes": 500}
+
+    def test_first_chunk_bytes(self, project, fake_livy):
+        with project.adapter.connection_named("test"):
+            chunks = [[[row[0], int(row[1])] for row in chunk.rows]
+                      for chunk in project.adapter.stream_query("select * from fake")]
+        # the first chunk is cut to the byte limit too, the rest is spooled
+        assert len(chunks[0]) < 100
+        assert sum(len(json.dumps(row)) for row in chunks[0]) <= 500
+        assert [row[1] for chunk in chunks for row in chunk] == list(range(250))
+        assert fake_livy.spools == {}
+
+    def test_rows_numbered_in_place(self, project, fake_livy):
+        with project.adapter.connection_named("test"):
+            project.adapter.execute("select * from fake", fetch=True)
+        code = [code for code in fake_livy.codes() if "_dbt_stream_view" in code][-1]
+        # no window over all rows, and the ids are checkpointed before numbering
+        assert "Window" not in code
+        assert code.index("localCheckpoint()") < code.index("create_map")
@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+
+from dbt.adapters.synapsespark.tracing import CURRENT_NODE, Tracer
+
+
+class TestTracing:
+    @pytest.fixture(autouse=True)
+    def no_node(self):
+        # earlier tests leave the node of their last connection on this thread
+        token = CURRENT_NODE.set(None)
+        yield
+        CURRENT_NODE.reset(token)
+
+    def trace(self, tracer):
+        token = CURRENT_NODE.set("model.test.traced")
+        try:
+            with tracer.span("livy.statement", session_id=1) as args:
+                args["statement_id"] = 7
+        finally:
+            CURRENT_NODE.reset(token)
+        tracer.record("metadata.parse", time.time(), 0.25, relations=3)
+
+    def test_chrome_format(self, tmp_path):
+        tracer = Tracer()
+        tracer.configure(str(tmp_path / "trace-{invocation_id}.json"), invocation_id="abc")
+        self.trace(tracer)
+        tracer.close()
+        with open(tmp_path / "trace-abc.json") as trace_file:
+            # the closing bracket is optional, and left out
+            events = json.loads(trace_file.read().rstrip().rstrip(",") + "]")
+        threads = {event["args"]["name"]: event["tid"] for event in events if event["ph"] == "M"}
+        assert set(threads) == {"model.test.traced", "adapter"}
+        statement, parse = [event for event in events if event["ph"] == "X"]
+        assert statement["name"] == "livy.statement" and statement["cat"] == "livy"
+        assert statement["tid"] == threads["model.test.traced"]
+        assert statement["args"] == {"session_id": 1, "statement_id": 7}
+        assert parse["tid"] == threads["adapter"]
+        assert parse["dur"] == 250000
+        assert isinstance(parse["ts"], int)
+
+    def test_jsonl_format(self, tmp_path):
+        tracer = Tracer()
+        tracer.configure(str(tmp_path / "trace.jsonl"), "jsonl")
+        self.trace(tracer)
+        tracer.close()
+        with open(tmp_path / "trace.jsonl") as trace_file:
+            events = [json.loads(line) for line in trace_file]
+        assert [(event["name"], event["node"]) for event in events] == [
+            ("livy.statement", "model.test.traced"), ("metadata.parse", None)]
+        assert events[1]["duration"] == 0.25
+        assert events[1]["args"] == {"relations": 3}
+        assert set(events[0]) == {"name", "node", "start", "duration", "args"}
+
+    def test_reconfigure_closes_file(self, tmp_path):
+        tracer = Tracer()
+        tracer.configure(str(tmp_path / "first.json"))
+        first = tracer._file
+        tracer.configure(str(tmp_path / "second.json"))
+        assert first.closed
+        tracer.configure(None)
+        assert tracer._file is None
+
+    def test_master_connection(self, project, fake_livy):
+        connections = project.adapter.connections
+        connections.set_connection_name()
+        assert CURRENT_NODE.get() == "master"
+        connections.release()
+        # spans after the node are not tagged with it
+        assert CURRENT_NODE.get() is None
+        connections.set_connection_name("model.test.traced")
+        connections.release()
+        assert CURRENT_NODE.get() is None